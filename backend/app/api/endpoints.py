@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Response
 from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from collections import Counter
+from datetime import date
 import pandas as pd
-import io
+import json
 
-from app.core.database import get_db
+from app.core.database import SessionLocal, get_async_db, get_db, run_db
+from app.core.config import config
+from app.core.executor import ExecutorBusyError, processing_executor
+from app.core.metrics import metrics
 from app.models.transaction import (
     Transaction as TransactionModel,
-    Settings as SettingsModel,
+    AnalysisJob,
 )
 from app.schemas import (
     Transaction,
@@ -18,45 +25,89 @@ from app.schemas import (
     ChatRequest,
     TextAnalysisRequest,
 )
-from app.services.pdf_processor import extract_text_from_pdf, anonymize_text
-from app.services.llm_client import analyze_transactions
+from app.services.pdf_processor import (
+    extract_text_from_pdf,
+    iter_pdf_pages,
+    anonymize_text,
+)
+from app.services.llm_client import (
+    analyze_transactions,
+    reset_llm_clients,
+    stream_analysis,
+)
+from app.services.llm_scheduler import LLMUnavailableError
+from app.services.ingestion import ingest_statements
+from app.services.analysis_jobs import analysis_jobs, job_status, job_transactions
+from app.services.transaction_store import (
+    TransactionFilters,
+    assign_natural_key,
+    list_transactions,
+    save_transactions,
+)
+from app.services.merchant_index import record_correction, record_transactions
+from app.services.settings_store import settings_store
+from app.services.uploads import UploadTooLargeError, remove_spooled, spool_upload
+from app.services.document_cache import (
+    get_cached_document,
+    get_cached_raw_text,
+    store_document,
+)
 
 router = APIRouter()
 
 
-def get_setting(db: Session, key: str, default: str = ""):
-    setting = db.query(SettingsModel).filter(SettingsModel.key == key).first()
-    return setting.value if setting else default
-
-
-def set_setting(db: Session, key: str, value: str):
-    setting = db.query(SettingsModel).filter(SettingsModel.key == key).first()
-    if not setting:
-        setting = SettingsModel(key=key, value=value)
-        db.add(setting)
-    else:
-        setting.value = value
-    db.commit()
-
-
 @router.get("/transactions", response_model=List[Transaction])
 def read_transactions(
-    skip: int = 0, limit: int = 1000, db: Session = Depends(get_db)
-):  # Increased limit
-    transactions = (
-        db.query(TransactionModel)
-        .order_by(TransactionModel.date.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+    response: Response,
+    skip: int = 0,
+    limit: int = 1000,
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    card: Optional[str] = None,
+    source: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    amount_min: Optional[float] = None,
+    amount_max: Optional[float] = None,
+    q: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Transactions, newest first. For the next page pass the X-Next-Cursor
+    header as `cursor` (keyset pagination on date and id); the header is
+    absent on the last page. skip/limit offset paging still works.
+
+    Optional filters: category, card (last four digits), source, date range
+    and amount range (both ends inclusive), and `q`, a full-text search of
+    the description (every word must match). Words of 3+ characters use the
+    search index; shorter ones (e.g. two-character Chinese words) scan the
+    table unless a longer word narrows the search first.
+    """
+    filters = TransactionFilters(
+        category=category,
+        card_last_four=card,
+        source=source,
+        date_from=date_from,
+        date_to=date_to,
+        amount_min=amount_min,
+        amount_max=amount_max,
+        search=q,
     )
+    try:
+        transactions, next_cursor = list_transactions(db, limit, skip, cursor, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return transactions
 
 
 @router.post("/transactions", response_model=Transaction)
 def create_transaction(transaction: TransactionCreate, db: Session = Depends(get_db)):
     db_transaction = TransactionModel(**transaction.model_dump())
+    assign_natural_key(db, db_transaction)
     db.add(db_transaction)
+    record_transactions(db, [db_transaction])
     db.commit()
     db.refresh(db_transaction)
     return db_transaction
@@ -72,10 +123,21 @@ def update_transaction(
     if not db_transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
+    old_description, old_category = db_transaction.description, db_transaction.category
     update_data = transaction.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_transaction, key, value)
-
+    if update_data.keys() & {"date", "amount", "description", "card_last_four"}:
+        assign_natural_key(db, db_transaction)
+
+    # Teach the merchant index about manual category corrections
+    record_correction(
+        db,
+        old_description,
+        old_category,
+        db_transaction.description,
+        db_transaction.category,
+    )
     db.add(db_transaction)
     db.commit()
     db.refresh(db_transaction)
@@ -101,117 +163,410 @@ def delete_all_transactions(db: Session = Depends(get_db)):
     return {"ok": True}
 
 
+def _busy(error: ExecutorBusyError):
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+def _extract_and_anonymize(path, raw_text=None):
+    if raw_text is None:
+        raw_text = extract_text_from_pdf(path)
+    return raw_text, anonymize_text(raw_text)
+
+
+async def _spool(file: UploadFile):
+    try:
+        return await spool_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
 @router.post("/parse_pdf")
-async def parse_pdf(file: UploadFile = File(...)):
+async def parse_pdf(
+    file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)
+):
     """
     Step 1: Parse PDF and return anonymized text for user review.
-    Does NOT save to DB yet.
+    Does NOT save to DB yet. Results are cached by content hash, so
+    re-uploading the same statement skips extraction and anonymization.
+    The upload is spooled to disk rather than held in memory.
     """
-    content = await file.read()
-
-    # 1. Extract
+    path, sha256 = await _spool(file)
     try:
-        raw_text = extract_text_from_pdf(io.BytesIO(content))
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"PDF extraction failed: {str(e)}")
-
-    # 2. Anonymize
-    clean_text = anonymize_text(raw_text)
+        cached = await db.run_sync(get_cached_document, sha256)
+        if cached:
+            return {
+                "filename": file.filename,
+                "text": cached.anonymized_text,
+                "cached": True,
+                "message": "PDF parsed successfully. Please review the text before analysis.",
+            }
+
+        # 1. Extract (reusing text cached under an older anonymizer version)
+        # 2. Anonymize -- both off the event loop, on the bounded executor
+        raw_text = await db.run_sync(get_cached_raw_text, sha256)
+        try:
+            raw_text, clean_text = await processing_executor.run(
+                _extract_and_anonymize, path, raw_text
+            )
+        except ExecutorBusyError as e:
+            raise _busy(e)
+        except Exception as e:
+            raise HTTPException(
+                status_code=400, detail=f"PDF extraction failed: {str(e)}"
+            )
+    finally:
+        remove_spooled(path)
+
+    if not raw_text.startswith("Error reading PDF"):
+        await db.run_sync(store_document, sha256, raw_text, clean_text)
 
     return {
         "filename": file.filename,
         "text": clean_text,
+        "cached": False,
         "message": "PDF parsed successfully. Please review the text before analysis.",
     }
 
 
+def _ndjson(record):
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def _stream_parsed_pages(path, filename):
+    """
+    Yields one NDJSON record per page as soon as it is extracted and
+    anonymized, followed by a final summary record. Removes the spooled
+    upload at `path` once done.
+    """
+    pages = 0
+    try:
+        for page, raw_text in iter_pdf_pages(path):
+            pages += 1
+            if raw_text:
+                yield _ndjson({"page": page, "text": anonymize_text(raw_text) + "\n"})
+    except Exception as e:
+        yield _ndjson({"error": f"PDF extraction failed: {str(e)}"})
+        return
+    finally:
+        remove_spooled(path)
+
+    yield _ndjson({"done": True, "filename": filename, "pages": pages})
+
+
+@router.post("/parse_pdf/stream")
+async def parse_pdf_stream(file: UploadFile = File(...)):
+    """
+    Streaming variant of /parse_pdf: returns NDJSON `{page, text}` records
+    so the review UI can render pages while the rest are still processed.
+    """
+    path, _ = await _spool(file)
+    try:
+        records = processing_executor.stream(_stream_parsed_pages, path, file.filename)
+    except ExecutorBusyError as e:
+        remove_spooled(path)
+        raise _busy(e)
+    return StreamingResponse(records, media_type="application/x-ndjson")
+
+
 @router.post("/analyze_text")
-async def analyze_text(request: TextAnalysisRequest, db: Session = Depends(get_db)):
+async def analyze_text(
+    request: TextAnalysisRequest, db: AsyncSession = Depends(get_async_db)
+):
     """
     Step 2: Analyze the REVIEWED text and save transactions to DB.
     """
-    api_key = get_setting(db, "api_key")
-    base_url = get_setting(db, "base_url", "https://openrouter.ai/api/v1")
-    model_name = get_setting(db, "model_name", "qwen/qwen3-next-80b-a3b-instruct")
+    api_key = await settings_store.get_async(db, "api_key")
+    base_url = await settings_store.get_async(
+        db, "base_url", "https://openrouter.ai/api/v1"
+    )
+    model_name = await settings_store.get_async(
+        db, "model_name", "qwen/qwen3-next-80b-a3b-instruct"
+    )
 
     if not api_key:
         raise HTTPException(status_code=400, detail="API Key not configured")
 
-    # 3. Analyze with LLM
+    # 3. Analyze with LLM (the extraction cache and merchant index are read
+    # and written through the same async session)
     try:
         extracted_data = await analyze_transactions(
-            request.text, api_key, base_url, model_name, request.language
+            request.text,
+            api_key,
+            base_url,
+            model_name,
+            request.language,
+            db=db,
+        )
+    except LLMUnavailableError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"LLM analysis failed: {str(e)}")
 
-    # 4. Save to DB
-    saved_count = 0
-    added_transactions = []
-    for item in extracted_data:
-        # Convert date string to datetime object if possible
-        try:
-            date_obj = pd.to_datetime(item.get("Date")).to_pydatetime()
-        except Exception:
-            date_obj = None
-
-        trans = TransactionModel(
-            date=date_obj,
-            description=item.get("Description", "Unknown"),
-            amount=float(item.get("Amount", 0)),
-            category=item.get("Category", "Other"),
-            source=request.source_filename,
-            card_last_four=item.get("CardLastFour"),
-        )
-        db.add(trans)
-        added_transactions.append(trans)
-        saved_count += 1
+    # 4. Save to DB, skipping transactions that were already imported
+    saved = await db.run_sync(
+        save_transactions, extracted_data, request.source_filename
+    )
+
+    return {
+        "message": "Successfully analyzed text",
+        "transactions_added": len(saved.inserted),
+        "duplicates_skipped": saved.duplicates,
+        "transactions": saved.inserted,
+    }
+
+
+async def _stream_analysis_records(
+    request: TextAnalysisRequest, api_key, base_url, model
+):
+    """
+    Analyzes reviewed text chunk by chunk, committing and emitting each
+    chunk's transactions as an NDJSON record, then a summary record. Rows
+    outside chunk overlaps are emitted while the chunk is still generated
+    ("partial": true records).
+    """
+    db = SessionLocal()
+    chunks = failed = added_total = skipped_total = 0
+    # Shared by every batch so repeated purchases keep their own occurrence
+    occurrences = Counter()
+    try:
+        async for result in stream_analysis(
+            request.text,
+            api_key,
+            base_url,
+            model,
+            request.language,
+            db=db,
+            early_rows=True,
+        ):
+            chunks = result.chunks
+            if result.error is not None:
+                failed += 1
+                yield _ndjson(
+                    {
+                        "chunk": result.index,
+                        "chunks": result.chunks,
+                        "error": str(result.error),
+                    }
+                )
+                continue
+            # Commits (and their fsyncs) run in a worker thread, off the loop
+            saved = await run_db(
+                db,
+                save_transactions,
+                result.transactions,
+                request.source_filename,
+                occurrences=occurrences,
+            )
+            added_total += len(saved.inserted)
+            skipped_total += saved.duplicates
+            yield _ndjson(
+                {
+                    "chunk": result.index,
+                    "chunks": result.chunks,
+                    "partial": result.partial,
+                    "transactions_added": len(saved.inserted),
+                    "duplicates_skipped": saved.duplicates,
+                    "transactions": [
+                        Transaction.model_validate(t).model_dump(mode="json")
+                        for t in saved.inserted
+                    ],
+                }
+            )
+    except Exception as e:
+        yield _ndjson({"error": f"LLM analysis failed: {str(e)}"})
+        return
+    finally:
+        db.close()
+
+    yield _ndjson(
+        {
+            "done": True,
+            "chunks": chunks,
+            "failed_chunks": failed,
+            "transactions_added": added_total,
+            "duplicates_skipped": skipped_total,
+        }
+    )
+
+
+@router.post("/analyze_text/stream")
+async def analyze_text_stream(
+    request: TextAnalysisRequest, db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Streaming variant of /analyze_text: each chunk's transactions are saved
+    and returned as an NDJSON record as soon as the chunk is analyzed, so a
+    slow or failing chunk neither delays nor discards the others.
+    """
+    api_key = await settings_store.get_async(db, "api_key")
+    base_url = await settings_store.get_async(
+        db, "base_url", "https://openrouter.ai/api/v1"
+    )
+    model_name = await settings_store.get_async(
+        db, "model_name", "qwen/qwen3-next-80b-a3b-instruct"
+    )
+
+    if not api_key:
+        raise HTTPException(status_code=400, detail="API Key not configured")
+
+    return StreamingResponse(
+        _stream_analysis_records(request, api_key, base_url, model_name),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.post("/jobs/analyze")
+def submit_analysis_job(request: TextAnalysisRequest, db: Session = Depends(get_db)):
+    """
+    Background variant of /analyze_text: queues the reviewed text and returns
+    a job id immediately. Poll GET /jobs/{job_id} for progress.
+    """
+    if not settings_store.get(db, "api_key"):
+        raise HTTPException(status_code=400, detail="API Key not configured")
+    model_name = settings_store.get(
+        db, "model_name", "qwen/qwen3-next-80b-a3b-instruct"
+    )
+
+    job = analysis_jobs.submit(
+        db, request.text, request.source_filename, request.language, model_name
+    )
+    return job_status(job)
+
+
+def _get_job(db: Session, job_id: str):
+    job = db.get(AnalysisJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-    db.commit()
 
-    # Refresh to get IDs
-    for t in added_transactions:
-        db.refresh(t)
+@router.get("/jobs/{job_id}")
+def get_analysis_job(job_id: str, db: Session = Depends(get_db)):
+    return job_status(_get_job(db, job_id))
 
+
+@router.post("/jobs/{job_id}/retry")
+def retry_analysis_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Queues a failed job again: chunks that failed are analyzed again,
+    transactions of the chunks that succeeded are kept.
+    """
+    job = _get_job(db, job_id)
+    if not analysis_jobs.retry(db, job_id):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Only failed jobs can be retried (job is {job.status})",
+        )
+    db.refresh(job)
+    return job_status(job)
+
+
+@router.get("/jobs/{job_id}/result")
+def get_analysis_job_result(job_id: str, db: Session = Depends(get_db)):
+    """
+    Returns the job status with the transactions saved so far (all of them
+    once the status is "done").
+    """
+    job = _get_job(db, job_id)
     return {
-        "message": "Successfully analyzed text",
-        "transactions_added": saved_count,
-        "transactions": added_transactions,
+        **job_status(job),
+        "transactions": [
+            Transaction.model_validate(t) for t in job_transactions(db, job_id)
+        ],
     }
 
 
+@router.post("/ingest_batch")
+async def ingest_batch(
+    files: List[UploadFile] = File(...),
+    language: str = Form("zh"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Batch import: parses, anonymizes, analyzes and saves several statements
+    in one pipelined run, skipping the manual review step. Streams NDJSON
+    per-file status records followed by a summary record.
+    """
+    api_key = await settings_store.get_async(db, "api_key")
+    base_url = await settings_store.get_async(
+        db, "base_url", "https://openrouter.ai/api/v1"
+    )
+    model_name = await settings_store.get_async(
+        db, "model_name", "qwen/qwen3-next-80b-a3b-instruct"
+    )
+
+    if not api_key:
+        raise HTTPException(status_code=400, detail="API Key not configured")
+    if len(files) > config.ingest_max_files:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files (max {config.ingest_max_files} per batch)",
+        )
+
+    uploads = []
+    try:
+        for file in files:
+            path, _ = await _spool(file)
+            uploads.append((file.filename, path))
+    except HTTPException:
+        remove_spooled(*(path for _, path in uploads))
+        raise
+
+    async def stream():
+        try:
+            async for record in ingest_statements(
+                uploads, api_key, base_url, model_name, language
+            ):
+                yield _ndjson(record)
+        finally:
+            remove_spooled(*(path for _, path in uploads))
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @router.get("/settings")
 def get_settings(db: Session = Depends(get_db)):
     keys = ["api_key", "base_url", "model_name", "monthly_income", "investments"]
-    return {k: get_setting(db, k) for k in keys}
+    values = settings_store.snapshot(db)
+    return {k: values.get(k, "") for k in keys}
 
 
 @router.post("/settings")
 def update_settings(settings: SettingsUpdate, db: Session = Depends(get_db)):
-    if settings.api_key is not None:
-        set_setting(db, "api_key", settings.api_key)
-    if settings.base_url is not None:
-        set_setting(db, "base_url", settings.base_url)
-    if settings.model_name is not None:
-        set_setting(db, "model_name", settings.model_name)
-    if settings.monthly_income is not None:
-        set_setting(db, "monthly_income", str(settings.monthly_income))
-    if settings.investments is not None:
-        set_setting(db, "investments", str(settings.investments))
+    settings_store.update(
+        db,
+        {
+            key: str(value)
+            for key, value in settings.model_dump(exclude_none=True).items()
+        },
+    )
+    reset_llm_clients()
     return {"status": "updated"}
 
 
 @router.post("/chat")
-async def chat(request: ChatRequest, db: Session = Depends(get_db)):
-    api_key = get_setting(db, "api_key")
-    base_url = get_setting(db, "base_url", "https://openrouter.ai/api/v1")
-    model_name = get_setting(db, "model_name", "qwen/qwen3-next-80b-a3b-instruct")
+async def chat(request: ChatRequest, db: AsyncSession = Depends(get_async_db)):
+    api_key = await settings_store.get_async(db, "api_key")
+    base_url = await settings_store.get_async(
+        db, "base_url", "https://openrouter.ai/api/v1"
+    )
+    model_name = await settings_store.get_async(
+        db, "model_name", "qwen/qwen3-next-80b-a3b-instruct"
+    )
 
     if not api_key:
         raise HTTPException(status_code=400, detail="API Key not configured")
 
     # Load transactions for context
-    transactions = db.query(TransactionModel).all()
+    transactions = (await db.scalars(select(TransactionModel))).all()
     if not transactions:
         return StreamingResponse(
             iter(["No transaction data available yet. Please upload a PDF first."]),
@@ -234,8 +589,8 @@ async def chat(request: ChatRequest, db: Session = Depends(get_db)):
     df = pd.DataFrame(data)
 
     # Get financial context
-    income = float(get_setting(db, "monthly_income", "0"))
-    investments = float(get_setting(db, "investments", "0"))
+    income = float(await settings_store.get_async(db, "monthly_income", "0"))
+    investments = float(await settings_store.get_async(db, "investments", "0"))
 
     # Use the streaming service function
     # Note: endpoints must import the new stream_chat_with_data function
@@ -297,3 +652,9 @@ def get_stats(db: Session = Depends(get_db)):
         "category_summary": cat_summary_df.to_dict(orient="records"),
         "card_summary": card_summary_df.to_dict(orient="records"),
     }
+
+
+@router.get("/metrics")
+def get_metrics():
+    """Return in-process performance counters (cache hits, skip ratios, ...)."""
+    return metrics.snapshot()
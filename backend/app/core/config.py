@@ -0,0 +1,147 @@
+import os
+from typing import Dict, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class AppConfig(BaseSettings):
+    """
+    Runtime tuning knobs. Every field can be overridden with an environment
+    variable prefixed by SMART_FINANCE_ (e.g. SMART_FINANCE_PDF_WORKERS=8)
+    or through the backend .env file.
+    """
+
+    model_config = SettingsConfigDict(
+        env_prefix="SMART_FINANCE_", env_file=".env", extra="ignore"
+    )
+
+    # SQLite database. Every connection enables the pragmas below: WAL lets
+    # readers run while a write is in progress, synchronous=NORMAL only
+    # fsyncs at checkpoints, and `sqlite_busy_timeout_ms` makes writers from
+    # other workers wait for the lock instead of failing. Pools are per
+    # process, so with several uvicorn workers keep them small.
+    database_url: str = "sqlite:///./sql_app.db"
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size_kib: int = 64 * 1024
+    sqlite_busy_timeout_ms: int = 5000
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30.0
+
+    # App settings (API key, model, ...) are read from an in-memory snapshot;
+    # other workers' changes are picked up within this many seconds.
+    settings_refresh_interval_seconds: float = 1.0
+
+    # Uploads are spooled to disk in chunks; larger uploads are rejected (413).
+    max_upload_bytes: int = 50 * 1024 * 1024
+    upload_spool_dir: Optional[str] = None
+
+    # PDF extraction: page ranges are fanned out to a process pool once a
+    # document has at least `pdf_parallel_min_pages` pages.
+    pdf_workers: int = min(4, os.cpu_count() or 1)
+    pdf_pages_per_task: int = 8
+    pdf_parallel_min_pages: int = 16
+
+    # Parsed document cache (raw + anonymized text), evicted least recently
+    # used first once the stored text exceeds `document_cache_max_bytes`.
+    document_cache_enabled: bool = True
+    document_cache_max_bytes: int = 256 * 1024 * 1024
+
+    # Bounded executor for extraction/anonymization. Requests beyond
+    # workers + queue depth are rejected with 429 and Retry-After.
+    processing_workers: int = 2
+    processing_queue_depth: int = 8
+    processing_retry_after_seconds: int = 5
+
+    # Anonymizer service: flagged lines are split into line groups of at most
+    # `anonymizer_segment_chars`, and segments from concurrent requests are
+    # batched into a single model call.
+    anonymizer_segment_chars: int = 1000
+    anonymizer_max_batch_size: int = 16
+    anonymizer_max_wait_ms: int = 10
+    # Lines around a regex-flagged line that are also sent to the model.
+    anonymizer_context_lines: int = 2
+    # Longest a request waits for one segment before falling back to the
+    # regex-masked text.
+    anonymizer_timeout_seconds: float = 120.0
+
+    # Batch ingestion (/ingest_batch): per-stage concurrency limits shared by
+    # all batches, and the maximum number of files per request.
+    ingest_extract_concurrency: int = 2
+    ingest_anonymize_concurrency: int = 1
+    ingest_analyze_concurrency: int = 2
+    ingest_max_files: int = 24
+
+    # Background analysis jobs (/jobs/analyze) processed concurrently. Runners
+    # touch their jobs every third of `analysis_job_stale_seconds`; a running
+    # job not touched for that long (its process died) is resumed by any
+    # runner.
+    analysis_job_workers: int = 2
+    analysis_job_stale_seconds: float = 60.0
+
+    # LLM extraction chunking: chunks are sized in tokens, up to
+    # `llm_chunk_context_fraction` of the model's context window and to the
+    # model's output limit divided by `llm_chunk_output_ratio` (the JSON
+    # answer is several times longer than the rows it extracts), and to
+    # `llm_chunk_max_tokens` when set. Consecutive chunks share
+    # `llm_chunk_overlap_lines` lines so no row is lost at a boundary.
+    llm_chunk_max_tokens: Optional[int] = None
+    llm_chunk_context_fraction: float = 0.25
+    llm_chunk_output_ratio: float = 3.0
+    llm_chunk_overlap_lines: int = 2
+
+    # Statement text compaction before chunking: non-transaction lines seen
+    # at least `compaction_min_repeats` times are kept only once, and lines
+    # without digits more than `compaction_table_margin_lines` lines from
+    # any date or amount are dropped.
+    compaction_enabled: bool = True
+    compaction_min_repeats: int = 3
+    compaction_table_margin_lines: int = 2
+
+    # Persistent cache of per-chunk LLM extraction results.
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_seconds: int = 30 * 24 * 3600
+
+    # Local merchant -> category index. A merchant is categorised without
+    # the LLM once its leading category has this much support and share.
+    merchant_index_min_support: float = 2.0
+    merchant_index_min_confidence: float = 0.8
+    merchant_index_correction_weight: float = 5.0
+
+    # Shared keep-alive HTTP pool for LLM clients; cached clients unused for
+    # `llm_client_idle_ttl_seconds` are evicted.
+    llm_max_connections: int = 20
+    llm_max_keepalive_connections: int = 10
+    llm_keepalive_expiry_seconds: float = 60.0
+    llm_client_idle_ttl_seconds: float = 600.0
+    llm_request_timeout_seconds: float = 120.0
+
+    # Process-wide LLM scheduler: per-model concurrency starts at
+    # `llm_initial_concurrency` and adapts (AIMD) between the min and max on
+    # 429s/timeouts. `llm_model_concurrency` caps individual models, e.g.
+    # SMART_FINANCE_LLM_MODEL_CONCURRENCY='{"openai/gpt-4o": 4}'.
+    # Failed calls are retried with jittered exponential backoff.
+    llm_initial_concurrency: int = 4
+    llm_min_concurrency: int = 1
+    llm_max_concurrency: int = 16
+    llm_model_concurrency: Dict[str, int] = {}
+    llm_max_retries: int = 4
+    llm_retry_base_seconds: float = 0.5
+    llm_retry_max_seconds: float = 30.0
+
+    # Hedged requests: a chunk extraction (or chat turn) still running after
+    # the `llm_hedge_percentile` of the model's recent call latencies gets a
+    # duplicate, sent to `llm_fallback_models[model]` if configured (e.g.
+    # '{"openai/gpt-4o": "openai/gpt-4o-mini"}') or to the same model; the
+    # first usable answer wins. Needs `llm_hedge_min_samples` latencies first.
+    llm_hedge_enabled: bool = False
+    llm_hedge_percentile: float = 0.95
+    llm_hedge_min_samples: int = 20
+    llm_hedge_min_delay_seconds: float = 2.0
+    llm_latency_window: int = 200
+    llm_fallback_models: Dict[str, str] = {}
+
+
+config = AppConfig()
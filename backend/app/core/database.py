@@ -1,17 +1,91 @@
-from sqlalchemy import create_engine
+import asyncio
+import weakref
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import sessionmaker
-from app.models.transaction import Base
+from sqlalchemy.schema import CreateIndex
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
+from app.core.config import config
+from app.models.transaction import Base, listing_indexes
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def _sqlite_pragmas():
+    return {
+        "journal_mode": config.sqlite_journal_mode,
+        "synchronous": config.sqlite_synchronous,
+        "mmap_size": config.sqlite_mmap_size,
+        # Negative values are in KiB rather than pages
+        "cache_size": -config.sqlite_cache_size_kib,
+        "busy_timeout": config.sqlite_busy_timeout_ms,
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in _sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def _pool_options(url):
+    # In-memory databases use a single connection, which takes no pool options
+    if make_url(url).database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": config.db_pool_size,
+        "max_overflow": config.db_max_overflow,
+        "pool_timeout": config.db_pool_timeout_seconds,
+    }
+
+
+def create_db_engine(url=None, **kwargs):
+    """
+    Creates a SQLite engine whose connections use the configured pragmas
+    (WAL, synchronous, mmap_size, cache_size, busy_timeout).
+    """
+    url = url or config.database_url
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        **{**_pool_options(url), **kwargs},
+    )
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def create_async_db_engine(url=None, **kwargs):
+    """
+    aiosqlite counterpart of create_db_engine for async endpoints: queries
+    run on the driver's thread instead of blocking the event loop.
+    """
+    url = make_url(url or config.database_url).set(drivername="sqlite+aiosqlite")
+    engine = create_async_engine(url, **{**_pool_options(url), **kwargs})
+    event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_db_engine()
+# Not expired on commit: attribute access after a commit would need IO
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # create_all skips the indexes of tables that already exist
+    with engine.begin() as conn:
+        for index in listing_indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
 
 
 def get_db():
@@ -20,3 +94,27 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# One lock per session: neither a Session nor an AsyncSession may be used by
+# two operations at once, and concurrent chunk tasks share one.
+_session_locks = weakref.WeakKeyDictionary()
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Awaits fn(session, *args, **kwargs) without blocking the event loop: via
+    run_sync() for an AsyncSession (the driver does the IO on its own
+    thread), or in a worker thread for a sync Session. Calls on the same
+    session are serialized.
+    """
+    lock = _session_locks.setdefault(db, asyncio.Lock())
+    async with lock:
+        if isinstance(db, AsyncSession):
+            return await db.run_sync(fn, *args, **kwargs)
+        return await asyncio.to_thread(fn, db, *args, **kwargs)
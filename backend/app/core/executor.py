@@ -0,0 +1,126 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import config
+
+
+class ExecutorBusyError(Exception):
+    """
+    Raised when a BoundedExecutor has no free slot; callers should retry
+    after `retry_after` seconds.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("Server is busy processing other documents")
+        self.retry_after = retry_after
+
+
+_DONE = object()
+
+
+class BoundedExecutor:
+    """
+    Thread pool with admission control, used to keep blocking work (PDF
+    parsing, model inference) off the asyncio event loop.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more wait
+    for a thread. Submitting beyond that raises ExecutorBusyError instead of
+    queueing without bound.
+    """
+
+    def __init__(self, max_workers, max_queue, retry_after=5, name="worker"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self):
+        """Jobs currently running or waiting for a thread."""
+        return self._pending
+
+    def _reserve(self):
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorBusyError(self.retry_after)
+        with self._lock:
+            self._pending += 1
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        self._reserve()
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Runs a blocking callable in the pool and awaits its result.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stream(self, gen_fn, *args):
+        """
+        Runs a blocking generator in the pool, holding a single slot for its
+        whole lifetime, and returns an async iterator over its items.
+
+        The slot is reserved immediately, so ExecutorBusyError is raised here
+        rather than once iteration has started.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def emit(item, error=None):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+            except RuntimeError:  # event loop already closed
+                stop.set()
+
+        def produce():
+            try:
+                for item in gen_fn(*args):
+                    if stop.is_set():
+                        break
+                    emit(item)
+            except Exception as e:
+                emit(None, e)
+            finally:
+                emit(_DONE)
+
+        self.submit(produce)
+
+        async def consume():
+            try:
+                while True:
+                    item, error = await queue.get()
+                    if error is not None:
+                        raise error
+                    if item is _DONE:
+                        return
+                    yield item
+            finally:
+                stop.set()
+
+        return consume()
+
+
+processing_executor = BoundedExecutor(
+    max_workers=config.processing_workers,
+    max_queue=config.processing_queue_depth,
+    retry_after=config.processing_retry_after_seconds,
+    name="document-processing",
+)
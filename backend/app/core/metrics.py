@@ -0,0 +1,46 @@
+import threading
+from collections import defaultdict
+
+
+class Metrics:
+    """
+    Minimal thread-safe in-process metrics registry, served by GET /api/metrics.
+
+    Counters only ever go up; gauges hold the latest value or are computed on
+    demand from a registered callable.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def gauge(self, name, fn):
+        """Registers a gauge whose value is read from fn() at snapshot time."""
+        self.set_gauge(name, fn)
+
+    def get(self, name, default=0):
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name]
+            value = self._gauges.get(name, default)
+        return value() if callable(value) else value
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        for name, value in gauges.items():
+            counters[name] = value() if callable(value) else value
+        return dict(sorted(counters.items()))
+
+
+metrics = Metrics()
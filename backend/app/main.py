@@ -1,9 +1,23 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import endpoints
-from app.core.database import init_db
+from app.core.database import SessionLocal, init_db
+from app.services.analysis_jobs import analysis_jobs, ensure_job_columns
+from app.services.merchant_index import ensure_merchant_index
+from app.services.transaction_store import ensure_natural_keys, ensure_search_index
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resumes analysis jobs interrupted by the previous shutdown
+    await analysis_jobs.start()
+    yield
+    await analysis_jobs.stop()
+
 
-app = FastAPI(title="Smart Finance API")
+app = FastAPI(title="Smart Finance API", lifespan=lifespan)
 
 # Allow CORS for frontend
 app.add_middleware(
@@ -12,10 +26,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor of the next /transactions page
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Initialize DB
 init_db()
+with SessionLocal() as db:
+    ensure_natural_keys(db)
+    ensure_search_index(db)
+    ensure_merchant_index(db)
+    ensure_job_columns(db)
 
 app.include_router(endpoints.router, prefix="/api")
 
@@ -1,4 +1,14 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import (
+    DDL,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    String,
+    event,
+    func,
+)
 from sqlalchemy.orm import declarative_base
 from datetime import datetime
 
@@ -9,7 +19,7 @@ class Transaction(Base):
     __tablename__ = "transactions"
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(DateTime, default=datetime.utcnow)
+    date = Column(DateTime, nullable=True)  # None when the statement date didn't parse
     description = Column(String, index=True)
     amount = Column(Float)
     category = Column(String, index=True)
@@ -19,9 +29,160 @@ class Transaction(Base):
     # Optional: Original raw text or metadata
     raw_text = Column(String, nullable=True)
 
+    # Natural key used to skip re-imported rows (see
+    # app/services/transaction_store.py): the normalized description, and
+    # which occurrence of an otherwise identical row this is, so a statement
+    # that really lists the same purchase twice keeps both.
+    description_key = Column(String, nullable=True)
+    occurrence = Column(Integer, default=1, nullable=False, server_default="1")
+
+
+# Newest-first listing and keyset pagination (see list_transactions)
+date_id_index = Index("ix_transactions_date_id", Transaction.date, Transaction.id)
+# The same order within one category or card, for filtered listings
+category_date_index = Index(
+    "ix_transactions_category_date",
+    Transaction.category,
+    Transaction.date,
+    Transaction.id,
+)
+card_date_index = Index(
+    "ix_transactions_card_date",
+    Transaction.card_last_four,
+    Transaction.date,
+    Transaction.id,
+)
+listing_indexes = [date_id_index, category_date_index, card_date_index]
+
+# NULLs never collide in a unique index, so the nullable columns are indexed
+# through coalesce(): undated rows (the date didn't parse) are deduplicated too.
+natural_key_index = Index(
+    "uq_transactions_natural_key",
+    func.coalesce(Transaction.date, ""),
+    Transaction.amount,
+    Transaction.description_key,
+    func.coalesce(Transaction.card_last_four, ""),
+    Transaction.occurrence,
+    unique=True,
+)
+
+# Full-text search over descriptions (see list_transactions). An external
+# content FTS5 table stores only the index; the triggers keep it in sync with
+# the transactions table. The trigram tokenizer matches any substring of 3+
+# characters, which also works for Chinese text without word boundaries.
+SEARCH_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5("
+    "description, content='transactions', content_rowid='id', "
+    "tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_insert "
+    "AFTER INSERT ON transactions BEGIN "
+    "INSERT INTO transactions_fts(rowid, description) "
+    "VALUES (new.id, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_delete "
+    "AFTER DELETE ON transactions BEGIN "
+    "INSERT INTO transactions_fts(transactions_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_update "
+    "AFTER UPDATE OF description ON transactions BEGIN "
+    "INSERT INTO transactions_fts(transactions_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); "
+    "INSERT INTO transactions_fts(rowid, description) "
+    "VALUES (new.id, new.description); END",
+]
+
+for statement in SEARCH_INDEX_DDL:
+    event.listen(Transaction.__table__, "after_create", DDL(statement))
+
 
 class Settings(Base):
     __tablename__ = "settings"
 
     key = Column(String, primary_key=True)
     value = Column(String)
+
+
+class ParsedDocument(Base):
+    """
+    Content-addressed cache of parsed PDFs, keyed by the SHA-256 of the
+    uploaded bytes plus the anonymizer version that produced the text.
+    """
+
+    __tablename__ = "parsed_documents"
+
+    cache_key = Column(String, primary_key=True)
+    content_sha256 = Column(String, index=True)
+    anonymizer_version = Column(String)
+    raw_text = Column(String)
+    anonymized_text = Column(String)
+    size_bytes = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class ExtractionResult(Base):
+    """
+    Cached LLM extraction output for one chunk of statement text, keyed by a
+    hash of the chunk and everything else that shapes the prompt.
+    """
+
+    __tablename__ = "llm_extraction_cache"
+
+    cache_key = Column(String, primary_key=True)
+    model = Column(String)
+    result_json = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class MerchantCategory(Base):
+    """
+    Merchant index: accumulated evidence that a normalised merchant name
+    belongs to a category, from saved transactions and user corrections.
+    """
+
+    __tablename__ = "merchant_categories"
+
+    merchant_key = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    weight = Column(Float, default=0.0)
+
+
+class AnalysisJob(Base):
+    """
+    A background /jobs/analyze run. Status goes queued -> running -> done
+    (or failed when some chunks could not be analyzed).
+    """
+
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True)
+    status = Column(String, index=True)
+    text = Column(String)
+    source_filename = Column(String)
+    language = Column(String)
+    model = Column(String)
+    chunks_total = Column(Integer, default=0)
+    chunks_done = Column(Integer, default=0)
+    chunks_failed = Column(Integer, default=0)
+    transactions_added = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AnalysisJobChunk(Base):
+    """
+    Per-chunk progress of an AnalysisJob. `extracted_json` keeps the chunk's
+    rows so an interrupted job can resume without re-analyzing it;
+    `saved_json` the rows it saved (or skipped as already stored), whose
+    occurrence numbers a resumed job continues from.
+    """
+
+    __tablename__ = "analysis_job_chunks"
+
+    job_id = Column(String, primary_key=True)
+    chunk_index = Column(Integer, primary_key=True)
+    status = Column(String)
+    extracted_json = Column(String, nullable=True)
+    transaction_ids = Column(String, nullable=True)
+    saved_json = Column(String, nullable=True)
+    error = Column(String, nullable=True)
@@ -27,6 +27,7 @@ class TransactionUpdate(BaseModel):
 
 class Transaction(TransactionBase):
     id: int
+    date: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,331 @@
+import asyncio
+import contextlib
+import json
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, inspect, or_, text, update
+from sqlalchemy.orm import Session
+
+from app.core.config import config
+from app.core.database import SessionLocal, run_db
+from app.models.transaction import AnalysisJob, AnalysisJobChunk
+from app.models.transaction import Transaction as TransactionModel
+from app.services.llm_client import stream_analysis
+from app.services.settings_store import settings_store
+from app.services.transaction_store import natural_key_counts, save_transactions
+
+
+def job_status(job: AnalysisJob):
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "source_filename": job.source_filename,
+        "chunks_total": job.chunks_total,
+        "chunks_done": job.chunks_done,
+        "chunks_failed": job.chunks_failed,
+        "transactions_added": job.transactions_added,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+def job_transactions(db: Session, job_id):
+    """
+    Returns the transactions saved so far by a job, in chunk order.
+    """
+    chunks = (
+        db.query(AnalysisJobChunk)
+        .filter(
+            AnalysisJobChunk.job_id == job_id,
+            AnalysisJobChunk.status == "done",
+        )
+        .order_by(AnalysisJobChunk.chunk_index)
+    )
+    ids = [i for chunk in chunks for i in json.loads(chunk.transaction_ids or "[]")]
+    rows = db.query(TransactionModel).filter(TransactionModel.id.in_(ids))
+    by_id = {t.id: t for t in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def ensure_job_columns(db: Session):
+    """
+    Adds columns introduced after the job tables were first created.
+    """
+    columns = {
+        column["name"]
+        for column in inspect(db.get_bind()).get_columns("analysis_job_chunks")
+    }
+    if "saved_json" not in columns:
+        db.execute(
+            text("ALTER TABLE analysis_job_chunks ADD COLUMN saved_json VARCHAR")
+        )
+        db.commit()
+
+
+class AnalysisJobRunner:
+    """
+    Runs /analyze_text work in the background so it survives the HTTP
+    request that submitted it.
+
+    Jobs are persisted in SQLite and picked up by `workers` asyncio workers;
+    each chunk's transactions are committed together with its progress row.
+    A job is claimed with a conditional UPDATE, so when several processes
+    (uvicorn workers) know about it only one runs it. Every `stale_after / 3`
+    seconds a runner touches the jobs it is running and queues the ones
+    nobody touched for `stale_after` seconds, so the jobs of a crashed
+    process are resumed even if it restarts right away: chunks already done
+    are not analyzed or saved again. Database work runs in worker threads,
+    off the event loop.
+    """
+
+    def __init__(self, session_factory=SessionLocal, workers=2, stale_after=None):
+        self._session_factory = session_factory
+        self._worker_count = workers
+        self._stale_after = (
+            config.analysis_job_stale_seconds if stale_after is None else stale_after
+        )
+        self._queue = None
+        self._workers = []
+        # Jobs in our queue, and jobs we are running
+        self._queued = set()
+        self._active = set()
+
+    def _resumable(self):
+        stale_before = datetime.utcnow() - timedelta(seconds=self._stale_after)
+        return or_(
+            AnalysisJob.status == "queued",
+            and_(
+                AnalysisJob.status == "running", AnalysisJob.updated_at < stale_before
+            ),
+        )
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(self._worker_count)
+        ]
+        self._workers.append(asyncio.create_task(self._watch()))
+        await self._enqueue_resumable()
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._queued.clear()
+        if self._active:
+            # Interrupted jobs go back to the queue for the next start
+            await asyncio.to_thread(self._requeue, set(self._active))
+            self._active.clear()
+
+    def _session(self):
+        return contextlib.closing(self._session_factory())
+
+    def _requeue(self, job_ids):
+        with self._session() as db:
+            db.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.id.in_(job_ids), AnalysisJob.status == "running")
+                .values(status="queued"),
+                execution_options={"synchronize_session": False},
+            )
+            db.commit()
+
+    def _enqueue(self, job_id):
+        if self._queue is not None and job_id not in self._queued | self._active:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    def _find_resumable(self):
+        with self._session() as db:
+            return [
+                job_id
+                for (job_id,) in db.query(AnalysisJob.id)
+                .filter(self._resumable())
+                .order_by(AnalysisJob.created_at)
+            ]
+
+    async def _enqueue_resumable(self):
+        for job_id in await asyncio.to_thread(self._find_resumable):
+            if job_id not in self._queued | self._active:
+                print(f"DEBUG: Resuming analysis job {job_id}")
+            self._enqueue(job_id)
+
+    def _heartbeat(self, job_ids):
+        with self._session() as db:
+            db.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.id.in_(job_ids), AnalysisJob.status == "running")
+                .values(updated_at=datetime.utcnow()),
+                execution_options={"synchronize_session": False},
+            )
+            db.commit()
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self._stale_after / 3)
+            try:
+                if self._active:
+                    await asyncio.to_thread(self._heartbeat, set(self._active))
+                await self._enqueue_resumable()
+            except Exception as e:
+                print(f"Error checking analysis jobs: {e}")
+
+    def submit(self, db: Session, text, source_filename, language, model):
+        now = datetime.utcnow()
+        job = AnalysisJob(
+            id=uuid.uuid4().hex,
+            status="queued",
+            text=text,
+            source_filename=source_filename,
+            language=language,
+            model=model,
+            created_at=now,
+            updated_at=now,
+        )
+        db.add(job)
+        db.commit()
+        self._enqueue(job.id)
+        return job
+
+    def retry(self, db: Session, job_id):
+        """
+        Queues a failed job again; its failed chunks are analyzed again and
+        the done ones are kept. Returns False if the job had not failed.
+        """
+        requeued = db.execute(
+            update(AnalysisJob)
+            .where(AnalysisJob.id == job_id, AnalysisJob.status == "failed")
+            .values(status="queued", error=None, updated_at=datetime.utcnow()),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.commit()
+        if requeued:
+            self._enqueue(job_id)
+        return bool(requeued)
+
+    def _claim(self, db: Session, job_id):
+        claimed = db.execute(
+            update(AnalysisJob)
+            .where(AnalysisJob.id == job_id, self._resumable())
+            .values(status="running", updated_at=datetime.utcnow()),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.commit()
+        return claimed == 1
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self.run(job_id)
+            except Exception as e:
+                print(f"Error running analysis job {job_id}: {e}")
+                self._active.discard(job_id)
+                await asyncio.to_thread(self._fail, job_id, str(e))
+            finally:
+                self._queue.task_done()
+
+    def _fail(self, job_id, error):
+        with self._session() as db:
+            job = db.get(AnalysisJob, job_id)
+            if job is not None:
+                job.status = "failed"
+                job.error = error
+                job.updated_at = datetime.utcnow()
+                db.commit()
+
+    def _prepare(self, db: Session, job_id):
+        """
+        Claims the job and clears its failed chunks. Returns what run() needs,
+        as plain values, or None if the job was not claimed.
+        """
+        # Another worker (or process) already runs or finished it
+        if not self._claim(db, job_id):
+            return None
+        job = db.get(AnalysisJob, job_id)
+        api_key = settings_store.get(db, "api_key")
+        base_url = settings_store.get(db, "base_url", "https://openrouter.ai/api/v1")
+        if not api_key:
+            raise ValueError("API Key not configured")
+
+        previous = db.query(AnalysisJobChunk).filter(AnalysisJobChunk.job_id == job_id)
+        completed = {}
+        # Occurrences used by the chunks saved so far, so a repeated
+        # purchase in a later chunk isn't taken for one of them
+        occurrences = Counter()
+        for chunk in previous.filter(AnalysisJobChunk.status == "done"):
+            completed[chunk.chunk_index] = json.loads(chunk.extracted_json)
+            occurrences.update(
+                natural_key_counts(json.loads(chunk.saved_json or chunk.extracted_json))
+            )
+        previous.filter(AnalysisJobChunk.status == "failed").delete()
+        job.chunks_failed = 0
+        job.error = None
+        request = (job.text, api_key, base_url, job.model, job.language)
+        db.commit()
+        return job, request, completed, occurrences
+
+    def _finish(self, db: Session, job: AnalysisJob):
+        job.status = "failed" if job.chunks_failed else "done"
+        job.updated_at = datetime.utcnow()
+        db.commit()
+
+    async def run(self, job_id):
+        """
+        Analyzes (or resumes) one job. Chunks that failed in an earlier run
+        are retried.
+        """
+        db = self._session_factory()
+        try:
+            self._active.add(job_id)
+            prepared = await run_db(db, self._prepare, job_id)
+            if prepared is None:
+                self._active.discard(job_id)
+                return
+            job, request, completed, occurrences = prepared
+
+            async for result in stream_analysis(*request, db=db, completed=completed):
+                await run_db(db, self._record_chunk, job, result, occurrences)
+
+            await run_db(db, self._finish, job)
+            self._active.discard(job_id)
+        finally:
+            await asyncio.to_thread(db.close)
+
+    def _record_chunk(self, db: Session, job: AnalysisJob, result, occurrences):
+        chunk = AnalysisJobChunk(job_id=job.id, chunk_index=result.index)
+        job.chunks_total = result.chunks
+        job.updated_at = datetime.utcnow()
+        if result.error is not None:
+            chunk.status = "failed"
+            chunk.error = str(result.error)
+            job.chunks_failed += 1
+            job.error = chunk.error
+        else:
+            added = save_transactions(
+                db,
+                result.transactions,
+                job.source_filename,
+                commit=False,
+                occurrences=occurrences,
+            ).inserted
+            chunk.status = "done"
+            chunk.extracted_json = json.dumps(result.extracted, ensure_ascii=False)
+            chunk.saved_json = json.dumps(
+                result.transactions, ensure_ascii=False, default=str
+            )
+            chunk.transaction_ids = json.dumps([t.id for t in added])
+            job.chunks_done += 1
+            job.transactions_added += len(added)
+        # The chunk's transactions and its progress row commit together
+        db.merge(chunk)
+        db.commit()
+
+
+analysis_jobs = AnalysisJobRunner(workers=config.analysis_job_workers)
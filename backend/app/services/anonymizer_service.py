@@ -0,0 +1,93 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class AnonymizerService:
+    """
+    Background worker that owns the anonymization model and runs concurrent
+    requests through it in micro-batches.
+
+    Callers submit text segments and receive futures. The worker collects
+    segments until it has `max_batch_size` of them or `max_wait_ms` has
+    passed since the first one arrived, runs them through the model in one
+    call, and resolves each future with its own result. If the model fails,
+    or returns a different number of results than it was given, every future
+    in the batch fails with the error.
+
+    Args:
+        model_factory: Zero-argument callable returning the model; called once,
+            on the worker thread, before the first batch. The model must accept
+            a list of strings and return a list of strings.
+        max_batch_size: Maximum number of segments per model call.
+        max_wait_ms: How long to wait for a batch to fill up.
+    """
+
+    def __init__(self, model_factory, max_batch_size=16, max_wait_ms=10):
+        self._model_factory = model_factory
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._requests = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="anonymizer-service", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, segment):
+        """
+        Queues one text segment and returns a Future for its anonymized text.
+        """
+        self._ensure_started()
+        future = Future()
+        self._requests.put((segment, future))
+        return future
+
+    def _next_batch(self):
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        model = None
+        while True:
+            batch = [
+                (segment, future)
+                for segment, future in self._next_batch()
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            segments = [segment for segment, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                if model is None:
+                    model = self._model_factory()
+                results = list(model(segments))
+                if len(results) != len(segments):
+                    # Which output belongs to which segment is unknown, so
+                    # none of them can be trusted
+                    raise ValueError(
+                        f"Model returned {len(results)} results "
+                        f"for {len(segments)} segments"
+                    )
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
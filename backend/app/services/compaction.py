@@ -0,0 +1,162 @@
+import bisect
+import re
+from collections import Counter
+from typing import NamedTuple
+
+from app.services.layout_parsers import has_date_or_amount, looks_like_transaction
+from app.services.tokens import count_tokens
+
+# "Page 2 of 5", "第 2 页 / 共 5 页"
+_PAGE_REF = (
+    r"(?:page\s*\d+(?:\s*(?:of|/)\s*\d+)?|第\s*\d+\s*页(?:\s*[/,，]?\s*共\s*\d+\s*页)?)"
+)
+_PAGE_REFERENCE = re.compile(_PAGE_REF, re.IGNORECASE)
+# A line that is only a page number, including "- 2 -"
+_PAGE_MARKER = re.compile(rf"^(?:{_PAGE_REF}|-\s*\d+\s*-)$", re.IGNORECASE)
+_DIGITS = re.compile(r"\d+")
+
+
+class CompactedText(NamedTuple):
+    """
+    Compacted statement text. `line_map[i]` is the (0-based) line number in
+    the original text that compacted line i came from.
+    """
+
+    text: str
+    line_map: list
+    original_bytes: int
+    original_tokens: int
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.text.encode())
+
+    @property
+    def tokens_saved(self):
+        return self.original_tokens - count_tokens(self.text)
+
+
+def _boilerplate_key(line):
+    """
+    Key under which a line's repeats are counted, or None if it must never
+    be dropped. Page numbers and dates change from page to page in headers
+    and footers, so they are masked. Lines that look like transactions are
+    only candidates when they carry a page number ("Statement period
+    2023-10-01 to 2023-10-31 Page 2 of 5"), so repeat purchases are safe.
+    """
+    if not looks_like_transaction(line):
+        return _DIGITS.sub("#", line)
+    if _PAGE_REFERENCE.search(line):
+        return _PAGE_REFERENCE.sub("#", line)
+    return None
+
+
+def _is_page_line(line):
+    return bool(_PAGE_MARKER.match(line) or _PAGE_REFERENCE.search(line))
+
+
+def _boundary_lines(lines, candidates):
+    """
+    Indexes of the lines that sit at page boundaries: runs of consecutive
+    repeated lines (blank lines ignored) that contain a page number line or
+    a page reference, or that touch the start or end of the text. Page
+    headers and footers form such runs; a repeated continuation line
+    between two transaction rows does not.
+    """
+    runs = []
+    run = []
+    for number, line in enumerate(lines):
+        if not line:
+            continue
+        if candidates[number] or _PAGE_MARKER.match(line):
+            run.append(number)
+            continue
+        runs.append((run, number))
+        run = []
+    runs.append((run, None))
+
+    boundary = set()
+    first = next((number for number, line in enumerate(lines) if line), None)
+    for run, next_line in runs:
+        if not run:
+            continue
+        at_edge = run[0] == first or next_line is None
+        if at_edge or any(_is_page_line(lines[number]) for number in run):
+            boundary.update(run)
+    return boundary
+
+
+def _prose_lines(lines, table_margin):
+    """
+    Indexes of the lines outside table regions: lines without any digit
+    (so no date, amount, card number or year) more than `table_margin`
+    non-blank lines away from a line with a date or an amount. Column
+    titles and continuation lines next to the rows are kept, and text with
+    no date or amount at all has no detected table, so nothing is dropped.
+    """
+    numbers = [
+        number
+        for number, line in enumerate(lines)
+        if line and not _PAGE_MARKER.match(line)
+    ]
+    anchors = [
+        position
+        for position, number in enumerate(numbers)
+        if has_date_or_amount(lines[number])
+    ]
+    prose = set()
+    if not anchors:
+        return prose
+    for position, number in enumerate(numbers):
+        if _DIGITS.search(lines[number]):
+            continue
+        after = bisect.bisect_left(anchors, position)
+        nearby = [anchors[i] for i in (after - 1, after) if 0 <= i < len(anchors)]
+        if min(abs(anchor - position) for anchor in nearby) > table_margin:
+            prose.add(number)
+    return prose
+
+
+def compact_statement_text(text, min_repeats=3, table_margin=2):
+    """
+    Shrinks statement text before it is chunked and sent to the LLM:
+
+    - whitespace runs are collapsed and blank lines dropped;
+    - page number lines are dropped;
+    - lines that repeat at least `min_repeats` times, ignoring page numbers
+      and dates, always at page boundaries (page headers, footers, column
+      titles, legal notices) are kept only where they first appear.
+      Repeated lines that also occur inside a page, such as continuation
+      lines of multi-line rows, are all kept;
+    - lines without digits further than `table_margin` lines from any line
+      with a date or an amount (one-off legal notices, marketing copy) are
+      dropped; see _prose_lines.
+
+    Lines that look like transactions are kept even when repeated, unless
+    they also carry a page number.
+    """
+    lines = [" ".join(line.split()) for line in text.split("\n")]
+    prose = _prose_lines(lines, table_margin)
+    keys = [_boilerplate_key(line) if line else None for line in lines]
+    repeats = Counter(key for key in keys if key is not None)
+    candidates = [key is not None and repeats[key] >= min_repeats for key in keys]
+    boundary = _boundary_lines(lines, candidates)
+    at_boundary = Counter(keys[number] for number in boundary if candidates[number])
+    boilerplate = {key for key, count in at_boundary.items() if count == repeats[key]}
+
+    kept = []
+    line_map = []
+    seen = set()
+    for number, (line, key) in enumerate(zip(lines, keys)):
+        if not line or _PAGE_MARKER.match(line) or number in prose:
+            continue
+        if key in boilerplate:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(line)
+        line_map.append(number)
+
+    return CompactedText(
+        "\n".join(kept), line_map, len(text.encode()), count_tokens(text)
+    )
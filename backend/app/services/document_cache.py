@@ -0,0 +1,98 @@
+import hashlib
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import config
+from app.models.transaction import ParsedDocument
+from app.services.pdf_processor import ANONYMIZER_VERSION
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _cache_key(sha256: str, anonymizer_version: str) -> str:
+    return f"{sha256}:{anonymizer_version}"
+
+
+def get_cached_document(
+    db: Session, sha256: str, anonymizer_version: str = ANONYMIZER_VERSION
+):
+    """
+    Returns the cached ParsedDocument for these bytes and anonymizer version,
+    refreshing its LRU timestamp, or None on a miss.
+    """
+    if not config.document_cache_enabled:
+        return None
+    document = db.get(ParsedDocument, _cache_key(sha256, anonymizer_version))
+    if document:
+        document.last_accessed_at = datetime.utcnow()
+        db.commit()
+    return document
+
+
+def get_cached_raw_text(db: Session, sha256: str):
+    """
+    Returns previously extracted raw text for these bytes, whatever anonymizer
+    version produced the entry, so a version bump only re-runs anonymization.
+    """
+    if not config.document_cache_enabled:
+        return None
+    document = (
+        db.query(ParsedDocument)
+        .filter(ParsedDocument.content_sha256 == sha256)
+        .order_by(ParsedDocument.last_accessed_at.desc())
+        .first()
+    )
+    return document.raw_text if document else None
+
+
+def store_document(
+    db: Session,
+    sha256: str,
+    raw_text: str,
+    anonymized_text: str,
+    anonymizer_version: str = ANONYMIZER_VERSION,
+):
+    if not config.document_cache_enabled:
+        return
+    now = datetime.utcnow()
+    db.merge(
+        ParsedDocument(
+            cache_key=_cache_key(sha256, anonymizer_version),
+            content_sha256=sha256,
+            anonymizer_version=anonymizer_version,
+            raw_text=raw_text,
+            anonymized_text=anonymized_text,
+            size_bytes=len(raw_text.encode()) + len(anonymized_text.encode()),
+            created_at=now,
+            last_accessed_at=now,
+        )
+    )
+    db.commit()
+    _evict(db, config.document_cache_max_bytes)
+
+
+def _evict(db: Session, max_bytes: int):
+    """
+    Deletes least recently used entries until the cache fits in max_bytes.
+    """
+    total = db.query(func.coalesce(func.sum(ParsedDocument.size_bytes), 0)).scalar()
+    if total <= max_bytes:
+        return
+
+    lru = db.query(ParsedDocument.cache_key, ParsedDocument.size_bytes).order_by(
+        ParsedDocument.last_accessed_at.asc()
+    )
+    evicted = []
+    for cache_key, size_bytes in lru:
+        if total <= max_bytes:
+            break
+        evicted.append(cache_key)
+        total -= size_bytes
+    db.query(ParsedDocument).filter(ParsedDocument.cache_key.in_(evicted)).delete(
+        synchronize_session=False
+    )
+    db.commit()
@@ -0,0 +1,79 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from app.core.config import config
+from app.core.metrics import metrics
+from app.models.transaction import ExtractionResult
+
+
+def extraction_key(chunk, model, language, categories, prompt_version):
+    """
+    Hashes a chunk together with everything else that determines the LLM's
+    answer, so a change to any of them is a cache miss.
+    """
+    payload = json.dumps(
+        [prompt_version, model, language, list(categories), chunk],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cutoff():
+    return datetime.utcnow() - timedelta(seconds=config.llm_cache_ttl_seconds)
+
+
+def get_cached_extractions(db: Session, keys):
+    """
+    Returns {cache_key: transactions} for the keys with a live cache entry,
+    counting hits and misses in the llm.extraction_cache_* metrics.
+    """
+    if not config.llm_cache_enabled or not keys:
+        return {}
+    rows = (
+        db.query(ExtractionResult.cache_key, ExtractionResult.result_json)
+        .filter(
+            ExtractionResult.cache_key.in_(set(keys)),
+            ExtractionResult.created_at >= _cutoff(),
+        )
+        .all()
+    )
+    found = {cache_key: json.loads(result_json) for cache_key, result_json in rows}
+    hits = sum(1 for key in keys if key in found)
+    metrics.incr("llm.extraction_cache_hits", hits)
+    metrics.incr("llm.extraction_cache_misses", len(keys) - hits)
+    return found
+
+
+def store_extractions(db: Session, results, model):
+    """
+    Stores {cache_key: transactions} and drops entries older than the TTL.
+    """
+    if not config.llm_cache_enabled or not results:
+        return
+    now = datetime.utcnow()
+    for cache_key, transactions in results.items():
+        db.merge(
+            ExtractionResult(
+                cache_key=cache_key,
+                model=model,
+                result_json=json.dumps(transactions, ensure_ascii=False),
+                created_at=now,
+            )
+        )
+    db.commit()
+    evict_expired_extractions(db)
+
+
+def evict_expired_extractions(db: Session):
+    evicted = (
+        db.query(ExtractionResult)
+        .filter(ExtractionResult.created_at < _cutoff())
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    if evicted:
+        metrics.incr("llm.extraction_cache_evicted", evicted)
+    return evicted
@@ -0,0 +1,121 @@
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import config
+from app.core.database import SessionLocal
+from app.services.llm_client import analyze_transactions
+from app.services.pdf_processor import anonymize_text, extract_text_from_pdf
+from app.services.transaction_store import save_transactions
+
+# Per-stage global limits. Each file moves through the stages independently,
+# so extraction of one file overlaps anonymization and LLM analysis of the
+# others, and wall-clock time tends towards the slowest stage.
+_extract_pool = ThreadPoolExecutor(
+    max_workers=config.ingest_extract_concurrency, thread_name_prefix="ingest-extract"
+)
+_anonymize_pool = ThreadPoolExecutor(
+    max_workers=config.ingest_anonymize_concurrency,
+    thread_name_prefix="ingest-anonymize",
+)
+_analysis_limits = weakref.WeakKeyDictionary()
+
+
+def _analysis_slots():
+    loop = asyncio.get_running_loop()
+    if loop not in _analysis_limits:
+        _analysis_limits[loop] = asyncio.Semaphore(config.ingest_analyze_concurrency)
+    return _analysis_limits[loop]
+
+
+def _extract(path):
+    text = extract_text_from_pdf(path)
+    if text.startswith("Error reading PDF"):
+        raise ValueError(text)
+    if not text.strip():
+        raise ValueError("No text found in PDF")
+    return text
+
+
+def _save(items, filename):
+    db = SessionLocal()
+    try:
+        return len(save_transactions(db, items, filename).inserted)
+    finally:
+        db.close()
+
+
+async def ingest_statements(files, api_key, base_url, model, language="zh"):
+    """
+    Pipelines several statements through extraction, anonymization, LLM
+    analysis and saving.
+
+    Args:
+        files: List of (filename, pdf_path) tuples.
+
+    Yields:
+        dict: A status record whenever a file enters a new stage
+            ("extracting", "anonymizing", "analyzing", "saving", then "done"
+            or "failed"), followed by a final summary record.
+    """
+    loop = asyncio.get_running_loop()
+    updates = asyncio.Queue()
+
+    def report(index, filename, status, **extra):
+        updates.put_nowait(
+            {"index": index, "filename": filename, "status": status, **extra}
+        )
+
+    async def process(index, filename, path):
+        try:
+            report(index, filename, "extracting")
+            raw_text = await loop.run_in_executor(_extract_pool, _extract, path)
+
+            report(index, filename, "anonymizing")
+            clean_text = await loop.run_in_executor(
+                _anonymize_pool, anonymize_text, raw_text
+            )
+
+            report(index, filename, "analyzing")
+            async with _analysis_slots():
+                db = SessionLocal()
+                try:
+                    items = await analyze_transactions(
+                        clean_text, api_key, base_url, model, language, db=db
+                    )
+                finally:
+                    db.close()
+
+            report(index, filename, "saving")
+            added = await loop.run_in_executor(None, _save, items, filename)
+            report(index, filename, "done", transactions_added=added)
+        except Exception as e:
+            report(index, filename, "failed", error=str(e))
+
+    tasks = [
+        asyncio.create_task(process(index, filename, path))
+        for index, (filename, path) in enumerate(files)
+    ]
+    remaining = len(tasks)
+    succeeded = 0
+    transactions_added = 0
+    try:
+        while remaining:
+            record = await updates.get()
+            if record["status"] in ("done", "failed"):
+                remaining -= 1
+            if record["status"] == "done":
+                succeeded += 1
+                transactions_added += record["transactions_added"]
+            yield record
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        "done": True,
+        "files": len(files),
+        "succeeded": succeeded,
+        "failed": len(files) - succeeded,
+        "transactions_added": transactions_added,
+    }
@@ -0,0 +1,88 @@
+import json
+
+
+class JsonArrayStreamParser:
+    """
+    Incrementally parses a JSON array of objects as text arrives, e.g. from a
+    streaming LLM response.
+
+    feed() returns every top-level object completed by the new text, so
+    callers can use each transaction while the rest is still generated.
+    Text before the opening "[" (such as a ```json fence) is skipped, objects
+    that are not valid JSON are counted in `malformed` and dropped, and an
+    object left unfinished when the stream ends is ignored instead of
+    failing the whole response.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start = None
+        self.malformed = 0
+
+    @property
+    def started(self):
+        """True once the opening "[" of the array has been seen."""
+        return self._started
+
+    @property
+    def truncated(self):
+        """True when the text so far ends inside an unfinished object."""
+        return self._depth > 0
+
+    def feed(self, text):
+        self._buffer += text
+        buffer = self._buffer
+        items = []
+        i = self._pos
+        while i < len(buffer) and not self._finished:
+            char = buffer[i]
+            if not self._started:
+                self._started = char == "["
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._item_start = i
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    self._finished = char == "]"
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        item = self._parse(buffer[self._item_start : i + 1])
+                        if item is not None:
+                            items.append(item)
+            i += 1
+
+        # Only keep the unfinished object, so memory stays flat
+        cut = self._item_start if self._depth else i
+        self._buffer = buffer[cut:]
+        self._pos = i - cut
+        if self._depth:
+            self._item_start = 0
+        return items
+
+    def _parse(self, text):
+        try:
+            item = json.loads(text)
+        except ValueError:
+            self.malformed += 1
+            return None
+        if not isinstance(item, dict):
+            self.malformed += 1
+            return None
+        return item
@@ -0,0 +1,210 @@
+import datetime
+import re
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+# A line that may belong to a transaction (a date or a decimal amount) but
+# did not match the layout's row pattern, e.g. a wrapped description.
+_TRANSACTION_LIKE = re.compile(
+    r"\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\b\d{1,2}/\d{1,2}\b|\d\.\d{2}\b"
+)
+# Statement summary lines that carry amounts but are not transactions.
+_SUMMARY_LINE = re.compile(
+    r"total|balance|payment due|minimum|合计|总计|余额|应还|最低还款", re.IGNORECASE
+)
+# Card repayments, which the extraction prompt also tells the LLM to ignore.
+_REPAYMENT = re.compile(r"\b(?:re)?payments?\b|\bautopay\b|还款", re.IGNORECASE)
+# Full dates in the statement's header or summary ("账单日 2024-01-05",
+# "Statement period 2023-12-06 to 2024-01-05", "2024年01月05日").
+_FULL_DATE = re.compile(r"(\d{4})\s*[-/.年]\s*(\d{1,2})\s*[-/.月]\s*(\d{1,2})")
+# Row dates without a year, as returned by _month_day
+_MONTH_DAY = re.compile(r"^\d{2}-\d{2}$")
+
+
+def has_date_or_amount(line):
+    return bool(_TRANSACTION_LIKE.search(line))
+
+
+def looks_like_transaction(line):
+    """
+    True for lines that may belong to a transaction: they carry a date or an
+    amount and are not a statement summary line.
+    """
+    return has_date_or_amount(line) and not _SUMMARY_LINE.search(line)
+
+
+@dataclass(frozen=True)
+class StatementLayout:
+    """
+    A known statement layout.
+
+    Attributes:
+        name: Identifier reported in logs.
+        header: Column titles that must all appear on one line to recognise
+            the layout.
+        row_pattern: Regex matched against each line after the header.
+        to_transaction: Turns a row match into a transaction dict. A "Date"
+            without a year can be given as "MM-DD"; the year is then taken
+            from the statement date (see parse_known_layout).
+    """
+
+    name: str
+    header: tuple
+    row_pattern: re.Pattern
+    to_transaction: Callable[[re.Match], dict]
+
+    def matches_header(self, line):
+        return all(title in line for title in self.header)
+
+
+_LAYOUTS = []
+
+
+def register_layout(layout: StatementLayout):
+    """
+    Adds a layout to the registry. Layouts registered later take precedence.
+    """
+    _LAYOUTS.insert(0, layout)
+    return layout
+
+
+def get_layouts():
+    return list(_LAYOUTS)
+
+
+def _amount(value):
+    return float(value.replace(",", ""))
+
+
+def detect_layout(lines) -> Optional[tuple]:
+    """
+    Returns (layout, header_line_index) for the first registered layout whose
+    header fingerprint appears in the text, or None.
+    """
+    for layout in _LAYOUTS:
+        for index, line in enumerate(lines):
+            if layout.matches_header(line):
+                return layout, index
+    return None
+
+
+def parse_known_layout(text, min_rows=1):
+    """
+    Parses statement text with a registered layout.
+
+    Many statements are clean tables whose rows survive pdfplumber's text
+    extraction as one line per transaction. When a layout is recognised by
+    its column-header fingerprint, its rows become the Date/Description/
+    Amount/CardLastFour dicts /analyze_text consumes without an LLM call.
+
+    Returns:
+        list[dict] | None: Uncategorised transaction dicts, or None when no
+        layout matches or when some transaction-like lines could not be
+        parsed (so the caller falls back to the LLM instead of losing rows).
+    """
+    lines = [line.strip() for line in text.split("\n")]
+    detected = detect_layout(lines)
+    if detected is None:
+        return None
+    layout, header_index = detected
+
+    rows = []
+    unparsed = 0
+    other_lines = lines[:header_index]
+    for line in lines[header_index + 1 :]:
+        if layout.matches_header(line):  # repeated on every page
+            continue
+        match = layout.row_pattern.match(line)
+        if match:
+            row = layout.to_transaction(match)
+            if not _REPAYMENT.search(str(row.get("Description") or "")):
+                rows.append(row)
+        else:
+            other_lines.append(line)
+            if looks_like_transaction(line):
+                unparsed += 1
+
+    if unparsed or len(rows) < min_rows:
+        print(
+            f"DEBUG: Layout '{layout.name}' matched but {unparsed} rows were "
+            "unparseable, falling back to LLM extraction"
+        )
+        return None
+    statement_date = _statement_date(other_lines)
+    for row in rows:
+        if _MONTH_DAY.match(str(row.get("Date") or "")):
+            row["Date"] = _with_year(row["Date"], statement_date)
+    print(f"DEBUG: Parsed {len(rows)} rows with layout '{layout.name}'")
+    return rows
+
+
+def _statement_date(lines):
+    """
+    The latest full date outside the transaction rows (statement date, end
+    of the statement period or due date), or today if there is none.
+    """
+    dates = []
+    for line in lines:
+        for year, month, day in _FULL_DATE.findall(line):
+            try:
+                dates.append(datetime.date(int(year), int(month), int(day)))
+            except ValueError:
+                continue
+    return max(dates, default=datetime.date.today())
+
+
+def _with_year(month_day, statement_date):
+    """
+    Dates the "MM-DD" of a row within the year up to `statement_date`: a
+    statement closing in January lists December rows of the previous year.
+    """
+    month, day = (int(part) for part in month_day.split("-"))
+    year = statement_date.year
+    if (month, day) > (statement_date.month, statement_date.day):
+        year -= 1
+    return f"{year}-{month:02d}-{day:02d}"
+
+
+# ISO-dated single-card statements: "2023-10-01 UBER TRIP 25.50"
+register_layout(
+    StatementLayout(
+        name="date_description_amount",
+        header=("Date", "Description", "Amount"),
+        row_pattern=re.compile(
+            r"^(?P<date>\d{4}-\d{2}-\d{2})\s+(?P<description>.+?)\s+"
+            r"(?P<amount>-?[\d,]+\.\d{2})$"
+        ),
+        to_transaction=lambda m: {
+            "Date": m["date"],
+            "Description": m["description"],
+            "Amount": _amount(m["amount"]),
+            "CardLastFour": None,
+        },
+    )
+)
+
+
+def _month_day(value):
+    month, day = (int(part) for part in value.split("/"))
+    return f"{month:02d}-{day:02d}"
+
+
+# Chinese credit card statements with transaction/posting dates and the card's
+# last four digits: "10/05 10/06 美团外卖 38.50 1234 38.50"
+register_layout(
+    StatementLayout(
+        name="cn_credit_card",
+        header=("交易日", "交易摘要", "人民币金额", "卡号末四位"),
+        row_pattern=re.compile(
+            r"^(?P<date>\d{1,2}/\d{1,2})\s+(?:\d{1,2}/\d{1,2}\s+)?"
+            r"(?P<description>.+?)\s+(?P<amount>-?[\d,]+\.\d{2})\s+"
+            r"(?P<card>\d{4})(?:\s+.*)?$"
+        ),
+        to_transaction=lambda m: {
+            "Date": _month_day(m["date"]),
+            "Description": m["description"],
+            "Amount": _amount(m["amount"]),
+            "CardLastFour": m["card"],
+        },
+    )
+)
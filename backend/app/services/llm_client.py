@@ -1,15 +1,38 @@
 import datetime
+import hashlib
 import warnings
 import asyncio
+from typing import NamedTuple, Optional
 
 import pandas as pd
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import AIMessage, BaseMessage
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_experimental.agents import create_pandas_dataframe_agent
 
+from app.core.config import config
+from app.core.database import run_db
+from app.core.metrics import metrics
+from app.services.compaction import compact_statement_text
+from app.services.extraction_cache import (
+    extraction_key,
+    get_cached_extractions,
+    store_extractions,
+)
+from app.services.json_stream import JsonArrayStreamParser
+from app.services.layout_parsers import parse_known_layout
+from app.services.merchant_index import lookup_categories
+from app.services.prompts import (
+    build_categorization_messages,
+    build_extraction_messages,
+    record_prompt_usage,
+)
+from app.services.llm_hedging import llm_hedger
+from app.services.llm_registry import build_registry
+from app.services.llm_scheduler import LLMUnavailableError, llm_scheduler
+from app.services.tokens import context_limit, count_tokens, output_limit
+
 CATEGORIES = [
     "住房",
     "餐饮",
@@ -60,14 +83,84 @@ class OpenRouterChatOpenAI(ChatOpenAI):
 
         return message_dict
 
+    # Set on the chat agent's client so slow turns are hedged (see
+    # app/services/llm_hedging.py); chunk extraction is hedged per chunk.
+    hedged: bool = False
+
+    def _for_model(self, model):
+        if model == self.model_name:
+            return self
+        return self.model_copy(update={"model_name": model})
+
+    # Every request goes through the process-wide scheduler, which limits
+    # concurrency per model and retries rate limits and timeouts.
+
+    def _generate(self, *args, **kwargs):
+        generate = super()._generate
+        return llm_scheduler.run_sync(
+            self.model_name, lambda: generate(*args, **kwargs)
+        )
+
+    def _stream(self, *args, **kwargs):
+        stream = super()._stream
+        yield from llm_scheduler.stream_sync(
+            self.model_name, lambda: stream(*args, **kwargs)
+        )
+
+    async def _agenerate(self, *args, **kwargs):
+        def call(model):
+            agenerate = super(OpenRouterChatOpenAI, self._for_model(model))._agenerate
+            return llm_scheduler.run(model, lambda: agenerate(*args, **kwargs))
+
+        if not self.hedged:
+            return await call(self.model_name)
+        return await llm_hedger.run(self.model_name, call)
+
+    async def _astream(self, *args, **kwargs):
+        def open_stream(model):
+            astream = super(OpenRouterChatOpenAI, self._for_model(model))._astream
+            return llm_scheduler.stream(model, lambda: astream(*args, **kwargs))
+
+        if not self.hedged:
+            stream = open_stream(self.model_name)
+        else:
+            stream = llm_hedger.stream(self.model_name, open_stream)
+        async for chunk in stream:
+            yield chunk
+
+
+def _create_llm(api_key, base_url, model, temperature, http_client, http_async_client):
+    return OpenRouterChatOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        model=model,
+        temperature=temperature,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        timeout=config.llm_request_timeout_seconds,
+        # Usage metadata (incl. cached prompt tokens) for streamed calls too
+        stream_usage=True,
+        # Retries are handled by llm_scheduler
+        max_retries=0,
+    )
+
+
+llm_registry = build_registry(_create_llm)
+
 
 def _get_llm(api_key, base_url, model, temperature=0.1):
     """
-    Helper to create an OpenRouterChatOpenAI instance.
+    Helper to get a pooled OpenRouterChatOpenAI instance, shared by every
+    caller with the same credentials, model and temperature.
     """
-    return OpenRouterChatOpenAI(
-        api_key=api_key, base_url=base_url, model=model, temperature=temperature
-    )
+    return llm_registry.get(api_key, base_url, model, temperature)
+
+
+def reset_llm_clients():
+    """
+    Drops cached LLM clients; called when the API settings change.
+    """
+    llm_registry.invalidate()
 
 
 def _format_financial_context(monthly_income=0, investments=0):
@@ -103,122 +196,599 @@ def _get_agent_base_prompt(df_summary, language="zh"):
 """
 
 
+# Bump when the extraction prompt changes so cached results are not reused.
+EXTRACTION_PROMPT_VERSION = "extract-2"
+
+
 def get_categories(language="zh"):
     return CATEGORIES_EN if language == "en" else CATEGORIES
 
 
-def _chunk_text(text, max_chars=8000):
+class Chunk(NamedTuple):
+    text: str
+    # Leading lines repeated from the end of the previous chunk
+    overlap: str
+
+
+def _chunk_budget(model):
+    """
+    Input tokens per extraction chunk: a share of the context window, small
+    enough that the extracted JSON fits in the model's output limit.
+    """
+    budget = min(
+        int(context_limit(model) * config.llm_chunk_context_fraction),
+        int(output_limit(model) / config.llm_chunk_output_ratio),
+    )
+    if config.llm_chunk_max_tokens is not None:
+        budget = min(budget, config.llm_chunk_max_tokens)
+    return budget
+
+
+def _is_anchor(line, line_tokens, max_tokens):
+    """
+    Whether a chunk may end after `line`. Decided by a hash of the line
+    alone, with a chance proportional to its tokens, so anchors average one
+    per quarter budget wherever they are in the text.
+    """
+    digest = hashlib.blake2b(line.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64 < line_tokens * 4 / max_tokens
+
+
+def _split_chunks(text, max_tokens, overlap_lines=0, model=None):
+    """
+    Splits text on line boundaries into chunks of at most max_tokens tokens
+    of `model` (a single longer line still becomes its own chunk). Each
+    chunk after the first starts with the last `overlap_lines` lines of the
+    previous one.
+
+    Boundaries are content-defined: once a chunk holds half the budget it
+    ends after the next anchor line (see _is_anchor), or where the budget
+    forces it to. Editing a line only moves the boundaries up to the next
+    anchor after it, so the chunks that follow keep their text (and their
+    extraction cache entries).
+    """
     if not text:
         return []
-    lines = text.split("\n")
     chunks = []
-    current_chunk = []
-    current_length = 0
-    for line in lines:
-        line_len = len(line)
-        if current_length + line_len > max_chars and current_chunk:
-            chunks.append("\n".join(current_chunk))
-            current_chunk = [line]
-            current_length = line_len
-        else:
-            current_chunk.append(line)
-            current_length += line_len + 1
-    if current_chunk:
-        chunks.append("\n".join(current_chunk))
+    current = []
+    current_tokens = 0
+    overlap_count = 0
+
+    def cut():
+        nonlocal current, current_tokens, overlap_count
+        chunks.append(Chunk("\n".join(current), "\n".join(current[:overlap_count])))
+        current = current[-overlap_lines:] if overlap_lines else []
+        overlap_count = len(current)
+        current_tokens = sum(count_tokens(tail, model) + 1 for tail in current)
+
+    for line in text.split("\n"):
+        line_tokens = count_tokens(line, model) + 1
+        if current_tokens + line_tokens > max_tokens and len(current) > overlap_count:
+            cut()
+        current.append(line)
+        current_tokens += line_tokens
+        if (
+            current_tokens >= max_tokens / 2
+            and len(current) > overlap_count
+            and _is_anchor(line, line_tokens, max_tokens)
+        ):
+            cut()
+    if len(current) > overlap_count or not chunks:
+        chunks.append(Chunk("\n".join(current), "\n".join(current[:overlap_count])))
     return chunks
 
 
+def _chunk_text(text, max_tokens=None, model=None, overlap_lines=0):
+    if max_tokens is None:
+        max_tokens = _chunk_budget(model)
+    return [
+        chunk.text for chunk in _split_chunks(text, max_tokens, overlap_lines, model)
+    ]
+
+
+def _normalize(value):
+    return " ".join(str(value or "").split()).casefold()
+
+
+def _transaction_key(item):
+    try:
+        amount = round(float(item.get("Amount", 0)), 2)
+    except (TypeError, ValueError):
+        amount = item.get("Amount")
+    return (
+        str(item.get("Date")),
+        _normalize(item.get("Description")),
+        amount,
+        item.get("CardLastFour"),
+    )
+
+
+def _drop_overlap_duplicates(previous, items, overlap):
+    """
+    Removes from `items` the transactions that the previous chunk already
+    returned for the shared overlap lines. Only transactions whose
+    description actually appears in the overlap are considered, so genuine
+    repeat purchases elsewhere in the chunk are kept.
+    """
+    overlap = _normalize(overlap)
+    if not overlap or not previous:
+        return items
+    seen = {}
+    for item in previous:
+        key = _transaction_key(item)
+        seen[key] = seen.get(key, 0) + 1
+
+    kept = []
+    for item in items:
+        key = _transaction_key(item)
+        if seen.get(key) and key[1] and key[1] in overlap:
+            seen[key] -= 1
+            continue
+        kept.append(item)
+    return kept
+
+
+def _merge_chunk_results(chunks, results):
+    """
+    Concatenates per-chunk transactions in chunk order, de-duplicating the
+    rows extracted twice from the overlap between consecutive chunks.
+    """
+    merged = []
+    previous = []
+    for chunk, data in zip(chunks, results):
+        items = data if isinstance(data, list) else []
+        items = _drop_overlap_duplicates(previous, items, chunk.overlap)
+        merged.extend(items)
+        previous = data if isinstance(data, list) else []
+    return merged
+
+
+async def _stream_chunk_async(chunk, api_key, base_url, model_name, language="zh"):
+    """
+    Streams the extraction of a single chunk, yielding each transaction
+    object as soon as the model has finished writing it. Malformed or
+    unfinished trailing objects are skipped.
+    """
+    llm = _get_llm(api_key, base_url, model_name, temperature=0.1)
+    messages = build_extraction_messages(
+        chunk, get_categories(language), model_name, datetime.datetime.now().year
+    )
+
+    parser = JsonArrayStreamParser()
+    async for message in llm.astream(messages):
+        record_prompt_usage(message.usage_metadata)
+        if isinstance(message.content, str):
+            for item in parser.feed(message.content):
+                yield item
+
+    if not parser.started:
+        raise ValueError("No JSON array in the model's answer")
+    skipped = parser.malformed + parser.truncated
+    if skipped:
+        metrics.incr("llm.malformed_items", skipped)
+        print(f"DEBUG: Skipped {skipped} malformed transaction objects")
+
+
 async def _process_chunk_async(
-    chunk, api_key, base_url, model_name, semaphore, language="zh"
+    chunk, api_key, base_url, model_name, language="zh", on_item=None
 ):
     """
     Process a single chunk using LangChain asynchronously.
+
+    Transactions are parsed as the response streams in; `on_item` (if given)
+    is called with each one as soon as it is complete.
+
+    Returns None if the answer could not be used. Raises LLMUnavailableError
+    when the provider keeps rate limiting or timing out, rather than losing
+    the chunk's transactions.
     """
-    async with semaphore:
-        try:
-            llm = _get_llm(api_key, base_url, model_name, temperature=0.1)
-
-            current_year = datetime.datetime.now().year
-
-            target_categories = CATEGORIES_EN if language == "en" else CATEGORIES
-
-            # Example category for the prompt (Shopping / 购物)
-            ex_category = target_categories[4]
-
-            system_prompt = f"""
-            你是一位专业的财务助手。你的任务是从提供的文本中提取信用卡交易详情，并将每笔交易分类到以下类别之一：{", ".join(target_categories)}。
-
-            严格以JSON对象列表的形式返回输出。每个对象必须包含以下键：
-            - "Date": 交易日期 (格式 YYYY-MM-DD)。如果年份缺失，假设为 {current_year}。
-            - "Description": 商户名称或交易描述。
-            - "Amount": 交易的数值 (正数表示支出，负数表示退款，忽略信用卡还款)。
-            - "Category": 从提供的类别中选择一个。
-              - 如果描述模糊不清或你不确定类别，请务必使用 "需要复核"。
-              - 只有当你确定它不属于上述任何主要类别时，才使用 "其他"。
-            - "CardLastFour": 交易卡号后四位。如果未找到，返回 null。例如："8888"。
-
-            只返回JSON数据，不要有任何Markdown格式或解释。
-            例如：[
-                {{
-                    "Date": "2023-01-01",
-                    "Description": "超市",
-                    "Amount": 50.00,
-                    "Category": "{ex_category}",
-                    "CardLastFour": "1234"
-                }}
-            ]
-            如果未找到交易，返回 []。
-            """
-
-            prompt = ChatPromptTemplate.from_messages(
-                [
-                    ("system", "{system_prompt}"),
-                    ("user", "Here is the statement text:\n\n{text}"),
-                ]
-            )
+    try:
+        items = []
+        async for item in _stream_chunk_async(
+            chunk, api_key, base_url, model_name, language
+        ):
+            items.append(item)
+            if on_item is not None:
+                on_item(item)
+        return items
+
+    except LLMUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error processing chunk with LangChain: {e}")
+        return None
+
+
+async def _extract_chunk_async(
+    chunk, api_key, base_url, model_name, language="zh", on_item=None
+):
+    """
+    _process_chunk_async through llm_hedger: a chunk that takes unusually
+    long is sent again (to the fallback model if one is configured) and the
+    first complete answer is used.
 
-            # Chain
-            chain = prompt | llm | JsonOutputParser()
+    Returns (data, model that answered), which is the fallback model when
+    the hedge won.
 
-            # Execute
-            result = await chain.ainvoke(
-                {"text": chunk, "system_prompt": system_prompt}
+    With `on_item`, only the call that streams the first transaction
+    forwards items, and only its answer is accepted, so rows are never
+    emitted twice.
+    """
+    owner = []
+
+    async def call(model):
+        if on_item is None:
+            data = await _process_chunk_async(chunk, api_key, base_url, model, language)
+            return data, model
+        leg = object()
+
+        def forward(item):
+            if not owner:
+                owner.append(leg)
+            if owner[0] is leg:
+                on_item(item)
+
+        data = await _process_chunk_async(
+            chunk, api_key, base_url, model, language, on_item=forward
+        )
+        return (data if not owner or owner[0] is leg else None), model
+
+    return await llm_hedger.run(
+        model_name, call, usable=lambda answer: isinstance(answer[0], list)
+    )
+
+
+def _store_chunk_answers(db, chunks, answers, language):
+    """
+    Caches the successful {chunk index: (data, model)} answers of
+    _extract_chunk_async under the key of the model that produced them, so
+    a fallback model's answer is never served as the primary model's.
+    """
+    by_model = {}
+    for index, answer in answers.items():
+        if isinstance(answer, BaseException) or not isinstance(answer[0], list):
+            continue
+        data, model = answer
+        key = _chunk_cache_key(chunks[index].text, model, language)
+        by_model.setdefault(model, {})[key] = data
+    for model, results in by_model.items():
+        store_extractions(db, results, model)
+
+
+async def _categorize_batch_async(
+    descriptions, api_key, base_url, model_name, language="zh"
+):
+    """
+    Asks the LLM for the category of each description in one call.
+    Returns a list aligned with `descriptions` (None where no answer came back).
+    """
+    try:
+        llm = _get_llm(api_key, base_url, model_name, temperature=0.1)
+        numbered = "\n".join(
+            f"{index}. {description}"
+            for index, description in enumerate(descriptions, start=1)
+        )
+        messages = build_categorization_messages(
+            numbered, get_categories(language), model_name
+        )
+        response = await llm.ainvoke(messages)
+        record_prompt_usage(response.usage_metadata)
+        result = JsonOutputParser().invoke(response)
+        return [result.get(str(index)) for index in range(1, len(descriptions) + 1)]
+
+    except LLMUnavailableError:
+        raise
+    except Exception as e:
+        print(f"Error categorizing transactions with LangChain: {e}")
+        return [None] * len(descriptions)
+
+
+async def categorize_transactions(
+    rows, api_key, base_url, model, language="zh", batch_size=200, db=None
+):
+    """
+    Fills in "Category" for already-extracted transactions. Only the unique
+    descriptions are sent to the LLM; unknown answers become "Needs Review".
+    With a database session, merchants the local index knows are
+    categorised without the LLM.
+    """
+    target_categories = get_categories(language)
+    needs_review = target_categories[-2]
+
+    descriptions = list(dict.fromkeys(row["Description"] for row in rows))
+    known = {}
+    if db is not None:
+        known = await run_db(db, lookup_categories, descriptions, target_categories)
+    descriptions = [d for d in descriptions if d not in known]
+    batches = [
+        descriptions[i : i + batch_size]
+        for i in range(0, len(descriptions), batch_size)
+    ]
+    results = await asyncio.gather(
+        *[
+            _categorize_batch_async(batch, api_key, base_url, model, language)
+            for batch in batches
+        ]
+    )
+
+    categories = dict(known)
+    for batch, batch_categories in zip(batches, results):
+        for description, category in zip(batch, batch_categories):
+            categories[description] = (
+                category if category in target_categories else needs_review
             )
-            return result
+    return [
+        {**row, "Category": categories.get(row["Description"], needs_review)}
+        for row in rows
+    ]
+
+
+async def _apply_known_categories(db, rows, language):
+    """
+    Replaces the LLM's category with the merchant index's where the index is
+    confident, so merchants users have corrected stay corrected.
+    """
+    known = await run_db(
+        db,
+        lookup_categories,
+        {row.get("Description") for row in rows if row.get("Description")},
+        get_categories(language),
+    )
+    return [
+        {**row, "Category": known[row["Description"]]}
+        if row.get("Description") in known
+        else row
+        for row in rows
+    ]
+
+
+def _compact(text):
+    """
+    Drops page boilerplate, prose outside the transaction tables and
+    whitespace before chunking and reports what it saved.
+    """
+    if not config.compaction_enabled:
+        return text
+    compacted = compact_statement_text(
+        text, config.compaction_min_repeats, config.compaction_table_margin_lines
+    )
+    metrics.incr("compaction.bytes_saved", compacted.bytes_saved)
+    metrics.incr("compaction.tokens_saved", compacted.tokens_saved)
+    print(
+        f"DEBUG: Compaction kept {len(compacted.line_map)} of "
+        f"{text.count(chr(10)) + 1} lines, saving {compacted.bytes_saved} bytes "
+        f"/ {compacted.tokens_saved} tokens"
+    )
+    return compacted.text
 
-        except Exception as e:
-            print(f"Error processing chunk with LangChain: {e}")
-            return []
+
+def _chunk_cache_key(chunk, model, language):
+    # The prompt assumes the current year for dates without one
+    prompt_version = f"{EXTRACTION_PROMPT_VERSION}:{datetime.datetime.now().year}"
+    return extraction_key(
+        chunk, model, language, get_categories(language), prompt_version
+    )
 
 
-async def analyze_transactions(text, api_key, base_url, model, language="zh"):
+async def analyze_transactions(text, api_key, base_url, model, language="zh", db=None):
     """
     Sends the anonymized text to the LLM to extract and classify transactions using LangChain asynchronously.
+
+    Statements in a known layout (see app/services/layout_parsers.py) are
+    parsed deterministically and the LLM is only used to categorise them.
+
+    When a database session is given, per-chunk results are cached (see
+    app/services/extraction_cache.py) and only changed chunks reach the LLM.
     """
+    rows = parse_known_layout(text)
+    if rows is not None:
+        print(f"DEBUG: Known layout, categorising {len(rows)} rows with '{model}'")
+        return await categorize_transactions(
+            rows, api_key, base_url, model, language, db=db
+        )
+
     print(f"DEBUG: Starting LangChain analysis with model='{model}'")
-    chunks = _chunk_text(text)
+    chunks = _split_chunks(
+        _compact(text), _chunk_budget(model), config.llm_chunk_overlap_lines, model
+    )
     print(f"DEBUG: Text split into {len(chunks)} chunks. Processing in parallel...")
 
-    all_transactions = []
-
-    # Limit concurrent requests
-    semaphore = asyncio.Semaphore(5)
+    keys = [_chunk_cache_key(chunk.text, model, language) for chunk in chunks]
+    cached = {}
+    if db is not None:
+        cached = await run_db(db, get_cached_extractions, keys)
+    pending = [index for index, key in enumerate(keys) if key not in cached]
+    if cached:
+        print(f"DEBUG: {len(chunks) - len(pending)} chunks served from cache")
 
+    # Concurrency and retries are handled by llm_scheduler, hedging of slow
+    # chunks by llm_hedger
     tasks = [
-        _process_chunk_async(chunk, api_key, base_url, model, semaphore, language)
-        for chunk in chunks
+        _extract_chunk_async(chunks[index].text, api_key, base_url, model, language)
+        for index in pending
     ]
 
-    results = await asyncio.gather(*tasks)
-
-    for data in results:
-        if data and isinstance(data, list):
-            all_transactions.extend(data)
+    answers = dict(zip(pending, await asyncio.gather(*tasks, return_exceptions=True)))
+    fresh = {
+        index: answer if isinstance(answer, BaseException) else answer[0]
+        for index, answer in answers.items()
+    }
+    results = [cached.get(key, fresh.get(index)) for index, key in enumerate(keys)]
+
+    # Failed chunks come back as None (or an exception) and are retried on
+    # the next run; the successful ones are cached first.
+    if db is not None:
+        await run_db(db, _store_chunk_answers, chunks, answers, language)
+    for data in fresh.values():
+        if isinstance(data, BaseException):
+            raise data
+
+    all_transactions = _merge_chunk_results(chunks, results)
+    if db is not None:
+        all_transactions = await _apply_known_categories(db, all_transactions, language)
 
     print(f"DEBUG: Total transactions found: {len(all_transactions)}")
     return all_transactions
 
 
+class ChunkResult(NamedTuple):
+    """
+    Transactions of one finished chunk, already de-duplicated against the
+    neighbouring chunks that finished before it. `error` is set instead when
+    the chunk could not be analyzed. `extracted` holds the chunk's rows
+    before de-duplication, which is what `completed` expects on a resume.
+    `partial` marks early rows of a chunk that is still being generated.
+    """
+
+    index: int
+    chunks: int
+    transactions: list
+    error: Optional[Exception] = None
+    extracted: Optional[list] = None
+    partial: bool = False
+
+
+async def stream_analysis(
+    text,
+    api_key,
+    base_url,
+    model,
+    language="zh",
+    db=None,
+    completed=None,
+    early_rows=False,
+):
+    """
+    Streaming variant of analyze_transactions: yields a ChunkResult for each
+    chunk as soon as it completes (cached chunks first), so callers can save
+    and show results while slower chunks are still running.
+
+    Rows in the overlap between two chunks are dropped from whichever of the
+    pair finishes second, so the union of all results matches
+    analyze_transactions whatever the completion order.
+
+    Args:
+        completed: Optional {chunk_index: extracted rows} of chunks an
+            earlier, interrupted run already handled. They are neither
+            re-analyzed nor yielded again.
+        early_rows: Also yield partial ChunkResults with the rows that
+            cannot be overlap duplicates while the chunk is still being
+            generated. The chunk's final ChunkResult then only holds the
+            remaining rows.
+    """
+    completed = completed or {}
+    rows = parse_known_layout(text)
+    if rows is not None:
+        if 0 in completed:
+            return
+        print(f"DEBUG: Known layout, categorising {len(rows)} rows with '{model}'")
+        categorized = await categorize_transactions(
+            rows, api_key, base_url, model, language, db=db
+        )
+        yield ChunkResult(0, 1, categorized, extracted=categorized)
+        return
+
+    chunks = _split_chunks(
+        _compact(text), _chunk_budget(model), config.llm_chunk_overlap_lines, model
+    )
+    print(f"DEBUG: Streaming analysis of {len(chunks)} chunks with model='{model}'")
+    keys = [_chunk_cache_key(chunk.text, model, language) for chunk in chunks]
+    finished = {index: completed[index] for index in completed if index < len(keys)}
+    todo = [index for index in range(len(chunks)) if index not in finished]
+    cached = {}
+    if db is not None:
+        cached = await run_db(
+            db, get_cached_extractions, [keys[index] for index in todo]
+        )
+
+    async def finish(index, data, skip=()):
+        items = finished[index] = data if isinstance(data, list) else []
+        if index - 1 in finished:
+            items = _drop_overlap_duplicates(
+                finished[index - 1], items, chunks[index].overlap
+            )
+        if index + 1 in finished:
+            items = _drop_overlap_duplicates(
+                finished[index + 1], items, chunks[index + 1].overlap
+            )
+        # Rows already yielded early
+        items = [item for item in items if id(item) not in skip]
+        if db is not None:
+            items = await _apply_known_categories(db, items, language)
+        return ChunkResult(index, len(chunks), items, extracted=finished[index])
+
+    for index in todo:
+        if keys[index] in cached:
+            yield await finish(index, cached[keys[index]])
+
+    # Rows whose description is not in an overlap with a neighbouring chunk
+    # can never be dropped as duplicates, so with early_rows they are
+    # yielded as soon as the model has written them.
+    overlaps = [_normalize(chunk.overlap) for chunk in chunks] + [""]
+
+    def outside_overlaps(index, item):
+        description = _normalize(item.get("Description"))
+        return not description or (
+            description not in overlaps[index]
+            and description not in overlaps[index + 1]
+        )
+
+    events = asyncio.Queue()
+    emitted = {}
+
+    async def process(index):
+        def on_item(item):
+            if outside_overlaps(index, item):
+                events.put_nowait(("rows", index, item))
+
+        kwargs = {"on_item": on_item} if early_rows else {}
+        try:
+            answer = await _extract_chunk_async(
+                chunks[index].text, api_key, base_url, model, language, **kwargs
+            )
+            events.put_nowait(("done", index, answer))
+        except Exception as e:
+            events.put_nowait(("error", index, e))
+
+    tasks = [
+        asyncio.ensure_future(process(index))
+        for index in todo
+        if keys[index] not in cached
+    ]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            # Drain everything that is ready so early rows go out in batches
+            ready = [await events.get()]
+            while not events.empty():
+                ready.append(events.get_nowait())
+
+            early = {}
+            for kind, index, payload in ready:
+                if kind == "rows":
+                    early.setdefault(index, []).append(payload)
+                    emitted.setdefault(index, set()).add(id(payload))
+            for index, items in early.items():
+                if db is not None:
+                    items = await _apply_known_categories(db, items, language)
+                yield ChunkResult(index, len(chunks), items, partial=True)
+
+            for kind, index, payload in ready:
+                if kind == "error":
+                    remaining -= 1
+                    yield ChunkResult(index, len(chunks), [], payload)
+                elif kind == "done":
+                    remaining -= 1
+                    if db is not None:
+                        await run_db(
+                            db, _store_chunk_answers, chunks, {index: payload}, language
+                        )
+                    yield await finish(index, payload[0], skip=emitted.get(index, ()))
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
 def _summarize_dataframe(df, max_cols=15):
     """
     Provide a lightweight description of the DataFrame to give the LLM context.
@@ -338,7 +908,9 @@ async def stream_autonomous_agent(df, query, api_key, base_url, model, max_turns
     try:
         # Work on a deep copy
         df_for_agent = df.copy(deep=True)
-        llm = _get_llm(api_key, base_url, model, temperature=0)
+        llm = _get_llm(api_key, base_url, model, temperature=0).model_copy(
+            update={"hedged": True}
+        )
 
         # Create the agent
         with warnings.catch_warnings():
@@ -0,0 +1,205 @@
+import asyncio
+
+from app.core.config import config
+from app.core.metrics import metrics
+from app.services.llm_scheduler import call_started, llm_scheduler
+
+
+def _usable(result):
+    return result is not None
+
+
+async def _first(iterator):
+    return await iterator.__anext__()
+
+
+class Hedger:
+    """
+    Cuts tail latency by hedging: when a call is still running after the
+    `percentile` of its model's recent latencies (see
+    LLMScheduler.latency; for streams, LLMScheduler.first_item_latency
+    and no output yet), a duplicate is sent to the model's fallback (or
+    the same model). The first usable result wins and the other call is
+    cancelled.
+
+    The delay only starts once the call has left the scheduler's queue, so
+    calls waiting for a concurrency slot are not hedged. Until a model has
+    `min_samples` recorded latencies its calls are never hedged.
+    """
+
+    def __init__(
+        self,
+        scheduler,
+        enabled=False,
+        percentile=0.95,
+        min_samples=20,
+        min_delay=2.0,
+        fallback_models=None,
+    ):
+        self.scheduler = scheduler
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.fallback_models = dict(fallback_models or {})
+
+    def delay(self, model, first_item=False):
+        """
+        Seconds after which a call to `model` is hedged, or None. With
+        `first_item`, for a stream that has not yielded anything yet.
+        """
+        if not self.enabled:
+            return None
+        if first_item:
+            latency = self.scheduler.first_item_latency(model)
+        else:
+            latency = self.scheduler.latency(model)
+        if latency.count < self.min_samples:
+            return None
+        return max(self.min_delay, latency.percentile(self.percentile))
+
+    def fallback(self, model):
+        return self.fallback_models.get(model, model)
+
+    def _start(self, awaitable):
+        """Runs awaitable in a task whose scheduler slot sets the returned event."""
+        started = asyncio.Event()
+        token = call_started.set(started)
+        try:
+            task = asyncio.ensure_future(awaitable)
+        finally:
+            call_started.reset(token)
+        return task, started
+
+    async def _wait_for_hedge(self, task, started, delay):
+        """True when `task` is still running `delay` seconds after it was sent."""
+        waiter = asyncio.ensure_future(started.wait())
+        try:
+            await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+        if task.done():
+            return False
+        await asyncio.wait({task}, timeout=delay)
+        return not task.done()
+
+    async def run(self, model, call, usable=_usable):
+        """
+        Returns `await call(model)`, hedged with `call(fallback)` if slow.
+
+        A result that fails `usable` (or an exception) only counts when no
+        other call does better; then the primary's error is raised, or the
+        last unusable result returned.
+        """
+        delay = self.delay(model)
+        if delay is None:
+            return await call(model)
+
+        primary, started = self._start(call(model))
+        pending = {primary}
+        try:
+            if await self._wait_for_hedge(primary, started, delay):
+                fallback = self.fallback(model)
+                print(
+                    f"DEBUG: '{model}' slower than {delay:.1f}s, hedging with '{fallback}'"
+                )
+                metrics.incr("llm.hedge.sent")
+                pending.add(self._start(call(fallback))[0])
+
+            error = None
+            result = None
+            answered = False
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                # Look at the primary first when both finished together
+                for task in sorted(done, key=lambda task: task is not primary):
+                    if task.exception() is not None:
+                        if error is None or task is primary:
+                            error = task.exception()
+                        continue
+                    if usable(task.result()):
+                        if task is not primary:
+                            metrics.incr("llm.hedge.won")
+                        return task.result()
+                    result = task.result()
+                    answered = True
+            if answered:
+                return result
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, model, open_stream):
+        """
+        Yields from open_stream(model). If nothing has arrived after the
+        hedging delay, open_stream(fallback) is started as well and the
+        stream that produces the first item is the one used. The delay
+        comes from the model's time to first item, not whole-call latency.
+        """
+        delay = self.delay(model, first_item=True)
+        if delay is None:
+            async for item in open_stream(model):
+                yield item
+            return
+
+        streams = {}
+        iterator = open_stream(model).__aiter__()
+        primary, started = self._start(_first(iterator))
+        streams[primary] = iterator
+        pending = {primary}
+        winner = None
+        error = None
+        try:
+            if await self._wait_for_hedge(primary, started, delay):
+                fallback = self.fallback(model)
+                print(
+                    f"DEBUG: '{model}' slower than {delay:.1f}s, hedging with '{fallback}'"
+                )
+                metrics.incr("llm.hedge.sent")
+                hedge_iterator = open_stream(fallback).__aiter__()
+                hedge = self._start(_first(hedge_iterator))[0]
+                streams[hedge] = hedge_iterator
+                pending.add(hedge)
+
+            while pending and winner is None:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in sorted(done, key=lambda task: task is not primary):
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    if error is None or task is primary:
+                        error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        # A losing stream that already produced its first item still holds
+        # its scheduler slot until closed
+        for task, stream in streams.items():
+            if task is not winner and task.done() and not task.cancelled():
+                if task.exception() is None:
+                    await stream.aclose()
+
+        if winner is None:
+            if isinstance(error, StopAsyncIteration):
+                return
+            raise error
+        if winner is not primary:
+            metrics.incr("llm.hedge.won")
+        yield winner.result()
+        async for item in streams[winner]:
+            yield item
+
+
+llm_hedger = Hedger(
+    llm_scheduler,
+    enabled=config.llm_hedge_enabled,
+    percentile=config.llm_hedge_percentile,
+    min_samples=config.llm_hedge_min_samples,
+    min_delay=config.llm_hedge_min_delay_seconds,
+    fallback_models=config.llm_fallback_models,
+)
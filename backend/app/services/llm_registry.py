@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+import weakref
+
+import httpx
+
+from app.core.config import config
+from app.core.metrics import metrics
+
+
+class LLMClientRegistry:
+    """
+    Process-wide cache of chat model clients keyed by
+    (api_key, base_url, model, temperature).
+
+    All clients share one keep-alive HTTP connection pool (sync and async),
+    so chunk calls and chat turns reuse warm TLS connections instead of
+    opening new ones per call. Async connections are bound to the event
+    loop that opened them, so the async pool, and the clients built on it,
+    are kept per running loop; those of a closed loop (e.g. after an
+    asyncio.run()) are dropped. Clients unused for `idle_ttl` seconds are
+    evicted, and invalidate() drops everything when settings change.
+
+    Args:
+        factory: Callable building a client from
+            (api_key, base_url, model, temperature, http_client, http_async_client).
+    """
+
+    def __init__(
+        self,
+        factory,
+        max_connections=20,
+        max_keepalive_connections=10,
+        keepalive_expiry=60.0,
+        idle_ttl=600.0,
+        timeout=120.0,
+    ):
+        self._factory = factory
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = timeout
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        # (loop id, api_key, base_url, model, temperature) -> (client, last used)
+        self._clients = {}
+        self._http_client = None
+        # loop id -> (weakref to the loop, or None outside a loop, AsyncClient)
+        self._http_async_clients = {}
+
+    def _http_clients(self, loop):
+        if self._http_client is None:
+            self._http_client = httpx.Client(limits=self._limits, timeout=self._timeout)
+        entry = self._http_async_clients.get(id(loop))
+        if entry is None:
+            entry = (
+                weakref.ref(loop) if loop is not None else None,
+                httpx.AsyncClient(limits=self._limits, timeout=self._timeout),
+            )
+            self._http_async_clients[id(loop)] = entry
+        return self._http_client, entry[1]
+
+    def _drop_closed_loops(self):
+        closed = [
+            loop_id
+            for loop_id, (loop_ref, _) in self._http_async_clients.items()
+            if loop_ref is not None and (loop_ref() is None or loop_ref().is_closed())
+        ]
+        for loop_id in closed:
+            del self._http_async_clients[loop_id]
+        if closed:
+            for key in [key for key in self._clients if key[0] in closed]:
+                del self._clients[key]
+            metrics.incr("llm.loop_pools_dropped", len(closed))
+
+    def _evict_idle(self, now):
+        expired = [
+            key
+            for key, (_, last_used) in self._clients.items()
+            if now - last_used > self.idle_ttl
+        ]
+        for key in expired:
+            del self._clients[key]
+        if expired:
+            metrics.incr("llm.clients_evicted", len(expired))
+
+    def get(self, api_key, base_url, model, temperature=0.1):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        key = (id(loop), api_key, base_url, model, temperature)
+        now = time.monotonic()
+        with self._lock:
+            # Closed loops go first: their ids may be reused by new loops
+            self._drop_closed_loops()
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is None:
+                http_client, http_async_client = self._http_clients(loop)
+                client = self._factory(
+                    api_key,
+                    base_url,
+                    model,
+                    temperature,
+                    http_client,
+                    http_async_client,
+                )
+                metrics.incr("llm.clients_created")
+            else:
+                client = entry[0]
+                metrics.incr("llm.client_reuses")
+            self._clients[key] = (client, now)
+            return client
+
+    def invalidate(self):
+        """
+        Drops every cached client, e.g. after the API key or base URL changed.
+        The shared connection pools are kept; idle connections to endpoints
+        no longer in use expire on their own after `keepalive_expiry`.
+        """
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self):
+        return len(self._clients)
+
+
+def build_registry(factory):
+    return LLMClientRegistry(
+        factory,
+        max_connections=config.llm_max_connections,
+        max_keepalive_connections=config.llm_max_keepalive_connections,
+        keepalive_expiry=config.llm_keepalive_expiry_seconds,
+        idle_ttl=config.llm_client_idle_ttl_seconds,
+        timeout=config.llm_request_timeout_seconds,
+    )
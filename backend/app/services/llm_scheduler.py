@@ -0,0 +1,411 @@
+import asyncio
+import contextvars
+import math
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+import openai
+
+from app.core.config import config
+from app.core.metrics import metrics
+
+
+class LLMUnavailableError(Exception):
+    """
+    Raised when an LLM call still fails with a rate limit, timeout or server
+    error after all retries. `retry_after` is a hint in seconds for clients.
+    """
+
+    def __init__(self, model, error, retry_after):
+        super().__init__(f"LLM '{model}' unavailable after retries: {error}")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def _status_code(error):
+    return getattr(error, "status_code", None)
+
+
+def is_overload(error):
+    """429s and timeouts mean "slow down": they shrink the concurrency limit."""
+    return _status_code(error) in (408, 429) or isinstance(
+        error,
+        (
+            asyncio.TimeoutError,
+            TimeoutError,
+            httpx.TimeoutException,
+            openai.APITimeoutError,
+        ),
+    )
+
+
+def is_retryable(error):
+    return (
+        is_overload(error)
+        or _status_code(error) in (500, 502, 503, 504)
+        or isinstance(error, (openai.APIConnectionError, httpx.TransportError))
+    )
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+# Set by llm_hedging to an asyncio.Event that is set once the call in the
+# current task has left the queue and is actually sent.
+call_started = contextvars.ContextVar("llm_call_started", default=None)
+
+
+def _mark_started():
+    started = call_started.get()
+    if started is not None:
+        started.set()
+
+
+class LatencyHistogram:
+    """
+    Latencies (in seconds) of a model's last `window` successful calls.
+    """
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        return len(self._samples)
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        """Nearest-rank percentile, e.g. percentile(0.95); None when empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = min(len(samples), max(1, math.ceil(fraction * len(samples))))
+        return samples[rank - 1]
+
+
+class _Waiter:
+    __slots__ = ("wake", "granted")
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for one model, adjusted by AIMD: every success grows the
+    limit by 1/limit (about +1 per round of calls), every 429 or timeout
+    halves it, at most once per `cooldown` seconds so a burst of failures
+    from the same round only counts once.
+
+    Slots can be taken from any thread or event loop; waiters are served in
+    FIFO order.
+    """
+
+    def __init__(
+        self, initial, minimum=1, maximum=16, decrease_factor=0.5, cooldown=1.0
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self._decrease_factor = decrease_factor
+        self._cooldown = cooldown
+        self._last_decrease = float("-inf")
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return max(self.minimum, int(self.limit))
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def _take_or_enqueue(self, waiter):
+        with self._lock:
+            if not self._waiters and self.in_flight < self.capacity:
+                self.in_flight += 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def _grant(self):
+        while self._waiters and self.in_flight < self.capacity:
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.in_flight += 1
+            waiter.wake()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = _Waiter(wake)
+        if self._take_or_enqueue(waiter):
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self.in_flight -= 1
+                    self._grant()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+
+    def acquire_sync(self):
+        event = threading.Event()
+        if not self._take_or_enqueue(_Waiter(event.set)):
+            event.wait()
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._grant()
+
+    def on_success(self):
+        with self._lock:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._grant()
+
+    def on_overload(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_decrease >= self._cooldown:
+                self._last_decrease = now
+                self.limit = max(self.minimum, self.limit * self._decrease_factor)
+
+
+class LLMScheduler:
+    """
+    Process-wide gate for LLM traffic. Every call takes a slot from its
+    model's AdaptiveLimiter and is retried with jittered exponential backoff
+    on rate limits, timeouts and transient server errors.
+
+    Args:
+        model_limits: Optional {model: max concurrency} overriding `maximum`.
+        publish_metrics: Register the limit/queue/latency gauges. Only the
+            process-wide `llm_scheduler` does, so other instances (tests,
+            tools) cannot replace its gauges.
+    """
+
+    def __init__(
+        self,
+        initial=4,
+        minimum=1,
+        maximum=16,
+        model_limits=None,
+        max_retries=4,
+        base_delay=0.5,
+        max_delay=30.0,
+        latency_window=200,
+        publish_metrics=False,
+    ):
+        self._initial = initial
+        self._minimum = minimum
+        self._maximum = maximum
+        self._model_limits = dict(model_limits or {})
+        self.max_retries = max_retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._latency_window = latency_window
+        self._limiters = {}
+        self._latencies = {}
+        self._first_item_latencies = {}
+        self._lock = threading.Lock()
+        self._publish_metrics = publish_metrics
+        if publish_metrics:
+            metrics.gauge("llm.scheduler.queued", lambda: self.queued)
+
+    @property
+    def queued(self):
+        """Calls waiting for a slot, across all models."""
+        return sum(limiter.queued for limiter in list(self._limiters.values()))
+
+    def limiter(self, model):
+        with self._lock:
+            if model not in self._limiters:
+                maximum = self._model_limits.get(model, self._maximum)
+                limiter = AdaptiveLimiter(self._initial, self._minimum, maximum)
+                self._limiters[model] = limiter
+                if self._publish_metrics:
+                    prefix = f"llm.scheduler.{model}"
+                    metrics.gauge(f"{prefix}.limit", lambda: limiter.capacity)
+                    metrics.gauge(f"{prefix}.in_flight", lambda: limiter.in_flight)
+                    metrics.gauge(f"{prefix}.queued", lambda: limiter.queued)
+            return self._limiters[model]
+
+    def _histogram(self, histograms, prefix, model):
+        with self._lock:
+            if model not in histograms:
+                histogram = LatencyHistogram(self._latency_window)
+                histograms[model] = histogram
+                if self._publish_metrics:
+                    prefix = f"{prefix}.{model}"
+                    metrics.gauge(f"{prefix}.p50", lambda: histogram.percentile(0.5))
+                    metrics.gauge(f"{prefix}.p95", lambda: histogram.percentile(0.95))
+            return histograms[model]
+
+    def latency(self, model):
+        """Histogram of the model's successful call durations (queueing excluded)."""
+        return self._histogram(self._latencies, "llm.latency", model)
+
+    def first_item_latency(self, model):
+        """Histogram of the time streamed calls to the model take to yield output."""
+        return self._histogram(
+            self._first_item_latencies, "llm.first_item_latency", model
+        )
+
+    def _backoff(self, model, limiter, attempt, error):
+        """
+        Records a failed attempt and returns the delay before the next one,
+        or raises if the error is final.
+        """
+        if not is_retryable(error):
+            raise error
+        if is_overload(error):
+            limiter.on_overload()
+            metrics.incr("llm.overloaded")
+        retry_after = _retry_after(error)
+        delay = random.uniform(0, min(self._max_delay, self._base_delay * 2**attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if attempt >= self.max_retries:
+            metrics.incr("llm.failures")
+            raise LLMUnavailableError(model, error, round(delay) or 1) from error
+        metrics.incr("llm.retries")
+        print(
+            f"DEBUG: LLM call to '{model}' failed ({error}), retrying in {delay:.1f}s"
+        )
+        return delay
+
+    async def run(self, model, call):
+        """
+        Runs `await call()` under the model's limit, retrying transient errors.
+        """
+        limiter = self.limiter(model)
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire()
+            _mark_started()
+            started = time.monotonic()
+            try:
+                result = await call()
+            except Exception as e:
+                limiter.release()
+                await asyncio.sleep(self._backoff(model, limiter, attempt, e))
+                continue
+            limiter.release()
+            limiter.on_success()
+            self.latency(model).record(time.monotonic() - started)
+            return result
+
+    def run_sync(self, model, call):
+        limiter = self.limiter(model)
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire_sync()
+            started = time.monotonic()
+            try:
+                result = call()
+            except Exception as e:
+                limiter.release()
+                time.sleep(self._backoff(model, limiter, attempt, e))
+                continue
+            limiter.release()
+            limiter.on_success()
+            self.latency(model).record(time.monotonic() - started)
+            return result
+
+    async def stream(self, model, open_stream):
+        """
+        Yields from the async iterator returned by open_stream(), holding a
+        slot until it is exhausted. Only failures before the first item are
+        retried; once output has been yielded an error is passed through.
+        """
+        limiter = self.limiter(model)
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire()
+            _mark_started()
+            started_at = time.monotonic()
+            started = False
+            try:
+                async for item in open_stream():
+                    if not started:
+                        started = True
+                        self.first_item_latency(model).record(
+                            time.monotonic() - started_at
+                        )
+                    yield item
+            except Exception as e:
+                limiter.release()
+                if started:
+                    raise
+                await asyncio.sleep(self._backoff(model, limiter, attempt, e))
+                continue
+            except BaseException:
+                limiter.release()
+                raise
+            limiter.release()
+            limiter.on_success()
+            self.latency(model).record(time.monotonic() - started_at)
+            return
+
+    def stream_sync(self, model, open_stream):
+        """Blocking counterpart of stream() for plain iterators."""
+        limiter = self.limiter(model)
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire_sync()
+            started_at = time.monotonic()
+            started = False
+            try:
+                for item in open_stream():
+                    if not started:
+                        started = True
+                        self.first_item_latency(model).record(
+                            time.monotonic() - started_at
+                        )
+                    yield item
+            except Exception as e:
+                limiter.release()
+                if started:
+                    raise
+                time.sleep(self._backoff(model, limiter, attempt, e))
+                continue
+            except BaseException:
+                limiter.release()
+                raise
+            limiter.release()
+            limiter.on_success()
+            self.latency(model).record(time.monotonic() - started_at)
+            return
+
+
+llm_scheduler = LLMScheduler(
+    initial=config.llm_initial_concurrency,
+    minimum=config.llm_min_concurrency,
+    maximum=config.llm_max_concurrency,
+    model_limits=config.llm_model_concurrency,
+    max_retries=config.llm_max_retries,
+    base_delay=config.llm_retry_base_seconds,
+    max_delay=config.llm_retry_max_seconds,
+    latency_window=config.llm_latency_window,
+    publish_metrics=True,
+)
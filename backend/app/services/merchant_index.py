@@ -0,0 +1,138 @@
+import re
+from collections import defaultdict
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import config
+from app.core.metrics import metrics
+from app.models.transaction import MerchantCategory
+from app.models.transaction import Transaction as TransactionModel
+
+# Categories that say "the model was not sure"; they carry no signal.
+_UNLEARNED_CATEGORIES = {"需要复核", "Needs Review"}
+
+# Order numbers, dates, amounts and punctuation vary between charges at the
+# same merchant: "UBER *TRIP 8841 SHANGHAI" and "Uber Trip-2211 shanghai"
+# both normalise to "uber trip shanghai".
+_NOISE = re.compile(r"[\d\W_]+")
+
+
+def normalize_merchant(description):
+    return " ".join(_NOISE.sub(" ", (description or "").lower()).split())
+
+
+def _apply(db: Session, deltas):
+    """
+    Adds {(merchant_key, category): weight} to the index (weights never go
+    below zero). Does not commit; callers commit with their own changes.
+    """
+    for (merchant_key, category), delta in deltas.items():
+        if not merchant_key or not category or category in _UNLEARNED_CATEGORIES:
+            continue
+        entry = db.get(MerchantCategory, (merchant_key, category))
+        if entry is None:
+            if delta <= 0:
+                continue
+            entry = MerchantCategory(
+                merchant_key=merchant_key, category=category, weight=0.0
+            )
+            db.add(entry)
+        entry.weight = max(0.0, entry.weight + delta)
+
+
+def record_transactions(db: Session, transactions):
+    """
+    Counts newly saved transactions (anything with description/category
+    attributes) as one vote each for their merchant's category.
+    """
+    deltas = defaultdict(float)
+    for t in transactions:
+        deltas[(normalize_merchant(t.description), t.category)] += 1.0
+    _apply(db, deltas)
+
+
+def record_correction(
+    db: Session, old_description, old_category, description, category
+):
+    """
+    Moves evidence after a user edit: the old (merchant, category) pair loses
+    a vote and the corrected one gains config.merchant_index_correction_weight.
+    Only a category change is a correction; when just the description changed
+    the transaction's single vote moves to the new merchant.
+    """
+    old_key = normalize_merchant(old_description)
+    new_key = normalize_merchant(description)
+    if (old_key, old_category) == (new_key, category):
+        return
+    weight = (
+        1.0 if category == old_category else config.merchant_index_correction_weight
+    )
+    deltas = defaultdict(float)
+    deltas[(old_key, old_category)] -= 1.0
+    deltas[(new_key, category)] += weight
+    _apply(db, deltas)
+
+
+def rebuild_merchant_index(db: Session):
+    """
+    Rebuilds the index from the transactions table.
+    """
+    db.query(MerchantCategory).delete()
+    deltas = defaultdict(float)
+    rows = db.query(
+        TransactionModel.description,
+        TransactionModel.category,
+        func.count(TransactionModel.id),
+    ).group_by(TransactionModel.description, TransactionModel.category)
+    for description, category, count in rows:
+        deltas[(normalize_merchant(description), category)] += count
+    _apply(db, deltas)
+    db.commit()
+
+
+def ensure_merchant_index(db: Session):
+    """
+    Builds the index on first start against an existing database.
+    """
+    if db.query(MerchantCategory).first() is None:
+        if db.query(TransactionModel).first() is not None:
+            rebuild_merchant_index(db)
+
+
+def lookup_categories(db: Session, descriptions, categories):
+    """
+    Returns {description: category} for descriptions whose merchant has a
+    confident category among `categories` (the current language's list).
+
+    A match is confident when the leading category has at least
+    merchant_index_min_support votes and merchant_index_min_confidence of
+    the merchant's total weight.
+    """
+    keys = {
+        description: normalize_merchant(description) for description in descriptions
+    }
+    allowed = set(categories) - _UNLEARNED_CATEGORIES
+    weights = defaultdict(dict)
+    if keys:
+        rows = db.query(MerchantCategory).filter(
+            MerchantCategory.merchant_key.in_(set(keys.values())),
+            MerchantCategory.category.in_(allowed),
+        )
+        for entry in rows:
+            weights[entry.merchant_key][entry.category] = entry.weight
+
+    matches = {}
+    for description, merchant_key in keys.items():
+        votes = weights.get(merchant_key)
+        if not votes:
+            continue
+        category, weight = max(votes.items(), key=lambda item: item[1])
+        if (
+            weight >= config.merchant_index_min_support
+            and weight / sum(votes.values()) >= config.merchant_index_min_confidence
+        ):
+            matches[description] = category
+    metrics.incr("merchant_index.hits", len(matches))
+    metrics.incr("merchant_index.misses", len(keys) - len(matches))
+    return matches
@@ -1,29 +1,153 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 import pdfplumber
-from artifex import Artifex
+
+from app.core.config import config
+from app.core.metrics import metrics
+from app.services.anonymizer_service import AnonymizerService
+from app.services.pii_filter import scan_lines
+
+
+def _page_text(page):
+    """
+    Extracts one page's text and immediately releases the page's cached
+    layout objects, so memory stays bounded by a single page.
+    """
+    try:
+        return page.extract_text() or ""
+    finally:
+        page.close()
+
+
+def _open_pdf(document):
+    return pdfplumber.open(
+        io.BytesIO(document) if isinstance(document, bytes) else document
+    )
+
+
+def _extract_page_range(document, start, end):
+    """
+    Process pool worker: opens the PDF (a path on disk, or bytes) and extracts
+    only its own slice. Pages without text yield an empty string so page
+    numbers stay aligned.
+    """
+    with _open_pdf(document) as pdf:
+        return [_page_text(page) for page in pdf.pages[start:end]]
+
+
+_process_pool = None
+_process_pool_workers = None
+_process_pool_lock = threading.Lock()
 
 
-def extract_text_from_pdf(file_stream):
+def get_process_pool(workers=None):
+    """
+    Lazily creates the shared process pool used for page-level extraction.
+    Workers are spawned rather than forked so they never inherit model
+    threads or locks from the API process.
+
+    Asking for a different number of workers replaces the pool; the old
+    one finishes the tasks already submitted to it and then shuts down.
+    """
+    global _process_pool, _process_pool_workers
+    workers = workers or config.pdf_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != workers:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False)
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _process_pool_workers = workers
+        return _process_pool
+
+
+def _page_ranges(page_count, pages_per_task):
+    return [
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
+
+
+def iter_pdf_pages(source, workers=None, pages_per_task=None):
+    """
+    Yields (page_number, text) for every page of a PDF, in page order.
+
+    Large documents are split into page ranges that are extracted in a
+    process pool; small documents (or workers <= 1) are handled in-process,
+    one page at a time.
+
+    Args:
+        source: Path to a PDF on disk (preferred: it is never loaded into
+            memory as a whole and pool workers reopen it by path), or a
+            file-like object containing the PDF data.
+        workers: Number of pool workers (defaults to config.pdf_workers).
+        pages_per_task: Pages handed to each worker task
+            (defaults to config.pdf_pages_per_task).
+    """
+    workers = config.pdf_workers if workers is None else workers
+    pages_per_task = pages_per_task or config.pdf_pages_per_task
+
+    document = source if isinstance(source, (str, os.PathLike)) else source.read()
+    with _open_pdf(document) as pdf:
+        page_count = len(pdf.pages)
+        parallel = (
+            workers > 1
+            and page_count >= config.pdf_parallel_min_pages
+            and page_count > pages_per_task
+        )
+        if not parallel:
+            for number, page in enumerate(pdf.pages, start=1):
+                yield number, _page_text(page)
+            return
+
+    pool = get_process_pool(workers)
+    ranges = _page_ranges(page_count, pages_per_task)
+    futures = [
+        pool.submit(_extract_page_range, document, start, end) for start, end in ranges
+    ]
+    try:
+        for (start, _), future in zip(ranges, futures):
+            for offset, page_text in enumerate(future.result()):
+                yield start + offset + 1, page_text
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def extract_text_from_pdf(file_stream, workers=None, pages_per_task=None):
     """
     Extracts text from a PDF file stream.
 
     Args:
-        file_stream: A file-like object containing the PDF data.
+        file_stream: A file-like object containing the PDF data, or a path
+            to the PDF on disk.
+        workers: Number of extraction pool workers (see iter_pdf_pages).
+        pages_per_task: Pages handed to each worker task (see iter_pdf_pages).
 
     Returns:
         str: The extracted text from the PDF.
     """
-    text = ""
     try:
-        with pdfplumber.open(file_stream) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        return "".join(
+            page_text + "\n"
+            for _, page_text in iter_pdf_pages(file_stream, workers, pages_per_task)
+            if page_text
+        )
     except Exception as e:
         return f"Error reading PDF: {str(e)}"
 
-    return text
 
+# Bump whenever anonymization output changes so cached documents are redone.
+ANONYMIZER_VERSION = "artifex-2"
+
+# Dates are transaction data on a statement, so the model never masks them.
+_MODEL_ENTITIES = ["PERSON", "LOCATION", "ADDRESS", "PHONE_NUMBER"]
 
 _anonymizer = None
 
@@ -32,6 +156,9 @@ def get_anonymizer():
     global _anonymizer
     if _anonymizer is None:
         try:
+            # Imported lazily so extraction workers don't pay for loading torch.
+            from artifex import Artifex
+
             print("Initializing Artifex text anonymization model...")
             _anonymizer = Artifex().text_anonymization
             print("Artifex model initialized.")
@@ -41,9 +168,77 @@ def get_anonymizer():
     return _anonymizer
 
 
+def _load_model():
+    ta = get_anonymizer()
+    return lambda segments: ta(segments, entities_to_mask=_MODEL_ENTITIES)
+
+
+_anonymizer_service = None
+
+
+def get_anonymizer_service():
+    """
+    Returns the process-wide AnonymizerService, which owns the single copy
+    of the Artifex model.
+    """
+    global _anonymizer_service
+    if _anonymizer_service is None:
+        _anonymizer_service = AnonymizerService(
+            _load_model,
+            max_batch_size=config.anonymizer_max_batch_size,
+            max_wait_ms=config.anonymizer_max_wait_ms,
+        )
+    return _anonymizer_service
+
+
+def _split_segments(text, max_chars):
+    """
+    Groups consecutive lines into segments of roughly max_chars characters.
+    Joining the segments with newlines gives back the original text.
+    """
+    segments = []
+    current = []
+    current_length = 0
+    for line in text.split("\n"):
+        if current and current_length + len(line) > max_chars:
+            segments.append("\n".join(current))
+            current = []
+            current_length = 0
+        current.append(line)
+        current_length += len(line) + 1
+    segments.append("\n".join(current))
+    return segments
+
+
+def _skipped_fraction():
+    total = metrics.get("anonymizer.lines_total")
+    return metrics.get("anonymizer.lines_skipped") / total if total else 0.0
+
+
+metrics.gauge("anonymizer.lines_skipped_fraction", _skipped_fraction)
+
+
+def _line_groups(lines, flags):
+    """
+    Splits lines into consecutive runs sharing the same flag.
+    """
+    groups = []
+    for line, flag in zip(lines, flags):
+        if groups and groups[-1][0] == flag:
+            groups[-1][1].append(line)
+        else:
+            groups.append((flag, [line]))
+    return groups
+
+
 def anonymize_text(text):
     """
-    Anonymizes sensitive information using Artifex library.
+    Anonymizes sensitive information in two tiers.
+
+    A regex pre-pass masks cards, emails, phones and labelled names and flags
+    the lines that may still hold PII. Only flagged lines (and their
+    neighbours) go through the Artifex model via the shared
+    AnonymizerService; all other lines pass through untouched.
 
     Args:
         text (str): The original text.
@@ -51,9 +246,30 @@ def anonymize_text(text):
     Returns:
         str: The anonymized text.
     """
+    lines = text.split("\n")
+    masked_lines, flags = scan_lines(lines, config.anonymizer_context_lines)
+
+    content_lines = [flag for line, flag in zip(lines, flags) if line.strip()]
+    metrics.incr("anonymizer.lines_total", len(content_lines))
+    metrics.incr("anonymizer.lines_skipped", content_lines.count(False))
+
     try:
-        ta = get_anonymizer()
-        return ta(text)
+        service = get_anonymizer_service()
+        pieces = []
+        for flagged, group in _line_groups(masked_lines, flags):
+            group_text = "\n".join(group)
+            if not flagged:
+                pieces.append(group_text)
+                continue
+            for segment in _split_segments(group_text, config.anonymizer_segment_chars):
+                pieces.append(service.submit(segment))
+        return "\n".join(
+            piece
+            if isinstance(piece, str)
+            else piece.result(timeout=config.anonymizer_timeout_seconds)
+            for piece in pieces
+        )
     except Exception as e:
         print(f"Anonymization failed: {e}")
-        return text  # Return original text on failure to avoid complete breakage
+        # Fall back to the regex-masked text to avoid complete breakage
+        return "\n".join(masked_lines)
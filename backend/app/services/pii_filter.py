@@ -0,0 +1,78 @@
+import re
+
+# Deterministic PII: masked directly with a fixed tag. Order matters, card
+# numbers must be masked before the looser phone patterns can match them.
+_PII_PATTERNS = [
+    (
+        "[CC_REDACTED]",
+        re.compile(
+            r"(?<!\d)(?:\d{4}([ -]?)\d{4}\1\d{4}\1\d{1,7}|\d{4}[ -]?\d{6}[ -]?\d{5})(?!\d)"
+        ),
+    ),
+    (
+        "[EMAIL_REDACTED]",
+        re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"),
+    ),
+    (
+        "[PHONE_REDACTED]",
+        re.compile(
+            r"(?<![\d-])(?:\+?\d{1,3}[-\s]?)?\d{3}[-\s]\d{3,4}[-\s]\d{4}(?![\d-])"
+            r"|(?<!\d)(?:\+?86[-\s]?)?1[3-9]\d{9}(?!\d)"
+        ),
+    ),
+]
+
+# Labelled names, e.g. "姓名: 张三" -> "姓名: [NAME_REDACTED]"
+_NAME_FIELD = re.compile(
+    r"((?:姓名|户名|持卡人|客户|(?i:cardholder|customer)(?i: name)?|^[ \t]*(?i:name))"
+    r"[ \t]*[:：][ \t]*)[^\s:：]+(?:[ \t][A-Z][a-z]+)*",
+    re.MULTILINE,
+)
+
+# Lines that carry no deterministic PII but may still hold names/addresses
+# the model should look at (statement headers, mailing blocks).
+_SENSITIVE_HINTS = re.compile(
+    r"地址|住址|尊敬的|先生|女士|证件|身份证|address|dear|mr\.|mrs\.|ms\.|street|road|avenue",
+    re.IGNORECASE,
+)
+
+
+def mask_line(line):
+    """
+    Masks deterministic PII in one line.
+
+    Returns:
+        tuple[str, bool]: The masked line and whether anything was masked.
+    """
+    masked = line
+    for tag, pattern in _PII_PATTERNS:
+        masked = pattern.sub(tag, masked)
+    masked = _NAME_FIELD.sub(r"\1[NAME_REDACTED]", masked)
+    return masked, masked != line
+
+
+def scan_lines(lines, context_lines=2):
+    """
+    Fast pre-pass over a document's lines.
+
+    Masks deterministic PII and flags the lines that should still go through
+    the anonymization model: lines where PII was found or hinted at, plus
+    `context_lines` neighbours on each side.
+
+    Returns:
+        tuple[list[str], list[bool]]: The masked lines and per-line flags.
+    """
+    masked_lines = []
+    hits = []
+    for line in lines:
+        masked, found = mask_line(line)
+        masked_lines.append(masked)
+        if found or _SENSITIVE_HINTS.search(line):
+            hits.append(len(masked_lines) - 1)
+
+    flags = [False] * len(lines)
+    for index in hits:
+        start = max(0, index - context_lines)
+        end = min(len(lines), index + context_lines + 1)
+        flags[start:end] = [True] * (end - start)
+    return masked_lines, flags
@@ -0,0 +1,106 @@
+from functools import lru_cache
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from app.core.metrics import metrics
+
+# Providers behind OpenRouter that only cache a prompt prefix when it is
+# marked with cache_control. OpenAI, DeepSeek, Qwen and others cache
+# repeated prefixes automatically, so they get a plain system message.
+_CACHE_CONTROL_MODELS = ("anthropic/", "claude", "google/gemini")
+
+_EXTRACTION_INSTRUCTIONS = """你是一位专业的财务助手。你的任务是从提供的文本中提取信用卡交易详情，并将每笔交易分类到以下类别之一：{categories}。
+
+严格以JSON对象列表的形式返回输出。每个对象必须包含以下键：
+- "Date": 交易日期 (格式 YYYY-MM-DD)。如果年份缺失，使用用户消息中给出的当前年份。
+- "Description": 商户名称或交易描述。
+- "Amount": 交易的数值 (正数表示支出，负数表示退款，忽略信用卡还款)。
+- "Category": 从提供的类别中选择一个。
+  - 如果描述模糊不清或你不确定类别，请务必使用 "{needs_review}"。
+  - 只有当你确定它不属于上述任何主要类别时，才使用 "{other}"。
+- "CardLastFour": 交易卡号后四位。如果未找到，返回 null。例如："8888"。
+
+只返回JSON数据，不要有任何Markdown格式或解释。
+例如：[
+    {{
+        "Date": "2023-01-01",
+        "Description": "超市",
+        "Amount": 50.00,
+        "Category": "{example}",
+        "CardLastFour": "1234"
+    }}
+]
+如果未找到交易，返回 []。"""
+
+_CATEGORIZATION_INSTRUCTIONS = """你是一位专业的财务助手。请将每条交易描述分类到以下类别之一：{categories}。
+如果描述模糊不清或你不确定类别，请务必使用 "{needs_review}"。
+
+严格返回一个JSON对象，键为交易编号，值为类别，例如：{{"1": "{example}"}}。
+只返回JSON数据，不要有任何Markdown格式或解释。"""
+
+
+@lru_cache(maxsize=None)
+def _instructions(template, categories):
+    # Only depends on the category list, so every chunk of a statement (and
+    # every statement in the same language) shares a byte-identical prefix.
+    return template.format(
+        categories=", ".join(categories),
+        needs_review=categories[-2],
+        other=categories[-1],
+        example=categories[4],
+    )
+
+
+def _system_message(text, model):
+    if (model or "").startswith(_CACHE_CONTROL_MODELS):
+        return SystemMessage(
+            content=[
+                {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+            ]
+        )
+    return SystemMessage(content=text)
+
+
+def build_extraction_messages(chunk, categories, model, year):
+    """
+    Messages for extracting transactions from one chunk. The static
+    instructions come first and are marked cacheable where the provider
+    needs it; the year and the statement text follow at the end.
+    """
+    instructions = _instructions(_EXTRACTION_INSTRUCTIONS, tuple(categories))
+    return [
+        _system_message(instructions, model),
+        HumanMessage(
+            content=f"当前年份：{year}\n\nHere is the statement text:\n\n{chunk}"
+        ),
+    ]
+
+
+def build_categorization_messages(numbered, categories, model):
+    instructions = _instructions(_CATEGORIZATION_INSTRUCTIONS, tuple(categories))
+    return [
+        _system_message(instructions, model),
+        HumanMessage(content=f"Transactions:\n\n{numbered}"),
+    ]
+
+
+def record_prompt_usage(usage):
+    """
+    Adds a response's usage metadata to the prompt token counters behind the
+    llm.cached_prompt_ratio gauge.
+    """
+    if not usage:
+        return
+    cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+    metrics.incr("llm.prompt_tokens", usage.get("input_tokens") or 0)
+    metrics.incr("llm.cached_prompt_tokens", cached)
+
+
+def _cached_prompt_ratio():
+    prompt_tokens = metrics.get("llm.prompt_tokens")
+    if not prompt_tokens:
+        return 0.0
+    return metrics.get("llm.cached_prompt_tokens") / prompt_tokens
+
+
+metrics.gauge("llm.cached_prompt_ratio", _cached_prompt_ratio)
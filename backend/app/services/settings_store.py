@@ -0,0 +1,104 @@
+import time
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import config
+from app.core.metrics import metrics
+from app.models.transaction import Settings as SettingsModel
+
+# Reserved settings row, rewritten with a new value by every update
+VERSION_KEY = "__version__"
+
+
+class SettingsStore:
+    """
+    In-memory snapshot of the settings table. Reads are served from the
+    snapshot; every update writes its keys and a new version stamp in one
+    transaction. Other processes (uvicorn workers) notice the new stamp
+    within `refresh_interval` seconds and reload, so writes must go
+    through update() rather than touching the table directly.
+    """
+
+    def __init__(self, refresh_interval=None):
+        self._refresh_interval = (
+            config.settings_refresh_interval_seconds
+            if refresh_interval is None
+            else refresh_interval
+        )
+        self._values = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _due(self):
+        return (
+            self._values is None
+            or time.monotonic() - self._checked_at >= self._refresh_interval
+        )
+
+    def _load(self, db: Session):
+        rows = dict(db.execute(select(SettingsModel.key, SettingsModel.value)).all())
+        self._version = rows.pop(VERSION_KEY, None)
+        # Replaced, never mutated, so readers in other threads see either
+        # the old or the new snapshot
+        self._values = rows
+        metrics.incr("settings.reloads")
+
+    def _refresh(self, db: Session):
+        version = db.scalar(
+            select(SettingsModel.value).where(SettingsModel.key == VERSION_KEY)
+        )
+        if self._values is None or version != self._version:
+            self._load(db)
+        self._checked_at = time.monotonic()
+
+    def snapshot(self, db: Session):
+        """All settings as a {key: value} dict; do not modify it."""
+        if self._due():
+            self._refresh(db)
+        return self._values
+
+    async def snapshot_async(self, db: AsyncSession):
+        if self._due():
+            await db.run_sync(self._refresh)
+        return self._values
+
+    def get(self, db: Session, key, default=""):
+        value = self.snapshot(db).get(key)
+        return default if value is None else value
+
+    async def get_async(self, db: AsyncSession, key, default=""):
+        value = (await self.snapshot_async(db)).get(key)
+        return default if value is None else value
+
+    def update(self, db: Session, values):
+        """
+        Upserts {key: value} and a new version stamp in a single
+        transaction, then reloads the snapshot.
+        """
+        if not values:
+            return
+        rows = [{"key": key, "value": value} for key, value in values.items()]
+        rows.append({"key": VERSION_KEY, "value": uuid.uuid4().hex})
+        statement = insert(SettingsModel)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[SettingsModel.key],
+                set_={"value": statement.excluded.value},
+            ),
+            rows,
+        )
+        db.commit()
+        # Reloaded rather than patched: the table may hold other workers' writes
+        self._load(db)
+        self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Forces a reload on the next read."""
+        self._values = None
+
+
+settings_store = SettingsStore()
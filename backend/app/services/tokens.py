@@ -0,0 +1,106 @@
+import re
+
+# Context windows (tokens) by model-name prefix; the longest matching prefix
+# wins. Models not listed here fall back to DEFAULT_CONTEXT_TOKENS.
+MODEL_CONTEXT_TOKENS = {
+    "qwen/qwen3-next": 262144,
+    "qwen/": 32768,
+    "openai/gpt-4o": 128000,
+    "gpt-4o": 128000,
+    "openai/gpt-4.1": 1047576,
+    "gpt-4.1": 1047576,
+    "openai/gpt-5": 400000,
+    "gpt-5": 400000,
+    "anthropic/claude": 200000,
+    "google/gemini": 1048576,
+    "deepseek/": 65536,
+    "gpt-3.5": 16385,
+}
+DEFAULT_CONTEXT_TOKENS = 32768
+
+# Maximum completion tokens by model-name prefix, matched like the context
+# windows above. Extraction answers are several times longer than their
+# chunk, so this, not the context window, usually bounds the chunk size.
+MODEL_OUTPUT_TOKENS = {
+    "qwen/qwen3-next": 32768,
+    "qwen/": 8192,
+    "openai/gpt-4o": 16384,
+    "gpt-4o": 16384,
+    "openai/gpt-4.1": 32768,
+    "gpt-4.1": 32768,
+    "openai/gpt-5": 128000,
+    "gpt-5": 128000,
+    "anthropic/claude": 8192,
+    "google/gemini": 8192,
+    "google/gemini-2.5": 65536,
+    "deepseek/": 8192,
+    "gpt-3.5": 4096,
+}
+DEFAULT_OUTPUT_TOKENS = 8192
+
+# tiktoken encodings by model-name prefix. Only OpenAI models have their
+# exact tokenizer in tiktoken; every other family (Qwen, Claude, Gemini,
+# DeepSeek) is counted with o200k_base as an approximation, which the chunk
+# budget's headroom (a fraction of the context, see _chunk_budget) absorbs.
+MODEL_ENCODINGS = {
+    "gpt-3.5": "cl100k_base",
+    "openai/gpt-3.5": "cl100k_base",
+    "gpt-4-": "cl100k_base",
+    "openai/gpt-4-": "cl100k_base",
+}
+DEFAULT_ENCODING = "o200k_base"
+
+_CJK = re.compile(r"[　-鿿가-힯＀-￯]")
+
+# Encoding name -> tiktoken Encoding, or None when it couldn't be loaded
+_encodings = {}
+
+
+def _longest_prefix(table, model, default):
+    matches = [prefix for prefix in table if (model or "").startswith(prefix)]
+    if not matches:
+        return default
+    return table[max(matches, key=len)]
+
+
+def _get_encoding(model=None):
+    """
+    Loads the tiktoken encoding of `model` (see MODEL_ENCODINGS) once.
+    tiktoken downloads encodings on first use, so when it is unavailable
+    (offline) we fall back to an estimate instead of retrying on every call.
+    """
+    name = _longest_prefix(MODEL_ENCODINGS, model, DEFAULT_ENCODING)
+    if name not in _encodings:
+        _encodings[name] = None
+        try:
+            import tiktoken
+
+            _encodings[name] = tiktoken.get_encoding(name)
+        except Exception as e:
+            print(f"tiktoken unavailable, estimating token counts: {e}")
+    return _encodings[name]
+
+
+def count_tokens(text, model=None):
+    """
+    Counts tokens with the tokenizer of `model` (an approximation for
+    non-OpenAI models, see MODEL_ENCODINGS), or estimates them (one token
+    per CJK character, one per four other characters) when tiktoken is
+    unavailable. The estimate errs on the high side for typical statement
+    text.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def context_limit(model):
+    return _longest_prefix(MODEL_CONTEXT_TOKENS, model, DEFAULT_CONTEXT_TOKENS)
+
+
+def output_limit(model):
+    return _longest_prefix(MODEL_OUTPUT_TOKENS, model, DEFAULT_OUTPUT_TOKENS)
@@ -0,0 +1,366 @@
+import base64
+import json
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple, Optional
+
+import pandas as pd
+from sqlalchemy import func, inspect, select, text, tuple_, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.models.transaction import Transaction as TransactionModel
+from app.models.transaction import SEARCH_INDEX_DDL, natural_key_index
+from app.services.merchant_index import record_transactions
+
+
+class SavedTransactions(NamedTuple):
+    """
+    Result of save_transactions: the newly stored rows (with their IDs) and
+    how many extracted rows were skipped because they were already stored.
+    """
+
+    inserted: list
+    duplicates: int
+
+
+class TransactionFilters(NamedTuple):
+    """
+    Optional filters of list_transactions; None means no filter. The date
+    and amount ranges include both ends, and `search` matches descriptions.
+    """
+
+    category: Optional[str] = None
+    card_last_four: Optional[str] = None
+    source: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    amount_min: Optional[float] = None
+    amount_max: Optional[float] = None
+    search: Optional[str] = None
+
+
+def description_key(description):
+    return " ".join(str(description or "").split()).casefold()
+
+
+def _natural_key(values):
+    return (
+        values["date"],
+        values["amount"],
+        values["description_key"],
+        values["card_last_four"] or "",
+    )
+
+
+def _transaction_values(item, source):
+    """
+    Converts one extracted transaction dict (Date/Description/Amount/
+    Category/CardLastFour) into column values of a Transaction row.
+    """
+    # Convert date string to datetime object if possible
+    try:
+        date_obj = pd.to_datetime(item.get("Date")).to_pydatetime()
+    except Exception:
+        date_obj = None
+
+    description = item.get("Description", "Unknown")
+    return {
+        "date": date_obj,
+        "description": description,
+        "amount": round(float(item.get("Amount", 0)), 2),
+        "category": item.get("Category", "Other"),
+        "source": source,
+        "card_last_four": item.get("CardLastFour"),
+        "description_key": description_key(description),
+    }
+
+
+def build_transaction(item, source):
+    """
+    Converts one extracted transaction dict into an unsaved Transaction row.
+    """
+    return TransactionModel(**_transaction_values(item, source))
+
+
+def natural_key_counts(items):
+    """
+    Counter of the natural keys of extracted transaction dicts, i.e. the
+    occurrences they use up; seeds `occurrences` when an import resumes.
+    """
+    return Counter(_natural_key(_transaction_values(item, None)) for item in items)
+
+
+def save_transactions(db: Session, items, source, commit=True, occurrences=None):
+    """
+    Bulk-inserts extracted transactions with one executemany
+    INSERT ... ON CONFLICT DO NOTHING RETURNING, so rows already stored under
+    the same natural key (date, amount, normalized description, card) are
+    skipped, e.g. when overlapping statement periods are imported twice.
+    Identical rows within one import are kept as separate occurrences; when
+    an import is saved in several batches, pass the same `occurrences`
+    Counter to every call so numbering continues across them.
+
+    The inserted rows' categories are added to the merchant index in the
+    same transaction. With commit=False the caller commits.
+    """
+    seen = Counter() if occurrences is None else occurrences
+    rows = []
+    for item in items:
+        values = _transaction_values(item, source)
+        key = _natural_key(values)
+        seen[key] += 1
+        values["occurrence"] = seen[key]
+        rows.append(values)
+    if not rows:
+        return SavedTransactions([], 0)
+
+    inserted = list(
+        db.scalars(
+            insert(TransactionModel)
+            .on_conflict_do_nothing()
+            .returning(TransactionModel),
+            rows,
+        )
+    )
+    record_transactions(db, inserted)
+    if commit:
+        # RETURNING already loaded every column; detached rows are not
+        # expired by the commit, so reading them needs no further SELECTs
+        for transaction in inserted:
+            db.expunge(transaction)
+        db.commit()
+    return SavedTransactions(inserted, len(rows) - len(inserted))
+
+
+def assign_natural_key(db: Session, transaction):
+    """
+    Sets the natural-key columns of a manually created or edited row. A row
+    identical to existing ones becomes their next occurrence instead of
+    being rejected.
+    """
+    transaction.description_key = description_key(transaction.description)
+    query = select(func.max(TransactionModel.occurrence)).where(
+        TransactionModel.date == transaction.date,
+        TransactionModel.amount == transaction.amount,
+        TransactionModel.description_key == transaction.description_key,
+        func.coalesce(TransactionModel.card_last_four, "")
+        == (transaction.card_last_four or ""),
+    )
+    if transaction.id is not None:
+        query = query.where(TransactionModel.id != transaction.id)
+    transaction.occurrence = (db.scalar(query) or 0) + 1
+
+
+def ensure_natural_keys(db: Session):
+    """
+    Upgrades databases created before the natural key existed: adds the
+    columns, backfills them (earlier duplicates become later occurrences)
+    and builds the unique index.
+    """
+    columns = {
+        column["name"] for column in inspect(db.get_bind()).get_columns("transactions")
+    }
+    if "description_key" not in columns:
+        db.execute(text("ALTER TABLE transactions ADD COLUMN description_key VARCHAR"))
+    if "occurrence" not in columns:
+        db.execute(
+            text(
+                "ALTER TABLE transactions "
+                "ADD COLUMN occurrence INTEGER NOT NULL DEFAULT 1"
+            )
+        )
+
+    # Indexes built before undated rows were deduplicated index the raw date
+    index_sql = db.scalar(
+        text("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = :name"),
+        {"name": natural_key_index.name},
+    )
+    outdated = index_sql is not None and "coalesce(date" not in index_sql
+    if outdated:
+        db.execute(text(f"DROP INDEX {natural_key_index.name}"))
+
+    pending = db.scalar(
+        select(func.count())
+        .select_from(TransactionModel)
+        .where(TransactionModel.description_key.is_(None))
+    )
+    if pending or outdated:
+        print("DEBUG: Backfilling natural keys of transactions")
+        _number_occurrences(db)
+
+    if index_sql is None or outdated:
+        natural_key_index.create(db.connection())
+    db.commit()
+
+
+def _number_occurrences(db: Session):
+    """
+    Recomputes description_key and occurrence of every row; earlier
+    duplicates (by id) get the lower occurrence numbers.
+    """
+    seen = Counter()
+    updates = []
+    for row in db.execute(
+        select(
+            TransactionModel.id,
+            TransactionModel.date,
+            TransactionModel.amount,
+            TransactionModel.description,
+            TransactionModel.card_last_four,
+        ).order_by(TransactionModel.id)
+    ):
+        values = {
+            "date": row.date,
+            "amount": row.amount,
+            "card_last_four": row.card_last_four,
+            "description_key": description_key(row.description),
+        }
+        key = _natural_key(values)
+        seen[key] += 1
+        updates.append(
+            {
+                "id": row.id,
+                "description_key": values["description_key"],
+                "occurrence": seen[key],
+            }
+        )
+    if updates:
+        db.execute(update(TransactionModel), updates)
+
+
+def ensure_search_index(db: Session):
+    """
+    Creates the description search index and its sync triggers on databases
+    created before they existed, indexing the rows already stored.
+    """
+    exists = db.scalar(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'transactions_fts'")
+    )
+    for statement in SEARCH_INDEX_DDL:
+        db.execute(text(statement))
+    if not exists:
+        print("DEBUG: Building the transaction search index")
+        db.execute(
+            text("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')")
+        )
+    db.commit()
+
+
+def _escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _search_conditions(search):
+    """
+    WHERE conditions matching every whitespace-separated term of `search` in
+    the description, case-insensitively. Terms of 3+ characters use the FTS5
+    trigram index; shorter ones, which trigrams can't match, fall back to LIKE.
+    SQLite has no bigram tokenizer, so a 2-character CJK term on its own
+    scans the table (see scripts/bench_search.py); the LIKE only checks the
+    index's matches when a longer term is also given.
+    """
+    T = TransactionModel
+    indexed = []
+    conditions = []
+    for term in search.split():
+        if len(term) >= 3:
+            indexed.append('"' + term.replace('"', '""') + '"')
+        else:
+            conditions.append(
+                T.description.like(f"%{_escape_like(term)}%", escape="\\")
+            )
+    if indexed:
+        matches = (
+            select(text("rowid"))
+            .select_from(text("transactions_fts"))
+            .where(
+                text("transactions_fts MATCH :match").bindparams(
+                    match=" AND ".join(indexed)
+                )
+            )
+        )
+        conditions.insert(0, T.id.in_(matches))
+    return conditions
+
+
+def _filter_conditions(filters):
+    T = TransactionModel
+    conditions = []
+    if filters.category is not None:
+        conditions.append(T.category == filters.category)
+    if filters.card_last_four is not None:
+        conditions.append(T.card_last_four == filters.card_last_four)
+    if filters.source is not None:
+        conditions.append(T.source == filters.source)
+    if filters.date_from is not None:
+        conditions.append(T.date >= datetime.combine(filters.date_from, time.min))
+    if filters.date_to is not None:
+        # Through the end of that day
+        end = datetime.combine(filters.date_to + timedelta(days=1), time.min)
+        conditions.append(T.date < end)
+    if filters.amount_min is not None:
+        conditions.append(T.amount >= filters.amount_min)
+    if filters.amount_max is not None:
+        conditions.append(T.amount <= filters.amount_max)
+    if filters.search and filters.search.strip():
+        conditions += _search_conditions(filters.search)
+    return conditions
+
+
+def encode_cursor(transaction):
+    """Opaque cursor pointing just after `transaction` in list order."""
+    date = transaction.date.isoformat() if transaction.date else None
+    raw = json.dumps([date, transaction.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Returns (date, id) of a cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date, transaction_id = json.loads(raw)
+        return (
+            datetime.fromisoformat(date) if date is not None else None,
+            int(transaction_id),
+        )
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def list_transactions(db: Session, limit, skip=0, cursor=None, filters=None):
+    """
+    Returns (transactions, next_cursor), newest first by (date, id),
+    restricted to rows matching `filters` (a TransactionFilters).
+
+    Paging with `cursor` seeks straight to the position in the
+    (date, id) index, so deep pages cost the same as the first; `skip`
+    is an OFFSET and still scans every skipped row. next_cursor is None
+    on the last page. Transactions without a date come last.
+    """
+    T = TransactionModel
+    query = select(T).order_by(T.date.desc(), T.id.desc())
+    if filters is not None:
+        query = query.where(*_filter_conditions(filters))
+    if cursor is None:
+        transactions = list(db.scalars(query.offset(skip).limit(limit)))
+    else:
+        # Dated rows after the cursor, then the undated ones. An OR of both
+        # conditions would make SQLite scan the index instead of seeking.
+        date, transaction_id = decode_cursor(cursor)
+        wanted = skip + limit
+        transactions = []
+        if date is not None:
+            after = query.where(tuple_(T.date, T.id) < (date, transaction_id))
+            transactions = list(db.scalars(after.limit(wanted)))
+            transaction_id = None
+        if len(transactions) < wanted:
+            undated = query.where(T.date.is_(None))
+            if transaction_id is not None:
+                undated = undated.where(T.id < transaction_id)
+            transactions += db.scalars(undated.limit(wanted - len(transactions)))
+        transactions = transactions[skip:]
+    next_cursor = None
+    if transactions and len(transactions) == limit:
+        next_cursor = encode_cursor(transactions[-1])
+    return transactions, next_cursor
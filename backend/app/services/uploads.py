@@ -0,0 +1,54 @@
+import hashlib
+import os
+import tempfile
+
+from app.core.config import config
+
+
+class UploadTooLargeError(Exception):
+    def __init__(self, max_bytes):
+        super().__init__(f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit")
+        self.max_bytes = max_bytes
+
+
+async def spool_upload(upload, max_bytes=None, chunk_size=1024 * 1024):
+    """
+    Copies an uploaded file to a temporary file on disk in fixed-size chunks,
+    hashing it on the way, so the upload is never held in memory as a whole.
+
+    The caller owns the returned file and must remove it (see remove_spooled).
+
+    Args:
+        upload: A starlette/FastAPI UploadFile (anything with async read(n)).
+        max_bytes: Size limit (defaults to config.max_upload_bytes).
+
+    Returns:
+        tuple[str, str]: The temp file path and the SHA-256 of the content.
+
+    Raises:
+        UploadTooLargeError: If the upload is bigger than max_bytes.
+    """
+    max_bytes = max_bytes or config.max_upload_bytes
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=config.upload_spool_dir)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await upload.read(chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        remove_spooled(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def remove_spooled(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,115 @@
+"""
+Connection reuse benchmark for the pooled LLM HTTP clients.
+
+Serves a small JSON reply (shaped like a chat completion) from a local
+keep-alive HTTP server and times sequential POSTs made three ways:
+with a fresh httpx.AsyncClient per call, as the code did before
+LLMClientRegistry; through the registry's pooled client within one
+event loop; and through the registry across several asyncio.run() loops,
+each of which gets its own pool. Prints one Markdown table row per mode.
+
+Plain HTTP over loopback, so the saving is the TCP connect and client
+setup only; against a remote HTTPS endpoint each fresh connection also
+pays the TLS handshake and a network round trip.
+
+    cd backend && python scripts/bench_llm_client.py [--calls 500] [--loops 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+
+from app.services.llm_registry import LLMClientRegistry  # noqa: E402
+
+REPLY = json.dumps(
+    {"choices": [{"message": {"role": "assistant", "content": "[]"}}]}
+).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # Headers and body are separate writes; don't let Nagle hold the body
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(REPLY)))
+        self.end_headers()
+        self.wfile.write(REPLY)
+
+    def log_message(self, *args):
+        pass
+
+
+def http_clients(api_key, base_url, model, temperature, http_client, http_async_client):
+    return http_async_client
+
+
+async def timed_calls(url, calls, client_for_call):
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        client, owned = client_for_call()
+        response = await client.post(url, json={"messages": []})
+        response.raise_for_status()
+        if owned:
+            await client.aclose()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def row(label, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"| {label} | {len(latencies)} "
+        f"| {statistics.median(latencies) * 1000:.2f} | {p99 * 1000:.2f} |"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--loops", type=int, default=5)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/chat/completions"
+    registry = LLMClientRegistry(http_clients)
+
+    fresh = asyncio.run(
+        timed_calls(url, args.calls, lambda: (httpx.AsyncClient(), True))
+    )
+
+    async def pooled_calls(calls):
+        client = registry.get("key", url, "model")
+        return await timed_calls(url, calls, lambda: (client, False))
+
+    pooled = asyncio.run(pooled_calls(args.calls))
+    per_loop = []
+    for _ in range(args.loops):
+        per_loop += asyncio.run(pooled_calls(args.calls // args.loops))
+    server.shutdown()
+
+    print("| Client | Calls | p50 (ms) | p99 (ms) |")
+    print("| --- | --- | --- | --- |")
+    row("fresh AsyncClient per call", fresh)
+    row("registry, one loop", pooled)
+    row(f"registry, {args.loops} asyncio.run() loops", per_loop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Keyset vs. OFFSET paging benchmark for list_transactions.
+
+Fills a temporary database with random transactions (1M by default) and
+times, per 100-row page: the first page, a cursor page deep into the
+table, and the same page reached with OFFSET.
+
+    cd backend && python scripts/bench_pagination.py [--rows 1000000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.database import create_db_engine  # noqa: E402
+from app.models.transaction import Base, Transaction  # noqa: E402
+from app.services.transaction_store import (  # noqa: E402
+    encode_cursor,
+    list_transactions,
+)
+
+PAGE_SIZE = 100
+
+
+def fill(engine, rows):
+    start = datetime(2015, 1, 1)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO transactions (date, description, amount, category, "
+            "source, description_key, occurrence) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    (start + timedelta(minutes=random.randrange(5_000_000))).isoformat(
+                        sep=" "
+                    ),
+                    f"merchant {i}",
+                    i % 500,
+                    "Other",
+                    "bench",
+                    f"merchant {i}",
+                    1,
+                )
+                for i in range(rows)
+            ],
+        )
+
+
+def timed(call, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    depth = args.rows * 9 // 10
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(engine)
+        fill(engine, args.rows)
+        with sessionmaker(bind=engine)() as db:
+            date, transaction_id = db.execute(
+                text(
+                    "SELECT date, id FROM transactions ORDER BY date DESC, id DESC "
+                    "LIMIT 1 OFFSET :offset"
+                ),
+                {"offset": depth - 1},
+            ).one()
+            cursor = encode_cursor(
+                Transaction(date=datetime.fromisoformat(date), id=transaction_id)
+            )
+
+            first = timed(lambda: list_transactions(db, PAGE_SIZE), 20)
+            seek = timed(lambda: list_transactions(db, PAGE_SIZE, cursor=cursor), 20)
+            offset = timed(lambda: list_transactions(db, PAGE_SIZE, skip=depth), 5)
+        engine.dispose()
+
+    print(f"{args.rows} rows, {PAGE_SIZE} rows per page")
+    print(f"first page: {first:.1f} ms")
+    print(f"cursor page at row {depth}: {seek:.1f} ms")
+    print(f"OFFSET {depth}: {offset:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Description search benchmark for list_transactions.
+
+Fills a temporary database with random Chinese and English merchant
+descriptions (200k by default) and times the first 100-row page of a
+search per kind of term: 3+ characters, served by the FTS5 trigram index,
+and 2-character terms, which trigrams can't match and which fall back to
+a LIKE scan, alone and next to an indexed term.
+
+    cd backend && python scripts/bench_search.py [--rows 200000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.database import create_db_engine  # noqa: E402
+from app.models.transaction import Base  # noqa: E402
+from app.services.transaction_store import (  # noqa: E402
+    TransactionFilters,
+    list_transactions,
+)
+
+PAGE_SIZE = 100
+MERCHANTS = [
+    "美团外卖 订单",
+    "饿了么外卖",
+    "星巴克咖啡",
+    "瑞幸咖啡",
+    "滴滴出行",
+    "京东商城",
+    "淘宝 天猫",
+    "中国石化加油站",
+    "STARBUCKS COFFEE",
+    "UBER TRIP",
+    "AMAZON MARKETPLACE",
+    "APPLE.COM/BILL",
+]
+# (label, query). Each merchant is 1/12 of the rows; a common term fills
+# the first page early, a term without matches has to look at every row.
+QUERIES = [
+    ("3+ chars, Latin", "starbucks"),
+    ("3+ chars, CJK", "美团外卖"),
+    ("3+ chars, no match", "海底捞"),
+    ("2 chars, CJK", "外卖"),
+    ("2 chars, no match", "火锅"),
+    ("2 chars + 3+ chars", "外卖 美团外卖"),
+]
+
+
+def fill(engine, rows):
+    start = datetime(2015, 1, 1)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO transactions (date, description, amount, category, "
+            "source, description_key, occurrence) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    (start + timedelta(minutes=random.randrange(5_000_000))).isoformat(
+                        sep=" "
+                    ),
+                    f"{random.choice(MERCHANTS)} {i}",
+                    i % 500,
+                    "Other",
+                    "bench",
+                    f"merchant {i}",
+                    1,
+                )
+                for i in range(rows)
+            ],
+        )
+
+
+def timed(call, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"{args.rows} rows, first page of {PAGE_SIZE}")
+    print("| Query | Terms | Matches | Time (ms) |")
+    print("| --- | --- | --- | --- |")
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(engine)
+        fill(engine, args.rows)
+        with sessionmaker(bind=engine)() as db:
+            for label, query in QUERIES:
+                filters = TransactionFilters(search=query)
+                page, _ = list_transactions(db, PAGE_SIZE, filters=filters)
+                elapsed = timed(
+                    lambda: list_transactions(db, PAGE_SIZE, filters=filters), 5
+                )
+                print(f"| {label} | `{query}` | {len(page)} | {elapsed:.1f} |")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
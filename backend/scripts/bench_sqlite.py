@@ -0,0 +1,141 @@
+"""
+Concurrent read/write benchmark behind the engine table in README.md.
+
+Runs writer and reader processes against one SQLite file, first with
+SQLite's defaults (rollback journal, synchronous=FULL), then with the
+engine from app.core.database (WAL + pragmas). Each write saves a batch
+of 20 transactions; each read is an indexed lookup by description.
+Prints one Markdown table row per engine.
+
+    cd backend && python scripts/bench_sqlite.py [--writers 4] [--readers 4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, func, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.database import create_db_engine  # noqa: E402
+from app.models.transaction import Base, Transaction  # noqa: E402
+from app.services.transaction_store import save_transactions  # noqa: E402
+
+SEED_ROWS = 5000
+BATCH_SIZE = 20
+LABELS = {"default": "default", "tuned": "WAL + pragmas"}
+
+
+def make_engine(kind, path):
+    if kind == "default":
+        return create_engine(
+            f"sqlite:///{path}",
+            connect_args={"check_same_thread": False, "timeout": 5},
+        )
+    return create_db_engine(f"sqlite:///{path}")
+
+
+def worker(kind, path, role, number, stop_at, results):
+    session_factory = sessionmaker(bind=make_engine(kind, path), autoflush=False)
+    latencies = []
+    errors = 0
+    i = 0
+    while time.time() < stop_at:
+        started = time.monotonic()
+        try:
+            with session_factory() as db:
+                if role == "write":
+                    batch = [
+                        {
+                            "Date": "2023-02-01",
+                            "Description": f"w{number}-{i}-{j}",
+                            "Amount": j,
+                        }
+                        for j in range(BATCH_SIZE)
+                    ]
+                    save_transactions(db, batch, "bench")
+                else:
+                    db.scalar(
+                        select(func.count())
+                        .select_from(Transaction)
+                        .where(Transaction.description == f"seed {i % SEED_ROWS}")
+                    )
+            latencies.append(time.monotonic() - started)
+        except Exception:
+            errors += 1
+        i += 1
+    results.put((role, latencies, errors))
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+def run(kind, path, writers, readers, seconds):
+    engine = make_engine(kind, path)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        seed = [
+            {"Date": "2023-01-01", "Description": f"seed {i}", "Amount": i}
+            for i in range(SEED_ROWS)
+        ]
+        save_transactions(db, seed, "seed")
+    engine.dispose()
+
+    results = multiprocessing.Queue()
+    # One second of slack so every process is running before the clock starts
+    stop_at = time.time() + 1 + seconds
+    processes = [
+        multiprocessing.Process(
+            target=worker, args=(kind, path, role, number, stop_at, results)
+        )
+        for role, count in (("write", writers), ("read", readers))
+        for number in range(count)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    def latencies(role):
+        return sorted(x for r, values, _ in outcomes if r == role for x in values)
+
+    writes, reads = latencies("write"), latencies("read")
+    errors = sum(e for _, _, e in outcomes)
+    print(
+        f"| {LABELS[kind]} | {len(writes) / seconds:.0f} "
+        f"| {percentile(writes, 0.5):.0f} / {percentile(writes, 0.99):.0f} "
+        f"| {len(reads) / seconds:.0f} "
+        f"| {percentile(reads, 0.5):.2f} / {percentile(reads, 0.99):.1f} "
+        f"| {errors} |"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    print(
+        "| Engine | Write txns/s | Write p50 / p99 (ms) "
+        "| Reads/s | Read p50 / p99 (ms) | Errors |"
+    )
+    print("| --- | --- | --- | --- | --- | --- |")
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in ("default", "tuned"):
+            path = os.path.join(directory, f"{kind}.db")
+            run(kind, path, args.writers, args.readers, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import sessionmaker
+
+from app.api import endpoints
+from app.models.transaction import AnalysisJob, AnalysisJobChunk, Settings
+from app.models.transaction import Transaction as TransactionModel
+from app.services.analysis_jobs import AnalysisJobRunner, job_transactions
+from app.services.llm_client import _split_chunks
+from app.services.llm_scheduler import LLMUnavailableError
+from app.services.transaction_store import save_transactions
+
+# Last update of a job whose process died
+STALE = datetime.utcnow() - timedelta(hours=1)
+TEXT = "2023-10-01 COFFEE 5.00\n2023-10-02 TAXI 20.00\n2023-10-03 BOOKS 30.00"
+BUDGET = 15
+
+
+def _rows(chunk):
+    rows = []
+    for line in chunk.split("\n"):
+        date, description, amount = line.split()
+        rows.append({"Date": date, "Description": description, "Amount": amount})
+    return rows
+
+
+@pytest.fixture
+def runner(db_session):
+    db_session.add(Settings(key="api_key", value="sk-test"))
+    db_session.commit()
+    factory = sessionmaker(bind=db_session.get_bind(), autoflush=False)
+    return AnalysisJobRunner(session_factory=factory, workers=1)
+
+
+@pytest.fixture(autouse=True)
+def small_chunks():
+    with patch("app.services.llm_client._chunk_budget", return_value=BUDGET):
+        yield
+
+
+@patch("app.services.llm_client._process_chunk_async")
+def test_worker_runs_submitted_job(mock_chunk, runner, db_session):
+    mock_chunk.side_effect = lambda chunk, *args: _rows(chunk)
+
+    async def main():
+        await runner.start()
+        job = runner.submit(db_session, TEXT, "s.pdf", "en", "model")
+        await runner._queue.join()
+        await runner.stop()
+        return job.id
+
+    job_id = asyncio.run(main())
+
+    job = db_session.get(AnalysisJob, job_id)
+    db_session.refresh(job)
+    assert (job.status, job.chunks_total, job.chunks_done) == ("done", 2, 2)
+    descriptions = [t.description for t in job_transactions(db_session, job_id)]
+    assert sorted(descriptions) == ["BOOKS", "COFFEE", "TAXI"]
+
+
+@patch("app.services.llm_client._process_chunk_async")
+def test_interrupted_job_resumes_from_completed_chunks(mock_chunk, runner, db_session):
+    mock_chunk.side_effect = lambda chunk, *args: _rows(chunk)
+    first = _split_chunks(TEXT, BUDGET, 2)[0].text
+    # State left behind by a process that died after committing chunk 0
+    saved = [
+        TransactionModel(description=row["Description"], source="s.pdf")
+        for row in _rows(first)
+    ]
+    db_session.add_all(saved)
+    db_session.flush()
+    db_session.add_all(
+        [
+            AnalysisJob(
+                id="job-1",
+                status="running",
+                updated_at=STALE,
+                text=TEXT,
+                source_filename="s.pdf",
+                language="en",
+                model="model",
+                chunks_total=2,
+                chunks_done=1,
+                transactions_added=len(saved),
+            ),
+            AnalysisJobChunk(
+                job_id="job-1",
+                chunk_index=0,
+                status="done",
+                extracted_json=json.dumps(_rows(first)),
+                transaction_ids=json.dumps([t.id for t in saved]),
+            ),
+        ]
+    )
+    db_session.commit()
+
+    asyncio.run(runner.run("job-1"))
+
+    assert mock_chunk.call_count == 1  # only the unfinished chunk
+    job = db_session.get(AnalysisJob, "job-1")
+    db_session.refresh(job)
+    assert (job.status, job.chunks_done, job.transactions_added) == ("done", 2, 3)
+    descriptions = [t.description for t in db_session.query(TransactionModel)]
+    assert sorted(descriptions) == ["BOOKS", "COFFEE", "TAXI"]
+
+
+@patch("app.services.llm_client._process_chunk_async")
+def test_failed_job_is_retried_through_the_endpoint(mock_chunk, runner, db_session):
+    def unavailable(chunk, *args):
+        if "BOOKS" in chunk:
+            raise LLMUnavailableError("model", "429", 5)
+        return _rows(chunk)
+
+    async def main():
+        await runner.start()
+        job = runner.submit(db_session, TEXT, "s.pdf", "en", "model")
+        await runner._queue.join()
+        db_session.refresh(job)
+        failed = (job.status, job.chunks_done, job.chunks_failed)
+
+        mock_chunk.reset_mock(side_effect=True)
+        mock_chunk.side_effect = lambda chunk, *args: _rows(chunk)
+        with patch("app.api.endpoints.analysis_jobs", runner):
+            retried = endpoints.retry_analysis_job(job.id, db_session)
+        await runner._queue.join()
+        await runner.stop()
+        return job, failed, retried
+
+    mock_chunk.side_effect = unavailable
+    job, failed, retried = asyncio.run(main())
+
+    assert failed == ("failed", 1, 1)
+    assert retried["status"] == "queued"
+    db_session.refresh(job)
+    assert mock_chunk.call_count == 1
+    assert (job.status, job.chunks_done, job.chunks_failed) == ("done", 2, 0)
+    assert db_session.query(TransactionModel).count() == 3
+    with pytest.raises(HTTPException) as error:
+        endpoints.retry_analysis_job(job.id, db_session)
+    assert error.value.status_code == 409
+
+
+@patch("app.services.llm_client._process_chunk_async")
+def test_a_job_is_claimed_by_one_runner(mock_chunk, runner, db_session):
+    mock_chunk.side_effect = lambda chunk, *args: _rows(chunk)
+    factory = sessionmaker(bind=db_session.get_bind(), autoflush=False)
+    # Another uvicorn worker with its own runner
+    other = AnalysisJobRunner(session_factory=factory, workers=1)
+    job = runner.submit(db_session, TEXT, "s.pdf", "en", "model")
+
+    async def main():
+        await asyncio.gather(runner.run(job.id), other.run(job.id))
+
+    asyncio.run(main())
+
+    assert mock_chunk.call_count == 2  # each chunk once
+    assert db_session.query(TransactionModel).count() == 3
+
+
+def test_only_stale_running_jobs_are_resumed(runner, db_session):
+    for job_id, updated_at in (("live", datetime.utcnow()), ("dead", STALE)):
+        db_session.add(
+            AnalysisJob(id=job_id, status="running", text=TEXT, updated_at=updated_at)
+        )
+    db_session.commit()
+
+    async def main():
+        await runner.start()
+        queued = list(runner._queue._queue)
+        await runner.stop()
+        return queued
+
+    assert asyncio.run(main()) == ["dead"]
+
+
+@patch("app.services.llm_client._process_chunk_async")
+def test_job_is_resumed_after_a_restart_within_the_stale_window(
+    mock_chunk, runner, db_session
+):
+    mock_chunk.side_effect = lambda chunk, *args: _rows(chunk)
+    # Touched just now by a process that crashed and restarted at once
+    db_session.add(
+        AnalysisJob(
+            id="job-1",
+            status="running",
+            updated_at=datetime.utcnow(),
+            text=TEXT,
+            source_filename="s.pdf",
+            language="en",
+            model="model",
+        )
+    )
+    db_session.commit()
+    runner._stale_after = 0.3
+    job = db_session.get(AnalysisJob, "job-1")
+
+    async def main():
+        await runner.start()
+        assert not runner._queue._queue  # not stale yet
+        for _ in range(50):
+            await asyncio.sleep(0.1)
+            db_session.refresh(job)
+            if job.status == "done":
+                break
+        await runner.stop()
+
+    asyncio.run(main())
+
+    assert job.status == "done"
+    assert db_session.query(TransactionModel).count() == 3
+
+
+@patch("app.services.llm_client._process_chunk_async")
+def test_running_jobs_are_kept_alive(mock_chunk, runner, db_session):
+    async def slow(chunk, *args):
+        await asyncio.sleep(5)
+
+    mock_chunk.side_effect = slow
+    runner._stale_after = 0.3
+    factory = sessionmaker(bind=db_session.get_bind(), autoflush=False)
+    other = AnalysisJobRunner(session_factory=factory, workers=1, stale_after=0.3)
+
+    async def main():
+        await runner.start()
+        job = runner.submit(db_session, TEXT, "s.pdf", "en", "model")
+        await asyncio.sleep(1)
+        resumable = other._find_resumable()
+        await runner.stop()
+        return job, resumable
+
+    job, resumable = asyncio.run(main())
+
+    assert job.id not in resumable
+
+
+@patch("app.services.llm_client._process_chunk_async")
+def test_stopped_job_is_queued_for_the_next_start(mock_chunk, runner, db_session):
+    async def slow(chunk, *args):
+        await asyncio.sleep(5)
+
+    mock_chunk.side_effect = slow
+
+    async def main():
+        await runner.start()
+        job = runner.submit(db_session, TEXT, "s.pdf", "en", "model")
+        await asyncio.sleep(0.1)
+        await runner.stop()
+        return job
+
+    job = asyncio.run(main())
+
+    db_session.refresh(job)
+    assert job.status == "queued"
+
+
+@patch("app.services.llm_client._process_chunk_async")
+def test_repeated_purchase_in_a_later_chunk_is_kept(mock_chunk, runner, db_session):
+    mock_chunk.side_effect = lambda chunk, *args: _rows(chunk)
+    text = TEXT + "\n2023-10-01 COFFEE 5.00"
+    job = runner.submit(db_session, text, "s.pdf", "en", "model")
+
+    asyncio.run(runner.run(job.id))
+
+    db_session.refresh(job)
+    descriptions = [t.description for t in db_session.query(TransactionModel)]
+    assert sorted(descriptions) == ["BOOKS", "COFFEE", "COFFEE", "TAXI"]
+    assert job.transactions_added == 4
+
+
+@patch("app.services.llm_client._process_chunk_async")
+def test_resumed_job_continues_occurrence_numbering(mock_chunk, runner, db_session):
+    mock_chunk.side_effect = lambda chunk, *args: _rows(chunk)
+    text = TEXT + "\n2023-10-01 COFFEE 5.00"
+    chunks = [chunk.text for chunk in _split_chunks(text, BUDGET, 2)]
+    # State left behind by a process that died after committing chunks 0 and 1
+    saved = {0: _rows(chunks[0]), 1: _rows(chunks[1])[2:]}
+    db_session.add(
+        AnalysisJob(
+            id="job-1",
+            status="running",
+            updated_at=STALE,
+            text=text,
+            source_filename="s.pdf",
+            language="en",
+            model="model",
+        )
+    )
+    for index, rows in saved.items():
+        save_transactions(db_session, rows, "s.pdf", commit=False)
+        db_session.add(
+            AnalysisJobChunk(
+                job_id="job-1",
+                chunk_index=index,
+                status="done",
+                extracted_json=json.dumps(_rows(chunks[index])),
+                saved_json=json.dumps(rows),
+            )
+        )
+    db_session.commit()
+
+    asyncio.run(runner.run("job-1"))
+
+    assert mock_chunk.call_args.args[0] == chunks[2]
+    descriptions = [t.description for t in db_session.query(TransactionModel)]
+    assert sorted(descriptions) == ["BOOKS", "COFFEE", "COFFEE", "TAXI"]
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+from unittest.mock import patch
+
+from app.api import endpoints
+from app.models.transaction import Transaction as TransactionModel
+from app.schemas import TextAnalysisRequest
+from app.services import llm_client
+from app.services.llm_client import _split_chunks, stream_analysis
+from app.services.llm_scheduler import LLMUnavailableError
+
+TEXT = "2023-10-01 COFFEE 5.00\n2023-10-02 TAXI 20.00\n2023-10-03 BOOKS 30.00"
+BUDGET = 15
+
+
+def _row(line):
+    date, description, amount = line.split()
+    return {"Date": date, "Description": description, "Amount": float(amount)}
+
+
+async def _slow_first_chunk(chunk, *args):
+    # The first chunk finishes last, so the overlap row arrives twice out of order
+    if "BOOKS" not in chunk:
+        await asyncio.sleep(0.05)
+    return [_row(line) for line in chunk.split("\n")]
+
+
+async def _collect(gen):
+    return [item async for item in gen]
+
+
+@patch("app.services.llm_client._chunk_budget", return_value=BUDGET)
+@patch("app.services.llm_client._process_chunk_async", side_effect=_slow_first_chunk)
+def test_results_stream_in_completion_order_without_overlap_duplicates(*mocks):
+    assert len(_split_chunks(TEXT, BUDGET, 2)) == 2
+
+    results = asyncio.run(_collect(stream_analysis(TEXT, "key", "url", "model")))
+
+    assert [result.index for result in results] == [1, 0]
+    rows = [row for result in results for row in result.transactions]
+    assert sorted(row["Description"] for row in rows) == ["BOOKS", "COFFEE", "TAXI"]
+
+
+@patch("app.services.llm_client._chunk_budget", return_value=BUDGET)
+@patch("app.services.llm_client._process_chunk_async")
+def test_endpoint_commits_each_chunk_and_reports_failures(
+    mock_chunk, _budget, db_session
+):
+    async def process(chunk, *args, **kwargs):
+        if "BOOKS" in chunk:
+            raise LLMUnavailableError("model", "429", 5)
+        return [_row(line) for line in chunk.split("\n")]
+
+    mock_chunk.side_effect = process
+    request = TextAnalysisRequest(text=TEXT, source_filename="s.pdf", language="en")
+
+    with patch("app.api.endpoints.SessionLocal", return_value=db_session):
+        lines = asyncio.run(
+            _collect(endpoints._stream_analysis_records(request, "k", "u", "m"))
+        )
+    records = [json.loads(line) for line in lines]
+
+    saved = [r for r in records if "transactions" in r]
+    assert [t["description"] for t in saved[0]["transactions"]] == ["COFFEE", "TAXI"]
+    errors = [r for r in records if "error" in r]
+    assert [(r["chunk"], r["chunks"]) for r in errors] == [(1, 2)]
+    assert records[-1] == {
+        "done": True,
+        "chunks": 2,
+        "failed_chunks": 1,
+        "transactions_added": 2,
+        "duplicates_skipped": 0,
+    }
+    assert db_session.query(TransactionModel).count() == 2
+
+
+@patch("app.services.llm_client._chunk_budget", return_value=BUDGET)
+@patch("app.services.llm_client._process_chunk_async")
+def test_endpoint_saves_and_reads_the_database_off_the_event_loop(
+    mock_chunk, _budget, db_session
+):
+    async def process(chunk, *args, **kwargs):
+        return [_row(line) for line in chunk.split("\n")]
+
+    mock_chunk.side_effect = process
+    loop_thread = threading.get_ident()
+    db_threads = []
+
+    def on_thread(fn):
+        def wrapper(*args, **kwargs):
+            db_threads.append(threading.get_ident())
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    request = TextAnalysisRequest(text=TEXT, source_filename="s.pdf", language="en")
+    with (
+        patch("app.api.endpoints.SessionLocal", return_value=db_session),
+        patch(
+            "app.api.endpoints.save_transactions",
+            on_thread(endpoints.save_transactions),
+        ),
+        patch(
+            "app.services.llm_client.lookup_categories",
+            on_thread(llm_client.lookup_categories),
+        ),
+    ):
+        asyncio.run(
+            _collect(endpoints._stream_analysis_records(request, "k", "u", "m"))
+        )
+
+    assert db_threads
+    assert loop_thread not in db_threads
+    assert db_session.query(TransactionModel).count() == 3
+
+
+@patch("app.services.llm_client._chunk_budget", return_value=BUDGET)
+@patch("app.services.llm_client._process_chunk_async")
+def test_early_rows_skip_only_rows_outside_overlaps(mock_chunk, _budget):
+    async def process(chunk, *args, on_item=None):
+        rows = [_row(line) for line in chunk.split("\n")]
+        for row in rows:
+            on_item(row)
+        return rows
+
+    mock_chunk.side_effect = process
+
+    results = asyncio.run(
+        _collect(stream_analysis(TEXT, "key", "url", "model", early_rows=True))
+    )
+
+    partial = [
+        row["Description"] for r in results if r.partial for row in r.transactions
+    ]
+    # BOOKS is outside every overlap; COFFEE and TAXI wait for their chunk
+    assert partial == ["BOOKS"]
+    rows = [row["Description"] for r in results for row in r.transactions]
+    assert sorted(rows) == ["BOOKS", "COFFEE", "TAXI"]
@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from app.core.metrics import metrics
+from app.services.anonymizer_service import AnonymizerService
+from app.services.pdf_processor import anonymize_text
+
+
+class FakeModel:
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, segments):
+        with self.lock:
+            self.batches.append(list(segments))
+        return [segment.replace("Alice", "[MASKED]") for segment in segments]
+
+
+def test_concurrent_requests_share_model_calls():
+    model = FakeModel()
+    loads = []
+    service = AnonymizerService(
+        lambda: loads.append(1) or model, max_batch_size=4, max_wait_ms=200
+    )
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = list(pool.map(lambda n: service.submit(f"Alice paid {n}"), range(8)))
+        results = [f.result(timeout=5) for f in futures]
+
+    assert results == [f"[MASKED] paid {n}" for n in range(8)]
+    assert len(loads) == 1
+    assert len(model.batches) < 8
+    assert max(len(batch) for batch in model.batches) <= 4
+
+
+def test_model_errors_propagate_to_callers():
+    def broken(segments):
+        raise RuntimeError("model offline")
+
+    service = AnonymizerService(lambda: broken, max_wait_ms=1)
+    future = service.submit("Alice")
+
+    assert isinstance(future.exception(timeout=5), RuntimeError)
+
+
+def test_missing_model_results_fail_the_batch():
+    service = AnonymizerService(lambda: lambda segments: segments[:1], max_wait_ms=50)
+    futures = [service.submit("Alice"), service.submit("Bob")]
+
+    assert all(isinstance(f.exception(timeout=5), ValueError) for f in futures)
+
+
+def test_stuck_model_falls_back_to_regex_masking():
+    release = threading.Event()
+    service = AnonymizerService(lambda: lambda segments: release.wait(), max_wait_ms=1)
+
+    with (
+        patch("app.services.pdf_processor.get_anonymizer_service", lambda: service),
+        patch("app.services.pdf_processor.config.anonymizer_timeout_seconds", 0.1),
+    ):
+        result = anonymize_text("姓名: 张三")
+    release.set()
+
+    assert "张三" not in result
+
+
+def test_only_flagged_lines_reach_the_model():
+    model = FakeModel()
+    service = AnonymizerService(lambda: model, max_batch_size=4, max_wait_ms=1)
+    text = (
+        "Dear Alice\nAddress: 1 Main Street\n\n2023-10-01 Alice Bakery 5.00\n姓名: 张三"
+    )
+    skipped_before = metrics.get("anonymizer.lines_skipped")
+
+    with (
+        patch("app.services.pdf_processor.get_anonymizer_service", lambda: service),
+        patch("app.services.pdf_processor.config.anonymizer_context_lines", 0),
+    ):
+        result = anonymize_text(text)
+
+    assert result == (
+        "Dear [MASKED]\nAddress: 1 Main Street\n\n"
+        "2023-10-01 Alice Bakery 5.00\n姓名: [NAME_REDACTED]"
+    )
+    sent = [line for batch in model.batches for s in batch for line in s.split("\n")]
+    assert "2023-10-01 Alice Bakery 5.00" not in sent
+    assert metrics.get("anonymizer.lines_skipped") == skipped_before + 1
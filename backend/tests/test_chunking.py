@@ -0,0 +1,123 @@
+import asyncio
+import sys
+from unittest.mock import patch
+
+from app.core.config import config
+from app.services import tokens
+from app.services.llm_client import (
+    _chunk_budget,
+    _merge_chunk_results,
+    _split_chunks,
+    analyze_transactions,
+)
+from app.services.tokens import context_limit, count_tokens
+
+
+def _rows(count):
+    return [f"2023-10-{n % 28 + 1:02d} SHOP {n:03d} {n}.00" for n in range(count)]
+
+
+def test_chunks_respect_token_budget_and_overlap():
+    lines = _rows(60)
+    chunks = _split_chunks("\n".join(lines), max_tokens=120, overlap_lines=2)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert count_tokens(chunk.text) + chunk.text.count("\n") <= 120
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.overlap == "\n".join(previous.text.split("\n")[-2:])
+        assert chunk.text.startswith(chunk.overlap)
+    # Every row is covered
+    covered = {line for chunk in chunks for line in chunk.text.split("\n")}
+    assert covered == set(lines)
+
+
+def test_context_limit_uses_longest_prefix():
+    assert context_limit("qwen/qwen3-next-80b-a3b-instruct") == 262144
+    assert context_limit("qwen/qwen-2.5-7b") == 32768
+    assert context_limit("unknown-model") == 32768
+
+
+def test_chunk_budget_follows_the_output_limit(monkeypatch):
+    monkeypatch.setattr(config, "llm_chunk_max_tokens", None)
+    monkeypatch.setattr(config, "llm_chunk_output_ratio", 4.0)
+
+    # 262144 * 0.25 of context, but only 32768 / 4 of output
+    assert _chunk_budget("qwen/qwen3-next-80b-a3b-instruct") == 8192
+    assert _chunk_budget("openai/gpt-5") == 32000
+    # gpt-3.5: 16385 * 0.25 of context is the tighter bound
+    assert _chunk_budget("gpt-3.5-turbo") == 1024
+
+    monkeypatch.setattr(config, "llm_chunk_max_tokens", 2000)
+    assert _chunk_budget("openai/gpt-5") == 2000
+
+
+def test_tokens_are_counted_with_the_model_family_encoding(monkeypatch):
+    class Encoding:
+        def __init__(self, name):
+            self.name = name
+
+        def encode(self, text, disallowed_special=()):
+            return text.split() if self.name == "cl100k_base" else list(text)
+
+    class Tiktoken:
+        get_encoding = Encoding
+
+    monkeypatch.setitem(sys.modules, "tiktoken", Tiktoken)
+    monkeypatch.setattr(tokens, "_encodings", {})
+
+    assert count_tokens("two words", "openai/gpt-3.5-turbo") == 2
+    # Other families are approximated with o200k_base
+    assert count_tokens("two words", "qwen/qwen3-next") == 9
+    assert set(tokens._encodings) == {"cl100k_base", "o200k_base"}
+
+
+def test_merge_drops_only_overlap_duplicates():
+    chunks = _split_chunks(
+        "2023-10-01 COFFEE 5.00\n2023-10-02 TAXI 20.00\n2023-10-03 BOOKS 30.00",
+        max_tokens=15,
+        overlap_lines=1,
+    )
+    assert len(chunks) == 2
+    coffee = {"Date": "2023-10-01", "Description": "COFFEE", "Amount": 5.0}
+    taxi = {"Date": "2023-10-02", "Description": "TAXI", "Amount": 20.0}
+    books = {"Date": "2023-10-03", "Description": "BOOKS", "Amount": 30.0}
+    overlap_row = next(
+        row for row in (coffee, taxi) if row["Description"] in chunks[1].overlap
+    )
+
+    merged = _merge_chunk_results(
+        chunks,
+        [
+            [coffee, taxi],
+            [dict(overlap_row, Amount="%.2f" % overlap_row["Amount"]), books],
+        ],
+    )
+
+    assert merged == [coffee, taxi, books]
+
+
+def test_merge_keeps_repeat_purchases_outside_the_overlap():
+    chunks = _split_chunks(
+        "A COFFEE 5.00\nB TAXI 20.00\nC COFFEE 5.00", 8, overlap_lines=1
+    )
+    coffee = {"Date": "2023-10-01", "Description": "COFFEE", "Amount": 5.0}
+    results = [[coffee]] + [[] for _ in chunks[1:]]
+    results[-1] = [coffee]
+
+    merged = _merge_chunk_results(chunks, results)
+
+    assert merged.count(coffee) == 2
+
+
+@patch("app.services.llm_client._process_chunk_async")
+def test_large_context_models_need_fewer_round_trips(mock_process_chunk):
+    mock_process_chunk.return_value = []
+    text = "\n".join(_rows(2400))
+
+    asyncio.run(analyze_transactions(text, "key", "url", "qwen/qwen3-next-80b"))
+    large_window_calls = mock_process_chunk.call_count
+    mock_process_chunk.reset_mock()
+    asyncio.run(analyze_transactions(text, "key", "url", "gpt-3.5-turbo"))
+
+    assert large_window_calls < mock_process_chunk.call_count
@@ -0,0 +1,123 @@
+from app.services.compaction import compact_statement_text
+
+
+def _page(number, rows):
+    return [
+        "ACME BANK    Credit Card Statement",
+        f"Statement period 2023-10-01 to 2023-10-31    Page {number} of 3",
+        "Date   Description   Amount",
+        *rows,
+        "",
+        "Questions? Call us or visit acmebank.example. Member FDIC.",
+        f"- {number} -",
+    ]
+
+
+PAGES = [
+    _page(1, ["2023-10-01   COFFEE    5.00", "2023-10-02  TAXI   20.00"]),
+    _page(2, ["2023-10-01   COFFEE    5.00", "2023-10-05  BOOKS   30.00"]),
+    _page(3, ["2023-10-09  GROCERY  42.10", "Page 3 of 3"]),
+]
+TEXT = "\n".join(line for page in PAGES for line in page)
+
+
+def test_repeated_page_boilerplate_is_kept_once():
+    compacted = compact_statement_text(TEXT)
+
+    assert compacted.text.split("\n") == [
+        "ACME BANK Credit Card Statement",
+        "Statement period 2023-10-01 to 2023-10-31 Page 1 of 3",
+        "Date Description Amount",
+        "2023-10-01 COFFEE 5.00",
+        "2023-10-02 TAXI 20.00",
+        "Questions? Call us or visit acmebank.example. Member FDIC.",
+        # A genuine repeat purchase on another page is not boilerplate
+        "2023-10-01 COFFEE 5.00",
+        "2023-10-05 BOOKS 30.00",
+        "2023-10-09 GROCERY 42.10",
+    ]
+
+
+def test_line_map_points_back_to_original_lines():
+    original = TEXT.split("\n")
+    compacted = compact_statement_text(TEXT)
+
+    for line, number in zip(compacted.text.split("\n"), compacted.line_map):
+        assert " ".join(original[number].split()) == line
+
+
+def test_reports_savings():
+    compacted = compact_statement_text(TEXT)
+
+    assert compacted.bytes_saved > len(TEXT.encode()) // 3
+    assert compacted.tokens_saved > 0
+
+
+def test_lines_below_the_repeat_threshold_are_kept():
+    text = "Header\n2023-10-01 A 1.00\n- 1 -\nHeader\n2023-10-02 B 2.00"
+
+    assert compact_statement_text(text, min_repeats=3).text == text.replace(
+        "- 1 -\n", ""
+    )
+    assert compact_statement_text(text, min_repeats=2).text.count("Header") == 1
+
+
+def test_repeated_continuation_lines_inside_pages_are_kept():
+    def page(number, rows):
+        lines = ["ACME BANK Credit Card Statement"]
+        for row in rows:
+            lines += [row, "Foreign transaction fee USD"]
+        return lines + ["Questions? Call us.", f"- {number} -"]
+
+    pages = [
+        page(1, ["2023-10-01 HOTEL 120.00", "2023-10-02 TAXI 20.00"]),
+        page(2, ["2023-10-03 MUSEUM 15.00", "2023-10-04 DINNER 60.00"]),
+        page(3, ["2023-10-05 TRAIN 45.00"]),
+    ]
+
+    lines = compact_statement_text(
+        "\n".join(line for lines in pages for line in lines)
+    ).text.split("\n")
+
+    assert lines.count("Foreign transaction fee USD") == 5
+    assert lines.count("ACME BANK Credit Card Statement") == 1
+    assert lines.count("Questions? Call us.") == 1
+
+
+def test_one_off_prose_outside_the_table_is_dropped():
+    text = "\n".join(
+        [
+            "ACME BANK Credit Card Statement",
+            "Card number **** **** **** 1234",
+            "Statement period 2023-10-01 to 2023-10-31",
+            "Date Description Amount",
+            "2023-10-01 HOTEL 120.00",
+            "Foreign transaction fee USD",
+            "2023-10-02 TAXI 20.00",
+            "Total 140.00",
+            "",
+            "Important information about your account",
+            "Interest is charged on purchases not paid in full by the due date.",
+            "Please read the terms and conditions carefully.",
+            "Upgrade to ACME Platinum and earn double points on travel!",
+            "Call 800-555-0100 or visit acmebank.example",
+        ]
+    )
+
+    lines = compact_statement_text(text).text.split("\n")
+
+    assert lines == [
+        "ACME BANK Credit Card Statement",
+        "Card number **** **** **** 1234",
+        "Statement period 2023-10-01 to 2023-10-31",
+        "Date Description Amount",
+        "2023-10-01 HOTEL 120.00",
+        "Foreign transaction fee USD",
+        "2023-10-02 TAXI 20.00",
+        "Total 140.00",
+        # Within two lines of the table, so they are kept
+        "Important information about your account",
+        "Interest is charged on purchases not paid in full by the due date.",
+        # Lines with digits are never dropped
+        "Call 800-555-0100 or visit acmebank.example",
+    ]
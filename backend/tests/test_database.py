@@ -0,0 +1,80 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.api import endpoints
+from app.core.database import create_async_db_engine, create_db_engine
+from app.models.transaction import Base, Settings
+from app.schemas import TextAnalysisRequest
+
+
+def _pragmas(conn):
+    return {
+        name: conn.execute(text(f"PRAGMA {name}")).scalar()
+        for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size")
+    }
+
+
+def test_engine_enables_wal_and_pragmas(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    try:
+        with engine.connect() as conn:
+            pragmas = _pragmas(conn)
+    finally:
+        engine.dispose()
+
+    # synchronous=NORMAL is reported as 1
+    assert pragmas == {
+        "journal_mode": "wal",
+        "synchronous": 1,
+        "busy_timeout": 5000,
+        "cache_size": -64 * 1024,
+    }
+
+
+def test_async_engine_uses_the_same_pragmas(tmp_path):
+    async def main():
+        engine = create_async_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+        try:
+            async with engine.connect() as conn:
+                return await conn.run_sync(_pragmas)
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(main())["journal_mode"] == "wal"
+
+
+def test_analyze_text_reads_settings_and_saves_through_async_session(tmp_path):
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    engine = create_db_engine(url)
+    Base.metadata.create_all(bind=engine)
+    SyncSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with SyncSession() as db:
+        db.add(Settings(key="api_key", value="sk-test"))
+        db.commit()
+    rows = [{"Date": "2023-10-01", "Description": "Coffee", "Amount": 5.0}]
+
+    async def main():
+        async_engine = create_async_db_engine(url)
+        try:
+            async with async_sessionmaker(async_engine, expire_on_commit=False)() as db:
+                return await endpoints.analyze_text(
+                    TextAnalysisRequest(text="statement", source_filename="s.pdf"),
+                    db,
+                )
+        finally:
+            await async_engine.dispose()
+
+    analyze = AsyncMock(return_value=rows)
+    with patch("app.api.endpoints.analyze_transactions", analyze):
+        response = asyncio.run(main())
+
+    assert analyze.await_args.args[1] == "sk-test"
+    # The extraction cache and merchant index use the async session too
+    assert isinstance(analyze.await_args.kwargs["db"], AsyncSession)
+    assert (response["transactions_added"], response["duplicates_skipped"]) == (1, 0)
+    assert response["transactions"][0].id is not None
+    engine.dispose()
@@ -0,0 +1,40 @@
+from app.core.config import config
+from app.models.transaction import ParsedDocument
+from app.services.document_cache import (
+    content_hash,
+    get_cached_document,
+    get_cached_raw_text,
+    store_document,
+)
+
+
+def test_hit_after_store(db_session):
+    sha256 = content_hash(b"%PDF statement")
+    assert get_cached_document(db_session, sha256) is None
+
+    store_document(db_session, sha256, "raw 4000-1234", "raw [CC_REDACTED]")
+
+    cached = get_cached_document(db_session, sha256)
+    assert cached.raw_text == "raw 4000-1234"
+    assert cached.anonymized_text == "raw [CC_REDACTED]"
+
+
+def test_anonymizer_version_is_part_of_the_key(db_session):
+    sha256 = content_hash(b"%PDF statement")
+    store_document(db_session, sha256, "raw", "old", anonymizer_version="v0")
+
+    assert get_cached_document(db_session, sha256, anonymizer_version="v1") is None
+    assert get_cached_raw_text(db_session, sha256) == "raw"
+
+
+def test_lru_eviction_respects_size_cap(db_session, monkeypatch):
+    monkeypatch.setattr(config, "document_cache_max_bytes", 25)
+    first, second, third = (content_hash(bytes([n])) for n in range(3))
+
+    store_document(db_session, first, "aaaaa", "aaaaa")
+    store_document(db_session, second, "bbbbb", "bbbbb")
+    get_cached_document(db_session, first)  # first is now most recently used
+    store_document(db_session, third, "ccccc", "ccccc")
+
+    remaining = {d.content_sha256 for d in db_session.query(ParsedDocument)}
+    assert remaining == {first, third}
@@ -0,0 +1,34 @@
+import json
+from unittest.mock import patch
+
+from app.api import endpoints
+
+
+def _records(lines):
+    return [json.loads(line) for line in lines]
+
+
+@patch("app.api.endpoints.anonymize_text", side_effect=lambda text: text.upper())
+def test_parse_pdf_stream_emits_pages_in_order(mock_anonymize, make_pdf, tmp_path):
+    path = tmp_path / "statement.pdf"
+    path.write_bytes(make_pdf([["first page"], [], ["third page"]]))
+
+    records = _records(endpoints._stream_parsed_pages(str(path), "statement.pdf"))
+
+    assert records[:-1] == [
+        {"page": 1, "text": "FIRST PAGE\n"},
+        {"page": 3, "text": "THIRD PAGE\n"},
+    ]
+    assert records[-1] == {"done": True, "filename": "statement.pdf", "pages": 3}
+
+    assert not path.exists()  # the spooled upload is cleaned up
+
+
+def test_parse_pdf_stream_reports_errors(tmp_path):
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"not a pdf")
+
+    records = _records(endpoints._stream_parsed_pages(str(path), "broken.pdf"))
+
+    assert len(records) == 1
+    assert records[0]["error"].startswith("PDF extraction failed")
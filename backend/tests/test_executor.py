@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.executor import BoundedExecutor, ExecutorBusyError
+
+
+def test_rejects_work_beyond_queue_depth():
+    executor = BoundedExecutor(max_workers=1, max_queue=1, retry_after=7)
+    gate = threading.Event()
+
+    jobs = [executor.submit(gate.wait), executor.submit(gate.wait)]
+    with pytest.raises(ExecutorBusyError) as exc:
+        executor.submit(gate.wait)
+    assert exc.value.retry_after == 7
+
+    gate.set()
+    for job in jobs:
+        job.result(timeout=5)
+    # Slots are released from the futures' done callbacks
+    deadline = time.monotonic() + 5
+    while executor.pending and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert executor.submit(lambda: "ok").result(timeout=5) == "ok"
+
+
+def test_run_keeps_event_loop_responsive():
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+    gate = threading.Event()
+
+    async def scenario():
+        job = asyncio.ensure_future(executor.run(gate.wait, 5))
+        # The loop keeps serving other coroutines while the job blocks
+        await asyncio.sleep(0.01)
+        assert not job.done()
+        gate.set()
+        return await job
+
+    assert asyncio.run(scenario()) is True
+    assert executor.pending == 0
+
+
+def test_stream_holds_one_slot_and_yields_in_order():
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+    gate = threading.Event()
+
+    def pages():
+        gate.wait(5)
+        yield from ("page 1", "page 2", "page 3")
+
+    async def scenario():
+        records = executor.stream(pages)
+        with pytest.raises(ExecutorBusyError):
+            executor.submit(lambda: None)
+        gate.set()
+        return [record async for record in records]
+
+    assert asyncio.run(scenario()) == ["page 1", "page 2", "page 3"]
@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from app.core.metrics import metrics
+from app.models.transaction import ExtractionResult
+from app.services.extraction_cache import (
+    evict_expired_extractions,
+    extraction_key,
+    get_cached_extractions,
+    store_extractions,
+)
+from app.services.llm_client import _chunk_cache_key, analyze_transactions
+from app.services.llm_hedging import Hedger
+from app.services.llm_scheduler import LLMScheduler
+
+STATEMENT = "\n".join(
+    f"2023-10-{day:02d} Merchant {day} {day}.00" for day in range(1, 21)
+)
+
+
+def _extracted(chunk, *args):
+    return [{"Date": "2023-10-01", "Description": chunk[:20], "Amount": 1.0}]
+
+
+def test_key_changes_with_prompt_inputs():
+    base = extraction_key("text", "model", "en", ["Food"], "v1")
+
+    assert base == extraction_key("text", "model", "en", ["Food"], "v1")
+    assert base != extraction_key("text!", "model", "en", ["Food"], "v1")
+    assert base != extraction_key("text", "other", "en", ["Food"], "v1")
+    assert base != extraction_key("text", "model", "zh", ["Food"], "v1")
+    assert base != extraction_key("text", "model", "en", ["Travel"], "v1")
+    assert base != extraction_key("text", "model", "en", ["Food"], "v2")
+
+
+@patch("app.services.llm_client._chunk_budget", return_value=60)
+@patch("app.services.llm_client._process_chunk_async")
+def test_unchanged_chunks_are_served_from_cache(mock_chunk, _budget, db_session):
+    mock_chunk.side_effect = _extracted
+
+    first = asyncio.run(
+        analyze_transactions(STATEMENT, "key", "url", "model", "en", db=db_session)
+    )
+    chunk_count = mock_chunk.call_count
+    assert chunk_count > 2
+
+    mock_chunk.reset_mock()
+    hits = metrics.get("llm.extraction_cache_hits")
+    edited = STATEMENT.replace("Merchant 20", "Merchant twenty")
+    second = asyncio.run(
+        analyze_transactions(edited, "key", "url", "model", "en", db=db_session)
+    )
+
+    assert mock_chunk.call_count == 1
+    assert metrics.get("llm.extraction_cache_hits") - hits == chunk_count - 1
+    assert second[:-1] == first[:-1]
+
+
+@patch("app.services.llm_client._chunk_budget", return_value=60)
+@patch("app.services.llm_client._process_chunk_async")
+def test_editing_an_early_line_keeps_later_chunks_cached(
+    mock_chunk, _budget, db_session
+):
+    mock_chunk.side_effect = _extracted
+    statement = "\n".join(
+        f"2023-10-{day % 28 + 1:02d} Merchant {day} {day}.00" for day in range(80)
+    )
+    asyncio.run(
+        analyze_transactions(statement, "key", "url", "model", "en", db=db_session)
+    )
+    chunk_count = mock_chunk.call_count
+    assert chunk_count > 4
+
+    hits = metrics.get("llm.extraction_cache_hits")
+    edited = statement.replace(
+        "Merchant 0 ", "Merchant zero, renamed by the bank after its merger ", 1
+    )
+    asyncio.run(
+        analyze_transactions(edited, "key", "url", "model", "en", db=db_session)
+    )
+
+    # Only the chunk holding the edited line changed (it may now be two)
+    assert metrics.get("llm.extraction_cache_hits") - hits == chunk_count - 1
+
+
+@patch("app.services.llm_client._process_chunk_async")
+def test_failed_chunks_are_not_cached(mock_chunk, db_session):
+    mock_chunk.return_value = None
+
+    asyncio.run(
+        analyze_transactions(STATEMENT, "key", "url", "model", "en", db=db_session)
+    )
+
+    assert db_session.query(ExtractionResult).count() == 0
+
+
+def test_expired_entries_miss_and_are_evicted(db_session, monkeypatch):
+    store_extractions(db_session, {"old": [], "new": [{"Amount": 1}]}, "model")
+    db_session.query(ExtractionResult).filter_by(cache_key="old").update(
+        {"created_at": datetime.utcnow() - timedelta(days=60)}
+    )
+    db_session.commit()
+    monkeypatch.setattr("app.core.config.config.llm_cache_ttl_seconds", 86400)
+
+    assert get_cached_extractions(db_session, ["old", "new"]) == {
+        "new": [{"Amount": 1}]
+    }
+    assert evict_expired_extractions(db_session) == 1
+    assert db_session.query(ExtractionResult).count() == 1
+
+
+def test_hedge_answer_is_cached_for_the_model_that_gave_it(db_session):
+    scheduler = LLMScheduler(initial=4, max_retries=0)
+    for _ in range(20):
+        scheduler.latency("model").record(0.01)
+    hedger = Hedger(
+        scheduler, enabled=True, min_delay=0.05, fallback_models={"model": "mini"}
+    )
+
+    async def extract(chunk, api_key, base_url, model, language):
+        async def answer():
+            await asyncio.sleep(5 if model == "model" else 0.01)
+            return [{"Date": "2023-10-01", "Description": model, "Amount": 1.0}]
+
+        return await scheduler.run(model, answer)
+
+    with (
+        patch("app.services.llm_client.llm_hedger", hedger),
+        patch("app.services.llm_client._process_chunk_async", side_effect=extract),
+    ):
+        rows = asyncio.run(
+            analyze_transactions(
+                "statement", "key", "url", "model", "en", db=db_session
+            )
+        )
+
+    assert rows[0]["Description"] == "mini"
+    entries = db_session.query(ExtractionResult).all()
+    assert [entry.model for entry in entries] == ["mini"]
+    assert (
+        get_cached_extractions(
+            db_session, [_chunk_cache_key("statement", "model", "en")]
+        )
+        == {}
+    )
@@ -0,0 +1,53 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+from app.services import ingestion
+
+
+async def _collect(files):
+    return [r async for r in ingestion.ingest_statements(files, "key", "url", "model")]
+
+
+def _slow(result, delay=0.05):
+    def run(*args):
+        time.sleep(delay)
+        return result(*args)
+
+    return run
+
+
+async def _fake_analyze(text, *args, **kwargs):
+    await asyncio.sleep(0.05)
+    if "BROKEN" in text:
+        raise RuntimeError("LLM unavailable")
+    return [{"Date": "2023-10-01", "Description": text, "Amount": 1}]
+
+
+@patch("app.services.ingestion._save", side_effect=lambda items, name: len(items))
+@patch("app.services.ingestion.analyze_transactions", side_effect=_fake_analyze)
+@patch("app.services.ingestion.anonymize_text", side_effect=_slow(str.upper))
+@patch("app.services.ingestion._extract", side_effect=_slow(bytes.decode))
+def test_batch_reports_per_file_status_and_overlaps_stages(*mocks):
+    files = [("a.pdf", b"a"), ("b.pdf", b"b"), ("c.pdf", b"broken")]
+
+    records = asyncio.run(_collect(files))
+
+    final = {
+        r["filename"]: r for r in records[:-1] if r["status"] in ("done", "failed")
+    }
+    assert final["a.pdf"]["transactions_added"] == 1
+    assert final["c.pdf"]["status"] == "failed"
+    assert final["c.pdf"]["error"] == "LLM unavailable"
+    assert records[-1] == {
+        "done": True,
+        "files": 3,
+        "succeeded": 2,
+        "failed": 1,
+        "transactions_added": 2,
+    }
+
+    # A later file starts extracting before an earlier one has finished
+    statuses = [(r["index"], r["status"]) for r in records[:-1]]
+    first_done = statuses.index((0, "done"))
+    assert statuses.index((1, "anonymizing")) < first_done
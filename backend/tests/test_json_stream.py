@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import httpx
+
+from app.services.json_stream import JsonArrayStreamParser
+from app.services.llm_client import _process_chunk_async, llm_registry
+
+ROWS = [
+    {"Date": "2023-10-01", "Description": 'Shop "A" {x}', "Amount": 5.0},
+    {"Date": "2023-10-02", "Description": "Taxi [airport]\\n", "Amount": 20.0},
+    {"Date": "2023-10-03", "Description": "书店", "Amount": 30.0},
+]
+
+
+def _feed_in_pieces(parser, text, size):
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start : start + size]))
+    return items
+
+
+def test_objects_are_emitted_as_soon_as_they_close():
+    parser = JsonArrayStreamParser()
+    text = json.dumps(ROWS, ensure_ascii=False)
+    first_end = text.index("}, {") + 1
+
+    assert parser.feed(text[: first_end - 1]) == []
+    assert parser.feed(text[first_end - 1 : first_end]) == [ROWS[0]]
+    assert parser.feed(text[first_end:]) == ROWS[1:]
+
+
+def test_any_split_of_the_stream_gives_the_same_objects():
+    text = "```json\n" + json.dumps(ROWS, ensure_ascii=False, indent=2) + "\n```"
+    for size in (1, 2, 7, 64):
+        assert _feed_in_pieces(JsonArrayStreamParser(), text, size) == ROWS
+
+
+def test_malformed_and_truncated_items_are_skipped():
+    parser = JsonArrayStreamParser()
+    text = '[{"Amount": 1}, {"Amount": oops}, {"Amount": 3}, {"Amount": 4, "Desc'
+
+    items = _feed_in_pieces(parser, text, 5)
+
+    assert items == [{"Amount": 1}, {"Amount": 3}]
+    assert parser.malformed == 1
+    assert parser.truncated
+
+
+def _sse(pieces):
+    events = [
+        {
+            "id": "1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "test-model",
+            "choices": [{"index": 0, "delta": {"content": piece}}],
+        }
+        for piece in pieces
+    ]
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+    return body + "data: [DONE]\n\n"
+
+
+def test_chunk_extraction_streams_items_from_the_model(monkeypatch):
+    text = json.dumps(ROWS[:2]) + "\n"
+    pieces = [text[i : i + 9] for i in range(0, len(text), 9)]
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            text=_sse(pieces),
+        )
+    )
+    monkeypatch.setattr(
+        llm_registry,
+        "_http_clients",
+        lambda loop: (None, httpx.AsyncClient(transport=transport)),
+    )
+    llm_registry.invalidate()
+    seen = []
+
+    result = asyncio.run(
+        _process_chunk_async(
+            "statement",
+            "sk-test",
+            "https://llm.test/v1",
+            "test-model",
+            "en",
+            seen.append,
+        )
+    )
+    llm_registry.invalidate()
+
+    assert result == ROWS[:2]
+    assert seen == ROWS[:2]
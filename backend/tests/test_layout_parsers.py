@@ -0,0 +1,148 @@
+import asyncio
+import datetime
+import re
+from unittest.mock import patch
+
+from app.services import layout_parsers
+from app.services.layout_parsers import (
+    StatementLayout,
+    parse_known_layout,
+    register_layout,
+)
+from app.services.llm_client import analyze_transactions
+
+DUMMY_STATEMENT = """Bank of AI - Monthly Statement
+[NAME_REDACTED]
+Date Description Amount
+2023-10-01 UBER TRIP 25.50
+2023-10-02 STARBUCKS 5.40
+2023-10-15 APPLE STORE 1,999.00
+"""
+
+
+def test_parses_iso_dated_statement():
+    rows = parse_known_layout(DUMMY_STATEMENT)
+
+    assert rows == [
+        {
+            "Date": "2023-10-01",
+            "Description": "UBER TRIP",
+            "Amount": 25.5,
+            "CardLastFour": None,
+        },
+        {
+            "Date": "2023-10-02",
+            "Description": "STARBUCKS",
+            "Amount": 5.4,
+            "CardLastFour": None,
+        },
+        {
+            "Date": "2023-10-15",
+            "Description": "APPLE STORE",
+            "Amount": 1999.0,
+            "CardLastFour": None,
+        },
+    ]
+
+
+def test_parses_cn_credit_card_statement():
+    text = "交易日 记账日 交易摘要 人民币金额 卡号末四位 交易地金额\n10/05 10/06 美团外卖 38.50 1234 38.50\n10/08 10/09 退款 京东 -12.00 1234 -12.00"
+
+    rows = parse_known_layout(text)
+
+    assert [(r["Description"], r["Amount"], r["CardLastFour"]) for r in rows] == [
+        ("美团外卖", 38.5, "1234"),
+        ("退款 京东", -12.0, "1234"),
+    ]
+    assert rows[0]["Date"].endswith("-10-05")
+
+
+def test_year_comes_from_the_statement_date():
+    text = (
+        "账单日 2024年01月05日 到期还款日 2024年01月25日\n"
+        "交易日 记账日 交易摘要 人民币金额 卡号末四位\n"
+        "12/20 12/21 携程旅行 880.00 1234\n"
+        "01/03 01/04 美团外卖 38.50 1234"
+    )
+
+    rows = parse_known_layout(text)
+
+    # December rows of a statement closing in January are last year's
+    assert [r["Date"] for r in rows] == ["2023-12-20", "2024-01-03"]
+
+
+def test_rows_without_a_statement_date_are_never_in_the_future():
+    today = datetime.date.today()
+    tomorrow = today + datetime.timedelta(days=1)
+    text = (
+        "交易日 交易摘要 人民币金额 卡号末四位\n"
+        f"{today:%m/%d} 美团外卖 38.50 1234\n"
+        f"{tomorrow:%m/%d} 京东 12.00 1234"
+    )
+
+    dates = [r["Date"] for r in parse_known_layout(text)]
+
+    assert dates[0] == f"{today:%Y-%m-%d}"
+    assert dates[1] < dates[0]
+
+
+def test_card_repayments_are_skipped():
+    english = DUMMY_STATEMENT + (
+        "2023-10-20 PAYMENT - THANK YOU -2,000.00\n2023-10-21 AUTOPAY -50.00\n"
+        "2023-10-22 PAYPAL *SHOP 12.00\n"
+    )
+    chinese = (
+        "交易日 交易摘要 人民币金额 卡号末四位\n"
+        "10/05 美团外卖 38.50 1234\n10/10 还款 -1,000.00 1234"
+    )
+
+    assert [r["Description"] for r in parse_known_layout(english)][3:] == [
+        "PAYPAL *SHOP"
+    ]
+    assert [r["Description"] for r in parse_known_layout(chinese)] == ["美团外卖"]
+
+
+def test_falls_back_when_rows_are_unparseable():
+    assert parse_known_layout(DUMMY_STATEMENT + "Total 2,029.90\n") is not None
+
+    text = DUMMY_STATEMENT + "Total 2,029.90\n2023-10-20 CITY\nUTILITIES 85.00\n"
+
+    assert parse_known_layout(text) is None
+    assert parse_known_layout("no table here 2023-10-01 5.00") is None
+
+
+def test_registered_layouts_take_precedence(monkeypatch):
+    monkeypatch.setattr(layout_parsers, "_LAYOUTS", list(layout_parsers._LAYOUTS))
+    register_layout(
+        StatementLayout(
+            name="custom",
+            header=("Date", "Description", "Amount"),
+            row_pattern=re.compile(r"^(\S+) (.+) (\S+)$"),
+            to_transaction=lambda m: {"Description": m[2].lower()},
+        )
+    )
+
+    assert parse_known_layout(DUMMY_STATEMENT)[0] == {"Description": "uber trip"}
+
+
+@patch("app.services.llm_client._process_chunk_async")
+@patch(
+    "app.services.llm_client._categorize_batch_async",
+    return_value=["Transportation", "Food & Dining", "Not a category"],
+)
+def test_known_layout_only_uses_llm_for_categories(mock_categorize, mock_extract):
+    result = asyncio.run(
+        analyze_transactions(DUMMY_STATEMENT, "key", "url", "model", "en")
+    )
+
+    mock_extract.assert_not_called()
+    assert mock_categorize.call_args.args[0] == [
+        "UBER TRIP",
+        "STARBUCKS",
+        "APPLE STORE",
+    ]
+    assert [r["Category"] for r in result] == [
+        "Transportation",
+        "Food & Dining",
+        "Needs Review",
+    ]
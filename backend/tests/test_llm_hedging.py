@@ -0,0 +1,134 @@
+import asyncio
+
+from app.services.llm_hedging import Hedger
+from app.services.llm_scheduler import LatencyHistogram, LLMScheduler
+
+
+def _hedger(**kwargs):
+    scheduler = LLMScheduler(initial=4, max_retries=0)
+    for model in ("slow", "fast"):
+        for _ in range(20):
+            scheduler.latency(model).record(0.01)
+            scheduler.first_item_latency(model).record(0.01)
+    options = {"enabled": True, "min_delay": 0.05, "fallback_models": {"slow": "fast"}}
+    options.update(kwargs)
+    return scheduler, Hedger(scheduler, **options)
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram(window=100)
+    assert histogram.percentile(0.95) is None
+
+    for value in range(1, 201):
+        histogram.record(value / 100)
+
+    assert histogram.count == 100
+    assert histogram.percentile(0.5) == 1.5
+    assert histogram.percentile(0.95) == 1.95
+    assert histogram.percentile(1.0) == 2.0
+
+
+def test_slow_call_is_hedged_to_the_fallback_model():
+    scheduler, hedger = _hedger()
+    cancelled = []
+
+    async def answer(model):
+        try:
+            await asyncio.sleep(5 if model == "slow" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return model
+
+    async def main():
+        return await hedger.run(
+            "slow", lambda model: scheduler.run(model, lambda: answer(model))
+        )
+
+    assert asyncio.run(main()) == "fast"
+    assert cancelled == ["slow"]
+
+
+def test_fast_call_is_not_hedged():
+    scheduler, hedger = _hedger()
+    models = []
+
+    async def answer(model):
+        models.append(model)
+        return model
+
+    async def main():
+        return await hedger.run(
+            "slow", lambda model: scheduler.run(model, lambda: answer(model))
+        )
+
+    assert asyncio.run(main()) == "slow"
+    assert models == ["slow"]
+
+
+def test_no_hedging_without_enough_samples():
+    scheduler, hedger = _hedger(min_samples=50)
+
+    assert hedger.delay("slow") is None
+
+
+def test_unusable_primary_waits_for_the_hedge():
+    scheduler, hedger = _hedger()
+
+    async def answer(model):
+        # The primary gives up (None) after the hedge was already sent
+        await asyncio.sleep(0.1 if model == "slow" else 0.2)
+        return None if model == "slow" else ["row"]
+
+    async def main():
+        return await hedger.run(
+            "slow", lambda model: scheduler.run(model, lambda: answer(model))
+        )
+
+    assert asyncio.run(main()) == ["row"]
+
+
+def test_stream_switches_to_the_first_stream_with_output():
+    scheduler, hedger = _hedger()
+
+    async def tokens(model):
+        await asyncio.sleep(5 if model == "slow" else 0.01)
+        for token in (model, "!"):
+            yield token
+
+    def open_stream(model):
+        return scheduler.stream(model, lambda: tokens(model))
+
+    async def main():
+        return [token async for token in hedger.stream("slow", open_stream)]
+
+    assert asyncio.run(main()) == ["fast", "!"]
+    assert scheduler.limiter("slow").in_flight == 0
+
+
+def test_stream_delay_uses_time_to_first_item():
+    scheduler, hedger = _hedger()
+    for _ in range(20):
+        # Long answers, but the first token usually comes quickly
+        scheduler.latency("chat").record(30.0)
+        scheduler.first_item_latency("chat").record(0.5)
+
+    assert hedger.delay("chat") == 30.0
+    assert hedger.delay("chat", first_item=True) == 0.5
+
+
+def test_scheduler_records_time_to_first_item():
+    scheduler = LLMScheduler(initial=1, max_retries=0)
+
+    async def tokens():
+        await asyncio.sleep(0.05)
+        yield "a"
+        await asyncio.sleep(0.2)
+        yield "b"
+
+    async def main():
+        return [token async for token in scheduler.stream("m", tokens)]
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert scheduler.first_item_latency("m").percentile(1.0) < 0.2
+    assert scheduler.latency("m").percentile(1.0) >= 0.25
@@ -0,0 +1,86 @@
+import asyncio
+
+from app.services.llm_client import OpenRouterChatOpenAI, _get_llm, llm_registry
+from app.services.llm_registry import LLMClientRegistry
+
+
+def _factory(calls):
+    def build(api_key, base_url, model, temperature, http_client, http_async_client):
+        calls.append((api_key, model, temperature))
+        return {"model": model, "http": http_client, "async_http": http_async_client}
+
+    return build
+
+
+def test_registry_reuses_clients_per_key():
+    calls = []
+    registry = LLMClientRegistry(_factory(calls))
+
+    first = registry.get("key", "https://example.com", "model-a", 0.1)
+    again = registry.get("key", "https://example.com", "model-a", 0.1)
+    other = registry.get("key", "https://example.com", "model-a", 0)
+
+    assert first is again
+    assert other is not first
+    assert len(calls) == 2
+    # Every client shares the same connection pool
+    assert other["http"] is first["http"]
+    assert other["async_http"] is first["async_http"]
+
+
+def test_async_pool_is_kept_per_event_loop():
+    calls = []
+    registry = LLMClientRegistry(_factory(calls))
+
+    async def get_twice():
+        first = registry.get("key", "url", "model-a")
+        assert registry.get("key", "url", "model-a") is first
+        return first
+
+    first_loop = asyncio.run(get_twice())
+    second_loop = asyncio.run(get_twice())
+
+    assert second_loop is not first_loop
+    assert second_loop["async_http"] is not first_loop["async_http"]
+    assert second_loop["http"] is first_loop["http"]
+    # The first loop is closed, so its clients were dropped
+    assert len(registry) == 1
+    assert len(calls) == 2
+
+
+def test_registry_evicts_idle_clients(monkeypatch):
+    calls = []
+    registry = LLMClientRegistry(_factory(calls), idle_ttl=10)
+    clock = [100.0]
+    monkeypatch.setattr("app.services.llm_registry.time.monotonic", lambda: clock[0])
+
+    registry.get("key", "url", "model-a")
+    registry.get("key", "url", "model-b")
+    clock[0] += 5
+    registry.get("key", "url", "model-a")
+    clock[0] += 8  # model-b idle for 13s, model-a for 8s
+    registry.get("key", "url", "model-a")
+
+    assert len(registry) == 1
+    assert len(calls) == 2
+
+
+def test_invalidate_drops_clients():
+    calls = []
+    registry = LLMClientRegistry(_factory(calls))
+    registry.get("old-key", "url", "model-a")
+
+    registry.invalidate()
+    registry.get("new-key", "url", "model-a")
+
+    assert len(registry) == 1
+    assert [call[0] for call in calls] == ["old-key", "new-key"]
+
+
+def test_get_llm_returns_pooled_openrouter_client():
+    llm_registry.invalidate()
+    llm = _get_llm("sk-test", "https://openrouter.ai/api/v1", "qwen/qwen3", 0.1)
+
+    assert isinstance(llm, OpenRouterChatOpenAI)
+    assert _get_llm("sk-test", "https://openrouter.ai/api/v1", "qwen/qwen3", 0.1) is llm
+    llm_registry.invalidate()
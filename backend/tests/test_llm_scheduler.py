@@ -0,0 +1,244 @@
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.core.metrics import metrics
+from app.models.transaction import ExtractionResult
+from app.services.llm_client import OpenRouterChatOpenAI, analyze_transactions
+from app.services.llm_scheduler import (
+    AdaptiveLimiter,
+    LLMScheduler,
+    LLMUnavailableError,
+    llm_scheduler,
+)
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _scheduler(**kwargs):
+    return LLMScheduler(**{"base_delay": 0, "max_delay": 0, **kwargs})
+
+
+def test_limiter_backs_off_multiplicatively_and_recovers_additively():
+    limiter = AdaptiveLimiter(initial=8, minimum=1, maximum=8, cooldown=0)
+
+    limiter.on_overload()
+    assert limiter.capacity == 4
+    limiter.on_overload()
+    limiter.on_overload()
+    limiter.on_overload()
+    assert limiter.capacity == 1
+
+    for _ in range(10):
+        limiter.on_success()
+    assert 1 < limiter.capacity < 8
+
+
+def test_overloads_within_cooldown_count_once():
+    limiter = AdaptiveLimiter(initial=8, maximum=8, cooldown=60)
+
+    for _ in range(5):
+        limiter.on_overload()
+
+    assert limiter.capacity == 4
+
+
+def test_concurrency_is_shared_across_callers():
+    scheduler = _scheduler(initial=2, maximum=2)
+    running = []
+    peak = []
+
+    async def call():
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*[scheduler.run("m", call) for _ in range(10)])
+
+    assert asyncio.run(main()) == ["ok"] * 10
+    assert max(peak) == 2
+    assert scheduler.limiter("m").in_flight == 0
+
+
+def test_rate_limits_are_retried_and_shrink_the_limit():
+    scheduler = _scheduler(initial=4, maximum=4)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _StatusError(429)
+        return "ok"
+
+    assert asyncio.run(scheduler.run("m", call)) == "ok"
+    assert len(attempts) == 3
+    assert scheduler.limiter("m").capacity == 2
+
+
+def test_persistent_failures_raise_instead_of_returning_nothing():
+    scheduler = _scheduler(max_retries=2)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        raise _StatusError(503)
+
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(scheduler.run("m", call))
+    assert len(attempts) == 3
+
+
+def test_other_errors_are_not_retried():
+    scheduler = _scheduler()
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.run_sync("m", call)
+    assert len(attempts) == 1
+    assert scheduler.limiter("m").in_flight == 0
+
+
+def test_stream_retries_only_before_first_item():
+    scheduler = _scheduler()
+    attempts = []
+
+    async def tokens():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise _StatusError(429)
+        yield "a"
+        yield "b"
+
+    async def collect():
+        return [token async for token in scheduler.stream("m", tokens)]
+
+    assert asyncio.run(collect()) == ["a", "b"]
+    assert len(attempts) == 2
+
+
+def test_chat_model_calls_go_through_the_scheduler():
+    responses = iter(
+        [
+            httpx.Response(429, headers={"retry-after": "0"}, json={"error": {}}),
+            httpx.Response(
+                200,
+                json={
+                    "id": "1",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": "test-model",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "hi"},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                },
+            ),
+        ]
+    )
+    llm = OpenRouterChatOpenAI(
+        api_key="sk-test",
+        base_url="https://llm.test/v1",
+        model="test-model",
+        max_retries=0,
+        http_async_client=httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: next(responses))
+        ),
+    )
+
+    with patch("app.services.llm_client.llm_scheduler", _scheduler()) as scheduler:
+        result = asyncio.run(llm.ainvoke("hello"))
+
+    assert result.content == "hi"
+    assert scheduler.limiter("test-model").capacity == 2
+
+
+def test_other_schedulers_do_not_replace_the_shared_gauges():
+    limiter = _scheduler(initial=1, maximum=1).limiter("private-model")
+    limiter.acquire_sync()
+    waiting = threading.Thread(target=limiter.acquire_sync)
+    waiting.start()
+    while not limiter.queued:
+        time.sleep(0.001)
+
+    try:
+        assert metrics.get("llm.scheduler.queued") == llm_scheduler.queued == 0
+        assert "llm.scheduler.private-model.queued" not in metrics.snapshot()
+    finally:
+        limiter.release()
+        waiting.join()
+
+
+def test_sync_chat_streams_go_through_the_scheduler():
+    chunk = {
+        "id": "1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "test-model",
+        "choices": [{"index": 0, "delta": {"content": "hi"}, "finish_reason": None}],
+    }
+    responses = iter(
+        [
+            httpx.Response(429, headers={"retry-after": "0"}, json={"error": {}}),
+            httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                content=f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n",
+            ),
+        ]
+    )
+    llm = OpenRouterChatOpenAI(
+        api_key="sk-test",
+        base_url="https://llm.test/v1",
+        model="test-model",
+        max_retries=0,
+        http_client=httpx.Client(
+            transport=httpx.MockTransport(lambda request: next(responses))
+        ),
+    )
+
+    with patch("app.services.llm_client.llm_scheduler", _scheduler()) as scheduler:
+        tokens = [c.content for c in llm.stream("hello")]
+
+    assert "".join(tokens) == "hi"
+    assert scheduler.limiter("test-model").capacity == 2
+    assert scheduler.first_item_latency("test-model").count == 1
+
+
+@patch("app.services.llm_client._chunk_budget", return_value=60)
+@patch("app.services.llm_client._process_chunk_async")
+def test_analysis_fails_loudly_but_keeps_finished_chunks(
+    mock_chunk, _budget, db_session
+):
+    def process(chunk, *args):
+        if "Merchant 20" in chunk:
+            raise LLMUnavailableError("model", "429", 5)
+        return [{"Description": chunk[:10]}]
+
+    mock_chunk.side_effect = process
+    text = "\n".join(f"2023-10-{day:02d} Merchant {day} 1.00" for day in range(1, 21))
+
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(
+            analyze_transactions(text, "key", "url", "model", "en", db=db_session)
+        )
+
+    assert db_session.query(ExtractionResult).count() == mock_chunk.call_count - 1
@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+
+from app.api import endpoints
+from app.models.transaction import MerchantCategory
+from app.models.transaction import Transaction as TransactionModel
+from app.schemas import TransactionUpdate
+from app.services.llm_client import CATEGORIES_EN, categorize_transactions
+from app.services.merchant_index import (
+    lookup_categories,
+    normalize_merchant,
+    rebuild_merchant_index,
+)
+from app.services.transaction_store import save_transactions
+
+
+def _item(description, category):
+    return {
+        "Date": "2023-10-01",
+        "Description": description,
+        "Amount": 10.0,
+        "Category": category,
+    }
+
+
+def test_normalize_merchant_drops_order_numbers_and_punctuation():
+    assert normalize_merchant("UBER *TRIP 8841 SHANGHAI") == "uber trip shanghai"
+    assert normalize_merchant("Uber Trip-2211 shanghai") == "uber trip shanghai"
+    assert normalize_merchant("美团外卖-订单123") == "美团外卖 订单"
+
+
+def test_saved_transactions_feed_the_index(db_session):
+    save_transactions(
+        db_session,
+        [
+            _item("STARBUCKS #101", "Food & Dining"),
+            _item("Starbucks #202", "Food & Dining"),
+            _item("MYSTERY SHOP", "Shopping"),
+            _item("VAGUE CHARGE 1", "Needs Review"),
+            _item("VAGUE CHARGE 2", "Needs Review"),
+        ],
+        "statement.pdf",
+    )
+
+    known = lookup_categories(
+        db_session, ["STARBUCKS #303", "MYSTERY SHOP", "VAGUE CHARGE 3"], CATEGORIES_EN
+    )
+
+    # One vote is not enough support; "Needs Review" is never learned
+    assert known == {"STARBUCKS #303": "Food & Dining"}
+
+
+def test_conflicting_votes_are_not_confident(db_session):
+    save_transactions(
+        db_session,
+        [_item("AMAZON", "Shopping")] * 3 + [_item("AMAZON", "Entertainment")] * 2,
+        "statement.pdf",
+    )
+
+    assert lookup_categories(db_session, ["AMAZON"], CATEGORIES_EN) == {}
+
+
+def test_user_correction_overrides_learned_category(db_session):
+    added = save_transactions(
+        db_session, [_item("NETFLIX.COM", "Shopping")] * 2, "statement.pdf"
+    ).inserted
+    assert lookup_categories(db_session, ["NETFLIX.COM"], CATEGORIES_EN) == {
+        "NETFLIX.COM": "Shopping"
+    }
+
+    endpoints.update_transaction(
+        added[0].id, TransactionUpdate(category="Entertainment"), db_session
+    )
+
+    assert lookup_categories(db_session, ["NETFLIX.COM"], CATEGORIES_EN) == {
+        "NETFLIX.COM": "Entertainment"
+    }
+
+
+def test_description_edit_is_not_a_correction(db_session):
+    added = save_transactions(
+        db_session, [_item("NETFLIX.COM", "Shopping")], "statement.pdf"
+    ).inserted
+
+    endpoints.update_transaction(
+        added[0].id, TransactionUpdate(description="HULU.COM"), db_session
+    )
+
+    weights = dict(
+        db_session.query(MerchantCategory.merchant_key, MerchantCategory.weight)
+    )
+    # The vote moves with the description; no correction weight is added
+    assert weights == {"netflix com": 0.0, "hulu com": 1.0}
+
+
+def test_rebuild_from_transactions_table(db_session):
+    db_session.add_all(
+        TransactionModel(
+            date=datetime(2023, 10, day),
+            description=f"DIDI RIDE {day}",
+            amount=20.0,
+            category="Transportation",
+        )
+        for day in (1, 2, 3)
+    )
+    db_session.commit()
+
+    rebuild_merchant_index(db_session)
+
+    assert lookup_categories(db_session, ["DIDI RIDE 9"], CATEGORIES_EN) == {
+        "DIDI RIDE 9": "Transportation"
+    }
+
+
+@patch("app.services.llm_client._categorize_batch_async")
+def test_only_unknown_merchants_reach_the_llm(mock_batch, db_session):
+    save_transactions(
+        db_session, [_item("STARBUCKS", "Food & Dining")] * 2, "statement.pdf"
+    )
+    mock_batch.return_value = ["Travel"]
+    rows = [_item("STARBUCKS", None), _item("HOTEL CHAIN", None)]
+
+    result = asyncio.run(
+        categorize_transactions(rows, "key", "url", "model", "en", db=db_session)
+    )
+
+    assert mock_batch.call_args.args[0] == ["HOTEL CHAIN"]
+    assert [row["Category"] for row in result] == ["Food & Dining", "Travel"]
@@ -0,0 +1,49 @@
+import io
+
+from app.core.config import config
+from app.services import pdf_processor
+from app.services.pdf_processor import extract_text_from_pdf
+
+
+def _statement_pages(count):
+    return [
+        [f"Page {n} header", f"2023-10-{n:02d} MERCHANT {n} {n}.00"]
+        for n in range(1, count + 1)
+    ]
+
+
+def test_parallel_extraction_preserves_page_order(make_pdf, monkeypatch):
+    pdf_bytes = make_pdf(_statement_pages(12))
+    monkeypatch.setattr(config, "pdf_parallel_min_pages", 2)
+
+    serial = extract_text_from_pdf(io.BytesIO(pdf_bytes), workers=1)
+    parallel = extract_text_from_pdf(io.BytesIO(pdf_bytes), workers=2, pages_per_task=5)
+
+    assert parallel == serial
+    positions = [parallel.index(f"MERCHANT {n} ") for n in range(1, 13)]
+    assert positions == sorted(positions)
+
+
+def test_small_pdf_stays_in_process(make_pdf, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("process pool should not be used")
+
+    monkeypatch.setattr(pdf_processor, "get_process_pool", fail)
+    text = extract_text_from_pdf(io.BytesIO(make_pdf(_statement_pages(1))), workers=4)
+
+    assert "MERCHANT 1" in text
+
+
+def test_process_pool_is_replaced_when_the_size_changes(monkeypatch):
+    monkeypatch.setattr(pdf_processor, "_process_pool", None)
+    monkeypatch.setattr(pdf_processor, "_process_pool_workers", None)
+
+    pools = [pdf_processor.get_process_pool(2)]
+    try:
+        assert pdf_processor.get_process_pool(2) is pools[0]
+        pools.append(pdf_processor.get_process_pool(3))
+        assert pools[1] is not pools[0]
+        assert pools[1]._max_workers == 3
+    finally:
+        for pool in pools:
+            pool.shutdown()
@@ -0,0 +1,28 @@
+from app.services.pii_filter import mask_line, scan_lines
+
+
+def test_masks_cards_before_phones():
+    masked, found = mask_line("Account: 4000-1234-5678-9010, call 555-0199-8888")
+
+    assert found
+    assert masked == "Account: [CC_REDACTED], call [PHONE_REDACTED]"
+
+
+def test_transaction_rows_are_not_flagged():
+    lines = [
+        "2023-10-01 2023-10-02 STARBUCKS 5.40",
+        "10/05 10/06 美团外卖 38.50 1234",
+        "Total 1000.00",
+    ]
+    masked, flags = scan_lines(lines)
+
+    assert masked == lines
+    assert flags == [False, False, False]
+
+
+def test_flags_neighbours_of_sensitive_lines():
+    lines = ["John Doe", "Statement", "Email: john@example.com", "a", "b", "c"]
+    masked, flags = scan_lines(lines, context_lines=2)
+
+    assert masked[2] == "Email: [EMAIL_REDACTED]"
+    assert flags == [True, True, True, True, True, False]
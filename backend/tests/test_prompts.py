@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+import httpx
+
+from app.core.metrics import metrics
+from app.services.llm_client import (
+    CATEGORIES,
+    CATEGORIES_EN,
+    _process_chunk_async,
+    llm_registry,
+)
+from app.services.prompts import build_extraction_messages, record_prompt_usage
+
+
+def test_extraction_prefix_is_identical_across_chunks_and_years():
+    first = build_extraction_messages("chunk one", CATEGORIES, "openai/gpt-4o", 2024)
+    second = build_extraction_messages("chunk two", CATEGORIES, "openai/gpt-4o", 2025)
+
+    assert first[0].content == second[0].content
+    assert "2024" not in first[0].content
+    assert first[1].content.endswith("chunk one")
+    assert "2025" in second[1].content
+
+
+def test_cache_control_only_for_models_that_need_it():
+    plain = build_extraction_messages("text", CATEGORIES_EN, "openai/gpt-4o", 2024)
+    marked = build_extraction_messages(
+        "text", CATEGORIES_EN, "anthropic/claude-3.5-sonnet", 2024
+    )
+
+    assert isinstance(plain[0].content, str)
+    assert marked[0].content == [
+        {
+            "type": "text",
+            "text": plain[0].content,
+            "cache_control": {"type": "ephemeral"},
+        }
+    ]
+
+
+def test_cached_prompt_ratio_is_recorded():
+    before = metrics.get("llm.prompt_tokens"), metrics.get("llm.cached_prompt_tokens")
+
+    record_prompt_usage(
+        {"input_tokens": 1000, "output_tokens": 10, "input_token_details": {}}
+    )
+    record_prompt_usage(
+        {
+            "input_tokens": 1000,
+            "output_tokens": 10,
+            "input_token_details": {"cache_read": 800},
+        }
+    )
+
+    assert metrics.get("llm.prompt_tokens") - before[0] == 2000
+    assert metrics.get("llm.cached_prompt_tokens") - before[1] == 800
+    assert 0 < metrics.snapshot()["llm.cached_prompt_ratio"] <= 1
+
+
+def test_extraction_request_puts_the_chunk_last_and_reads_usage(monkeypatch):
+    rows = [{"Date": "2024-10-01", "Description": "Shop", "Amount": 5.0}]
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        events = [
+            {"choices": [{"index": 0, "delta": {"content": json.dumps(rows)}}]},
+            {
+                "choices": [],
+                "usage": {
+                    "prompt_tokens": 500,
+                    "completion_tokens": 20,
+                    "total_tokens": 520,
+                    "prompt_tokens_details": {"cached_tokens": 400},
+                },
+            },
+        ]
+        body = "".join(
+            f"data: {json.dumps({'id': '1', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'm', **event})}\n\n"
+            for event in events
+        )
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            text=body + "data: [DONE]\n\n",
+        )
+
+    monkeypatch.setattr(
+        llm_registry,
+        "_http_clients",
+        lambda loop: (None, httpx.AsyncClient(transport=httpx.MockTransport(handler))),
+    )
+    llm_registry.invalidate()
+    cached_before = metrics.get("llm.cached_prompt_tokens")
+
+    result = asyncio.run(
+        _process_chunk_async(
+            "statement",
+            "sk-test",
+            "https://llm.test/v1",
+            "anthropic/claude-3.5-sonnet",
+            "en",
+        )
+    )
+    llm_registry.invalidate()
+
+    assert result == rows
+    system, user = requests[0]["messages"]
+    assert system["content"][0]["cache_control"] == {"type": "ephemeral"}
+    assert user["content"].endswith("statement")
+    assert requests[0]["stream_options"] == {"include_usage": True}
+    assert metrics.get("llm.cached_prompt_tokens") - cached_before == 400
@@ -0,0 +1,91 @@
+import asyncio
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.api import endpoints
+from app.core.database import create_async_db_engine, create_db_engine
+from app.models.transaction import Base, Settings
+from app.schemas import SettingsUpdate
+from app.services.settings_store import VERSION_KEY, SettingsStore
+
+
+def _count_statements(engine):
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    return statements
+
+
+def test_reads_are_served_from_the_snapshot(db_session):
+    store = SettingsStore(refresh_interval=60)
+    store.update(db_session, {"api_key": "sk-test", "model_name": "m"})
+    statements = _count_statements(db_session.get_bind())
+
+    for _ in range(5):
+        assert store.get(db_session, "api_key") == "sk-test"
+        assert store.get(db_session, "base_url", "default") == "default"
+
+    assert statements == []
+    assert VERSION_KEY not in store.snapshot(db_session)
+
+
+def test_update_writes_every_key_in_one_statement(db_session):
+    store = SettingsStore(refresh_interval=60)
+    db_session.add(Settings(key="base_url", value="https://old"))
+    db_session.commit()
+    statements = _count_statements(db_session.get_bind())
+
+    store.update(db_session, {"api_key": "sk-new", "base_url": "https://new"})
+
+    writes = [s for s in statements if s.startswith("INSERT")]
+    assert len(writes) == 1
+    assert db_session.get(Settings, "base_url").value == "https://new"
+    assert store.get(db_session, "api_key") == "sk-new"
+
+
+def test_other_workers_reload_after_a_write(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # Two processes' stores, sharing the database
+    writer, reader = SettingsStore(refresh_interval=60), SettingsStore(0)
+    with Session() as db:
+        writer.update(db, {"model_name": "old"})
+        assert reader.get(db, "model_name") == "old"
+
+        writer.update(db, {"model_name": "new"})
+
+        assert reader.get(db, "model_name") == "new"
+
+    async def read_async():
+        async_engine = create_async_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+        try:
+            async with async_sessionmaker(async_engine)() as db:
+                return await reader.get_async(db, "model_name")
+        finally:
+            await async_engine.dispose()
+
+    with Session() as db:
+        writer.update(db, {"model_name": "newer"})
+    assert asyncio.run(read_async()) == "newer"
+    engine.dispose()
+
+
+def test_settings_endpoints_round_trip(db_session):
+    endpoints.update_settings(
+        SettingsUpdate(api_key="sk-test", monthly_income=5000), db_session
+    )
+    endpoints.update_settings(SettingsUpdate(model_name="m"), db_session)
+
+    assert endpoints.get_settings(db_session) == {
+        "api_key": "sk-test",
+        "base_url": "",
+        "model_name": "m",
+        "monthly_income": "5000.0",
+        "investments": "",
+    }
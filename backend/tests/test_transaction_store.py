@@ -0,0 +1,391 @@
+from collections import Counter
+from datetime import date, datetime
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine, event, select, text, update
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import endpoints
+from app.models.transaction import Base
+from app.models.transaction import Transaction as TransactionModel
+from app.schemas import TransactionCreate
+from app.services.transaction_store import (
+    TransactionFilters,
+    ensure_natural_keys,
+    ensure_search_index,
+    list_transactions,
+    save_transactions,
+)
+
+
+def _item(
+    description, amount=10.0, date="2023-10-01", card="1234", category="Shopping"
+):
+    return {
+        "Date": date,
+        "Description": description,
+        "Amount": amount,
+        "Category": category,
+        "CardLastFour": card,
+    }
+
+
+def test_reimported_transactions_are_skipped(db_session):
+    first = save_transactions(
+        db_session, [_item("Coffee Shop"), _item("Taxi", 25.0)], "jan.pdf"
+    )
+    # The next statement overlaps the first one by a transaction
+    second = save_transactions(
+        db_session, [_item("  coffee   SHOP "), _item("Bakery", 5.0)], "feb.pdf"
+    )
+
+    assert [t.description for t in first.inserted] == ["Coffee Shop", "Taxi"]
+    assert all(t.id for t in first.inserted)
+    assert [t.description for t in second.inserted] == ["Bakery"]
+    assert second.duplicates == 1
+    assert db_session.query(TransactionModel).count() == 3
+
+
+def test_repeated_purchases_in_one_statement_are_kept(db_session):
+    first = save_transactions(db_session, [_item("Coffee")] * 2, "jan.pdf")
+    again = save_transactions(db_session, [_item("Coffee")] * 3, "jan.pdf")
+
+    assert (len(first.inserted), first.duplicates) == (2, 0)
+    assert (len(again.inserted), again.duplicates) == (1, 2)
+
+
+def test_other_card_or_date_is_not_a_duplicate(db_session):
+    save_transactions(db_session, [_item("Coffee", card=None)], "jan.pdf")
+
+    saved = save_transactions(
+        db_session,
+        [
+            _item("Coffee", card=None),
+            _item("Coffee", card="9999"),
+            _item("Coffee", card=None, date="2023-10-02"),
+        ],
+        "feb.pdf",
+    )
+
+    assert (len(saved.inserted), saved.duplicates) == (2, 1)
+
+
+def test_manual_copy_of_an_imported_row_is_allowed(db_session):
+    save_transactions(db_session, [_item("Coffee", card=None)], "jan.pdf")
+
+    created = endpoints.create_transaction(
+        TransactionCreate(
+            date=datetime(2023, 10, 1),
+            description="Coffee",
+            amount=10.0,
+            category="Shopping",
+        ),
+        db_session,
+    )
+
+    assert created.occurrence == 2
+    assert db_session.query(TransactionModel).count() == 2
+
+
+def test_existing_database_is_upgraded():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE transactions (id INTEGER PRIMARY KEY, date DATETIME, "
+                "description VARCHAR, amount FLOAT, category VARCHAR, "
+                "source VARCHAR, card_last_four VARCHAR, raw_text VARCHAR)"
+            )
+        )
+        for _ in range(2):
+            conn.execute(
+                text(
+                    "INSERT INTO transactions (date, description, amount, category,"
+                    " source, card_last_four) VALUES ('2023-10-01 00:00:00.000000',"
+                    " 'Coffee', 10.0, 'Shopping', 'old.pdf', '1234')"
+                )
+            )
+    # As init_db() does: only the missing tables are created
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        ensure_natural_keys(db)
+        ensure_natural_keys(db)
+
+        saved = save_transactions(db, [_item("Coffee")] * 3, "new.pdf")
+
+        assert (len(saved.inserted), saved.duplicates) == (1, 2)
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def test_reimported_undated_transactions_are_skipped(db_session):
+    undated = [_item("Coffee", date="not a date"), _item("Coffee", date=None)]
+    save_transactions(db_session, undated, "a.pdf")
+
+    again = save_transactions(db_session, undated, "a.pdf")
+
+    assert (len(again.inserted), again.duplicates) == (0, 2)
+    assert db_session.query(TransactionModel).count() == 2
+
+
+def test_natural_key_index_of_raw_dates_is_rebuilt():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # The index as first shipped, and the undated duplicates it let in
+        conn.execute(text("DROP INDEX uq_transactions_natural_key"))
+        conn.execute(
+            text(
+                "CREATE UNIQUE INDEX uq_transactions_natural_key ON transactions "
+                "(date, amount, description_key, coalesce(card_last_four, ''), "
+                "occurrence)"
+            )
+        )
+        for _ in range(2):
+            conn.execute(
+                text(
+                    "INSERT INTO transactions (description, amount, "
+                    "description_key, occurrence) VALUES ('Coffee', 10.0, "
+                    "'coffee', 1)"
+                )
+            )
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        ensure_natural_keys(db)
+
+        occurrences = db.scalars(
+            select(TransactionModel.occurrence).order_by(TransactionModel.id)
+        ).all()
+        assert occurrences == [1, 2]
+        saved = save_transactions(
+            db, [_item("Coffee", date=None, card=None)], "new.pdf"
+        )
+        assert saved.duplicates == 1
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def _page_through(db_session, limit):
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = list_transactions(db_session, limit, cursor=cursor)
+        seen.extend(page)
+        if cursor is None:
+            return seen
+
+
+def test_cursor_pages_cover_every_transaction_once(db_session):
+    items = [_item(f"Shop {i}", date=f"2023-10-0{i % 3 + 1}") for i in range(10)]
+    items.append(_item("Undated"))
+    save_transactions(db_session, items, "s.pdf")
+    db_session.execute(
+        update(TransactionModel)
+        .where(TransactionModel.description == "Undated")
+        .values(date=None)
+    )
+    expected = db_session.scalars(
+        select(TransactionModel).order_by(
+            TransactionModel.date.desc(), TransactionModel.id.desc()
+        )
+    ).all()
+
+    for limit in (1, 3, 4, 11, 50):
+        assert [t.id for t in _page_through(db_session, limit)] == [
+            t.id for t in expected
+        ]
+    assert expected[-1].description == "Undated"
+
+
+def test_endpoint_returns_next_cursor_header(db_session):
+    save_transactions(db_session, [_item(f"Shop {i}") for i in range(3)], "s.pdf")
+    response = Response()
+
+    first = endpoints.read_transactions(response, limit=2, db=db_session)
+    rest = endpoints.read_transactions(
+        Response(), limit=2, cursor=response.headers["X-Next-Cursor"], db=db_session
+    )
+
+    assert len(first) == 2
+    assert [t.description for t in rest] == ["Shop 0"]
+    with pytest.raises(HTTPException) as error:
+        endpoints.read_transactions(Response(), cursor="garbage", db=db_session)
+    assert error.value.status_code == 400
+
+
+def test_cursor_page_seeks_the_date_index(db_session):
+    save_transactions(db_session, [_item("Shop")], "s.pdf")
+    _, cursor = list_transactions(db_session, 1)
+    engine = db_session.get_bind()
+    sent = []
+
+    def capture(conn, dbapi_cursor, statement, parameters, context, executemany):
+        sent.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        list_transactions(db_session, 50, cursor=cursor)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    # The first statement is the seek past the cursor's (date, id)
+    statement, parameters = sent[0]
+    assert "(transactions.date, transactions.id) <" in statement
+    plan = " ".join(
+        row[-1]
+        for row in db_session.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        )
+    )
+
+    assert "SEARCH transactions USING INDEX ix_transactions_date_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def _descriptions(db_session, **filters):
+    transactions, _ = list_transactions(
+        db_session, 50, filters=TransactionFilters(**filters)
+    )
+    return sorted(t.description for t in transactions)
+
+
+def test_filters_combine(db_session):
+    save_transactions(
+        db_session,
+        [
+            _item("Coffee", 4.5, "2023-10-01", category="Dining"),
+            _item("Dinner", 80.0, "2023-10-31 21:00", category="Dining"),
+            _item("Taxi", 25.0, "2023-11-01", card="9999", category="Transport"),
+        ],
+        "oct.pdf",
+    )
+    save_transactions(db_session, [_item("Book", 30.0, "2023-10-15")], "manual")
+
+    assert _descriptions(db_session, category="Dining") == ["Coffee", "Dinner"]
+    assert _descriptions(db_session, card_last_four="9999") == ["Taxi"]
+    assert _descriptions(db_session, source="manual") == ["Book"]
+    # date_to includes the whole day
+    assert _descriptions(
+        db_session, date_from=date(2023, 10, 15), date_to=date(2023, 10, 31)
+    ) == ["Book", "Dinner"]
+    assert _descriptions(db_session, amount_min=25, amount_max=30) == ["Book", "Taxi"]
+    assert _descriptions(db_session, category="Dining", amount_max=10) == ["Coffee"]
+
+
+def test_search_index_follows_inserts_updates_and_deletes(db_session):
+    save_transactions(
+        db_session,
+        [_item("STARBUCKS Coffee #12"), _item("美团外卖 订单"), _item("Uber Trip")],
+        "s.pdf",
+    )
+
+    assert _descriptions(db_session, search="starbucks") == ["STARBUCKS Coffee #12"]
+    assert _descriptions(db_session, search="美团外卖") == ["美团外卖 订单"]
+    # Every word must match; words too short for the index use LIKE
+    assert _descriptions(db_session, search="coffee #12") == ["STARBUCKS Coffee #12"]
+    assert _descriptions(db_session, search="coffee trip") == []
+    assert _descriptions(db_session, search='"50%_') == []
+
+    taxi = db_session.scalar(
+        select(TransactionModel).where(TransactionModel.description == "Uber Trip")
+    )
+    taxi.description = "Lyft Ride"
+    db_session.commit()
+    assert _descriptions(db_session, search="uber") == []
+    assert _descriptions(db_session, search="lyft") == ["Lyft Ride"]
+
+    db_session.delete(taxi)
+    db_session.commit()
+    assert _descriptions(db_session, search="lyft") == []
+    # Raises if the index no longer matches the transactions table
+    db_session.execute(
+        text(
+            "INSERT INTO transactions_fts(transactions_fts) VALUES ('integrity-check')"
+        )
+    )
+
+
+def test_endpoint_filters_and_searches(db_session):
+    save_transactions(
+        db_session,
+        [_item(f"Shop {i}", category="Dining") for i in range(3)]
+        + [_item("Shop Taxi", category="Transport")],
+        "s.pdf",
+    )
+
+    found = endpoints.read_transactions(
+        Response(), limit=2, category="Dining", q="shop", db=db_session
+    )
+
+    assert [t.description for t in found] == ["Shop 2", "Shop 1"]
+
+
+def test_two_character_terms_are_matched_without_the_index(db_session):
+    save_transactions(
+        db_session,
+        [_item("美团外卖 订单"), _item("饿了么外卖"), _item("星巴克咖啡")],
+        "s.pdf",
+    )
+
+    # Two CJK characters (one word) are below the trigram length: LIKE scan
+    assert _descriptions(db_session, search="外卖") == ["美团外卖 订单", "饿了么外卖"]
+    assert _descriptions(db_session, search="咖啡") == ["星巴克咖啡"]
+    # With a longer term the scan only covers the rows the index matched
+    assert _descriptions(db_session, search="外卖 美团外卖") == ["美团外卖 订单"]
+
+
+def test_search_index_is_built_for_existing_rows():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        save_transactions(db, [_item("Coffee Shop")], "old.pdf")
+        # As if the database predated the search index
+        for trigger in ("insert", "delete", "update"):
+            db.execute(text(f"DROP TRIGGER transactions_fts_{trigger}"))
+        db.execute(text("DROP TABLE transactions_fts"))
+        db.commit()
+
+        ensure_search_index(db)
+        ensure_search_index(db)
+        save_transactions(db, [_item("Coffee Bar")], "new.pdf")
+
+        assert _descriptions(db, search="coffee") == ["Coffee Bar", "Coffee Shop"]
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def test_one_statement_saved_in_batches_keeps_repeated_purchases(db_session):
+    # The same coffee twice, arriving in different stream batches
+    occurrences = Counter()
+    first = save_transactions(
+        db_session, [_item("Coffee")], "jan.pdf", occurrences=occurrences
+    )
+    second = save_transactions(
+        db_session, [_item("Coffee")], "jan.pdf", occurrences=occurrences
+    )
+
+    # Importing the statement again, also in two batches
+    occurrences = Counter()
+    again = [
+        save_transactions(
+            db_session, [_item("Coffee")], "jan.pdf", occurrences=occurrences
+        )
+        for _ in range(2)
+    ]
+
+    assert (len(first.inserted), len(second.inserted)) == (1, 1)
+    assert [saved.duplicates for saved in again] == [1, 1]
+    assert db_session.query(TransactionModel).count() == 2
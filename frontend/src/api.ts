@@ -10,7 +10,7 @@ const api = axios.create({
 
 export interface Transaction {
   id: number;
-  date: string;
+  date: string | null; // null when the statement date didn't parse
   description: string;
   amount: number;
   category: string;
@@ -18,7 +18,7 @@ export interface Transaction {
   card_last_four?: string;
 }
 
-export type TransactionCreate = Omit<Transaction, 'id'>;
+export type TransactionCreate = Omit<Transaction, 'id' | 'date'> & { date: string };
 
 export interface Settings {
   api_key: string;
@@ -34,9 +34,51 @@ export interface ParseResult {
   message: string;
 }
 
-export const getTransactions = async () => {
-  const response = await api.get<Transaction[]>('/transactions');
-  return response.data;
+// Server-side filters of GET /transactions; dates are YYYY-MM-DD and both
+// ends of a range are inclusive. q searches the description.
+export interface TransactionFilters {
+  category?: string;
+  card?: string;
+  source?: string;
+  date_from?: string;
+  date_to?: string;
+  amount_min?: number;
+  amount_max?: number;
+  q?: string;
+}
+
+export interface TransactionPage {
+  transactions: Transaction[];
+  // Pass back as `cursor` for the next page; null on the last page
+  nextCursor: string | null;
+}
+
+// One page of transactions, newest first
+export const getTransactions = async (
+  filters: TransactionFilters = {},
+  cursor?: string,
+  limit = 200,
+): Promise<TransactionPage> => {
+  const response = await api.get<Transaction[]>('/transactions', {
+    params: { ...filters, cursor, limit },
+  });
+  const next = response.headers['x-next-cursor'];
+  return {
+    transactions: response.data,
+    nextCursor: typeof next === 'string' ? next : null,
+  };
+};
+
+// Every transaction matching the filters, following the cursor to the end
+export const getAllTransactions = async (filters: TransactionFilters = {}) => {
+  const all: Transaction[] = [];
+  let cursor: string | undefined;
+  do {
+    const page = await getTransactions(filters, cursor);
+    all.push(...page.transactions);
+    cursor = page.nextCursor ?? undefined;
+  } while (cursor);
+  return all;
 };
 
 export const createTransaction = async (data: TransactionCreate) => {
@@ -71,12 +113,106 @@ export const parsePdf = async (file: File) => {
   return response.data;
 };
 
+export interface ParsedPage {
+  page: number;
+  text: string;
+}
+
+// Step 1 (streaming) - pages arrive as NDJSON records while the PDF is still being processed
+export const parsePdfStream = async (file: File, onPage: (page: ParsedPage) => void) => {
+  const formData = new FormData();
+  formData.append('file', file);
+  const response = await fetch('/api/parse_pdf/stream', { method: 'POST', body: formData });
+  const reader = response.body?.getReader();
+  if (!response.ok || !reader) {
+    throw new Error(`PDF parsing failed (${response.status})`);
+  }
+
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let filename = file.name;
+  while (true) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value, { stream: !done });
+    const lines = buffer.split('\n');
+    buffer = done ? '' : lines.pop() ?? '';
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const record = JSON.parse(line);
+      if (record.error) throw new Error(record.error);
+      if (record.done) {
+        filename = record.filename;
+      } else {
+        onPage(record as ParsedPage);
+      }
+    }
+    if (done) break;
+  }
+  return { filename };
+};
+
 // New: Step 2 - Analyze Text
 export const analyzeText = async (text: string, source_filename: string, language: string = 'zh') => {
-  const response = await api.post<{ message: string, transactions_added: number, transactions: Transaction[] }>('/analyze_text', { text, source_filename, language });
+  const response = await api.post<{ message: string, transactions_added: number, duplicates_skipped: number, transactions: Transaction[] }>('/analyze_text', { text, source_filename, language });
   return response.data;
 };
 
+export interface AnalyzedChunk {
+  chunk: number;
+  chunks: number;
+  transactions_added?: number;
+  duplicates_skipped?: number;
+  transactions?: Transaction[];
+  error?: string;
+}
+
+// Step 2 (streaming) - each chunk's transactions are saved and arrive as soon as it is analyzed
+export const analyzeTextStream = async (
+  text: string,
+  source_filename: string,
+  language: string,
+  onChunk: (chunk: AnalyzedChunk) => void,
+) => {
+  const response = await fetch('/api/analyze_text/stream', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ text, source_filename, language }),
+  });
+  const reader = response.body?.getReader();
+  if (!response.ok || !reader) {
+    let detail = `Analysis failed (${response.status})`;
+    try {
+      detail = (await response.json()).detail ?? detail;
+    } catch {
+      // Not a JSON error body
+    }
+    throw new Error(detail);
+  }
+
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let summary = { chunks: 0, failed_chunks: 0, transactions_added: 0, duplicates_skipped: 0 };
+  while (true) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value, { stream: !done });
+    const lines = buffer.split('\n');
+    buffer = done ? '' : lines.pop() ?? '';
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const record = JSON.parse(line);
+      if (record.done) {
+        summary = record;
+      } else if (record.chunk === undefined) {
+        throw new Error(record.error);
+      } else {
+        onChunk(record as AnalyzedChunk);
+      }
+    }
+    if (done) break;
+  }
+  return summary;
+};
+
 // Deprecated: Old direct upload
 export const uploadPdf = async (file: File) => {
   // This endpoint no longer exists in backend as-is, mapping to parsePdf for compatibility or removal
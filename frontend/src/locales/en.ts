@@ -58,6 +58,12 @@ export const en = {
             delete: 'Delete',
             edit: 'Edit',
             save: 'Save',
+            load_more: 'Load More',
+        },
+        filters: {
+            all_categories: 'All Categories',
+            date_from: 'From',
+            date_to: 'To',
         },
         dialogs: {
             privacy_title: 'Privacy Review',
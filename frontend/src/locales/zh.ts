@@ -58,6 +58,12 @@ export const zh = {
             delete: '删除',
             edit: '编辑',
             save: '保存',
+            load_more: '加载更多',
+        },
+        filters: {
+            all_categories: '全部分类',
+            date_from: '开始日期',
+            date_to: '结束日期',
         },
         dialogs: {
             privacy_title: '隐私审查',
@@ -9,7 +9,7 @@ import Grid from '@mui/material/Grid';
 import { BarChart } from '@mui/x-charts/BarChart';
 import { PieChart } from '@mui/x-charts/PieChart';
 import { TrendingUp, AccountBalance } from '@mui/icons-material';
-import { getStats, getTransactions } from '../api';
+import { getStats, getAllTransactions } from '../api';
 import type { Transaction } from '../api';
 import { colors } from '../theme';
 import { useLanguage } from '../contexts/LanguageContext';
@@ -77,9 +77,7 @@ export default function Dashboard() {
         setOpenDialog(true);
         setLoadingDetails(true);
         try {
-            const allTx = await getTransactions();
-            const filtered = allTx.filter(t => t.category === category);
-            setCategoryTransactions(filtered);
+            setCategoryTransactions(await getAllTransactions({ category }));
         } catch (error) {
             console.error(error);
         } finally {
@@ -377,7 +375,7 @@ export default function Dashboard() {
                                                 transition: 'background-color 150ms ease-in-out',
                                             }}
                                         >
-                                            <TableCell>{new Date(tx.date).toLocaleDateString('zh-CN')}</TableCell>
+                                            <TableCell>{tx.date ? new Date(tx.date).toLocaleDateString('zh-CN') : ''}</TableCell>
                                             <TableCell>{tx.description}</TableCell>
                                             <TableCell align="right" sx={{ fontWeight: 600, color: 'error.main' }}>
                                                 ¥{tx.amount.toFixed(2)}
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useCallback, useEffect, useState } from 'react';
 import {
     Box, Button, Typography, Paper, Table, TableBody, TableCell,
     TableContainer, TableHead, TableRow, CircularProgress, Alert,
@@ -9,8 +9,8 @@ import { DataGrid } from '@mui/x-data-grid';
 import type { GridRenderCellParams } from '@mui/x-data-grid';
 import type { SelectChangeEvent } from '@mui/material';
 import { CloudUpload, FileDownload, Delete, Add, Receipt, Edit } from '@mui/icons-material';
-import { getTransactions, parsePdf, analyzeText, updateTransaction, clearAllTransactions, createTransaction, deleteTransaction } from '../api';
-import type { Transaction, TransactionCreate } from '../api';
+import { getTransactions, parsePdfStream, analyzeTextStream, updateTransaction, clearAllTransactions, createTransaction, deleteTransaction } from '../api';
+import type { Transaction, TransactionCreate, TransactionFilters } from '../api';
 import { colors } from '../theme';
 import { isAxiosError } from 'axios';
 import { useLanguage } from '../contexts/LanguageContext';
@@ -78,12 +78,34 @@ export default function Transactions() {
         source: 'manual'
     });
 
+    // Filtering and search run on the server; the grid only sorts and pages
+    // through the rows loaded so far
+    const [filters, setFilters] = useState<TransactionFilters>({});
+    const [searchText, setSearchText] = useState('');
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+
+    const loadTransactions = useCallback(async () => {
+        const page = await getTransactions(filters);
+        setTransactions(page.transactions);
+        setNextCursor(page.nextCursor);
+    }, [filters]);
+
+    const updateFilter = (key: keyof TransactionFilters, value: string) => {
+        setFilters(prev => ({ ...prev, [key]: value || undefined }));
+    };
+
+    useEffect(() => {
+        // Wait for a pause in typing before searching
+        const q = searchText.trim() || undefined;
+        const timer = setTimeout(() => setFilters(prev => (prev.q === q ? prev : { ...prev, q })), 300);
+        return () => clearTimeout(timer);
+    }, [searchText]);
+
     useEffect(() => {
         const fetchTransactions = async () => {
             setLoading(true);
             try {
-                const data = await getTransactions();
-                setTransactions(data);
+                await loadTransactions();
             } catch (error) {
                 console.error(error);
                 setErrorMsg(t('transactions.errors.load'));
@@ -92,14 +114,28 @@ export default function Transactions() {
             }
         };
         fetchTransactions();
-    }, [t]);
+    }, [loadTransactions, t]);
+
+    const handleLoadMore = async () => {
+        if (!nextCursor) return;
+        setLoading(true);
+        try {
+            const page = await getTransactions(filters, nextCursor);
+            setTransactions(prev => [...prev, ...page.transactions]);
+            setNextCursor(page.nextCursor);
+        } catch (error) {
+            console.error(error);
+            setErrorMsg(t('transactions.errors.load'));
+        } finally {
+            setLoading(false);
+        }
+    };
 
     const handleClearAll = async () => {
         try {
             await clearAllTransactions();
             setClearConfirmOpen(false);
-            const data = await getTransactions();
-            setTransactions(data);
+            await loadTransactions();
         } catch (error) {
             console.error(error);
             setErrorMsg(t('transactions.errors.clear'));
@@ -115,8 +151,7 @@ export default function Transactions() {
             }
             setAddDialogOpen(false);
             resetForm();
-            const data = await getTransactions();
-            setTransactions(data);
+            await loadTransactions();
         } catch (error) {
             console.error(error);
             setErrorMsg(editMode ? t('transactions.errors.update') : t('transactions.errors.add'));
@@ -141,8 +176,7 @@ export default function Transactions() {
             await deleteTransaction(transactionToDelete);
             setDeleteConfirmOpen(false);
             setTransactionToDelete(null);
-            const data = await getTransactions();
-            setTransactions(data);
+            await loadTransactions();
         } catch (error) {
             console.error(error);
             setErrorMsg(t('transactions.errors.delete'));
@@ -154,8 +188,13 @@ export default function Transactions() {
             setUploading(true);
             setErrorMsg(null);
             try {
-                const result = await parsePdf(event.target.files[0]);
-                setReviewText(result.text);
+                const file = event.target.files[0];
+                setReviewText('');
+                setCurrentFilename(file.name);
+                const result = await parsePdfStream(file, (page) => {
+                    setReviewText(prev => prev + page.text);
+                    setReviewOpen(true);
+                });
                 setCurrentFilename(result.filename);
                 setReviewOpen(true);
             } catch (error) {
@@ -171,18 +210,25 @@ export default function Transactions() {
     const handleConfirmAnalysis = async () => {
         setAnalyzing(true);
         try {
-            const response = await analyzeText(reviewText, currentFilename, language);
-            setReviewOpen(false);
-            const data = await getTransactions();
-            setTransactions(data);
-
-            if (response.transactions) {
-                const reviewKey = language === 'en' ? "Needs Review" : "需要复核";
-                const needingReview = response.transactions.filter(t => t.category === reviewKey);
-                if (needingReview.length > 0) {
-                    setReviewTransactions(needingReview);
-                    setNeedsReviewOpen(true);
+            const added: Transaction[] = [];
+            const summary = await analyzeTextStream(reviewText, currentFilename, language, (chunk) => {
+                if (chunk.transactions) {
+                    added.push(...chunk.transactions);
+                    // Show each chunk's transactions as soon as they are saved
+                    setTransactions(prev => [...prev, ...chunk.transactions!]);
                 }
+            });
+            setReviewOpen(false);
+            await loadTransactions();
+
+            const reviewKey = language === 'en' ? "Needs Review" : "需要复核";
+            const needingReview = added.filter(t => t.category === reviewKey);
+            if (needingReview.length > 0) {
+                setReviewTransactions(needingReview);
+                setNeedsReviewOpen(true);
+            }
+            if (summary.failed_chunks > 0) {
+                setErrorMsg(t('transactions.errors.analyze'));
             }
         } catch (error) {
             console.error(error);
@@ -207,8 +253,7 @@ export default function Transactions() {
         } catch (error) {
             console.error("Failed to update category", error);
             setErrorMsg(t('transactions.errors.update_cat'));
-            const data = await getTransactions();
-            setTransactions(data);
+            await loadTransactions();
         }
     };
 
@@ -219,7 +264,7 @@ export default function Transactions() {
         const csvRows = [
             headers.join(','),
             ...transactions.map(row => {
-                const date = new Date(row.date).toISOString().split('T')[0];
+                const date = row.date ? new Date(row.date).toISOString().split('T')[0] : '';
                 const desc = `"${row.description.replace(/"/g, '""')}"`;
                 return [row.id, date, desc, row.amount, row.category, row.card_last_four || '', row.source].join(',');
             })
@@ -256,7 +301,7 @@ export default function Transactions() {
         const transaction = transactions.find(t => t.id === contextMenu?.rowId);
         if (transaction) {
             setNewTransaction({
-                date: new Date(transaction.date).toISOString().split('T')[0],
+                date: transaction.date ? new Date(transaction.date).toISOString().split('T')[0] : '',
                 description: transaction.description,
                 amount: transaction.amount,
                 category: transaction.category,
@@ -336,6 +381,45 @@ export default function Transactions() {
                 </Alert>
             )}
 
+            {/* Filters */}
+            <Box sx={{ display: 'flex', gap: 1.5, flexWrap: 'wrap', mb: 2 }}>
+                <TextField
+                    size="small"
+                    placeholder={t('transactions.search')}
+                    value={searchText}
+                    onChange={(e) => setSearchText(e.target.value)}
+                    sx={{ flex: 1, minWidth: 220 }}
+                />
+                <Select
+                    size="small"
+                    displayEmpty
+                    value={filters.category ?? ''}
+                    onChange={(e) => updateFilter('category', e.target.value)}
+                    sx={{ minWidth: 160 }}
+                >
+                    <MenuItem value="">{t('transactions.filters.all_categories')}</MenuItem>
+                    {categories.map(cat => (
+                        <MenuItem key={cat} value={cat}>{cat}</MenuItem>
+                    ))}
+                </Select>
+                <TextField
+                    size="small"
+                    type="date"
+                    label={t('transactions.filters.date_from')}
+                    InputLabelProps={{ shrink: true }}
+                    value={filters.date_from ?? ''}
+                    onChange={(e) => updateFilter('date_from', e.target.value)}
+                />
+                <TextField
+                    size="small"
+                    type="date"
+                    label={t('transactions.filters.date_to')}
+                    InputLabelProps={{ shrink: true }}
+                    value={filters.date_to ?? ''}
+                    onChange={(e) => updateFilter('date_to', e.target.value)}
+                />
+            </Box>
+
             {/* Data Grid */}
             <Paper
                 elevation={0}
@@ -354,7 +438,7 @@ export default function Transactions() {
                             field: 'date',
                             headerName: t('transactions.table.date'),
                             width: 120,
-                            valueGetter: (_value, row) => new Date(row.date),
+                            valueGetter: (_value, row) => row.date ? new Date(row.date) : null,
                             valueFormatter: (value: Date) => value ? value.toLocaleDateString('zh-CN') : ''
                         },
                         {
@@ -429,6 +513,14 @@ export default function Transactions() {
                 />
             </Paper>
 
+            {nextCursor && (
+                <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+                    <Button variant="outlined" onClick={handleLoadMore} disabled={loading} sx={{ cursor: 'pointer' }}>
+                        {t('transactions.actions.load_more')}
+                    </Button>
+                </Box>
+            )}
+
             <Menu
                 open={contextMenu !== null}
                 onClose={handleCloseContextMenu}
@@ -473,7 +565,7 @@ export default function Transactions() {
                     <Button
                         onClick={handleConfirmAnalysis}
                         variant="contained"
-                        disabled={analyzing}
+                        disabled={analyzing || uploading}
                         startIcon={analyzing && <CircularProgress size={20} color="inherit" />}
                         sx={{ cursor: 'pointer' }}
                     >
@@ -526,7 +618,7 @@ export default function Transactions() {
                             <TableBody>
                                 {reviewTransactions.map((row) => (
                                     <TableRow key={row.id} sx={{ '&:hover': { backgroundColor: 'action.hover' } }}>
-                                        <TableCell>{new Date(row.date).toLocaleDateString('zh-CN')}</TableCell>
+                                        <TableCell>{row.date ? new Date(row.date).toLocaleDateString('zh-CN') : ''}</TableCell>
                                         <TableCell>{row.description}</TableCell>
                                         <TableCell>
                                             <Select